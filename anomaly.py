@@ -0,0 +1,124 @@
+"""
+Detecção incremental de picos e quedas de viewers (raids, hosts, viewbots).
+
+`ViewerStats` mantém, por canal, em O(1) por amostra:
+
+- média e variância exponenciais (EWMA, fator ANOMALY_ALPHA);
+- inclinação (viewers/min) por mínimos quadrados sobre as últimas
+  ANOMALY_SLOPE_WINDOW amostras, com somas acumuladas (ts e viewers são
+  inteiros, então as somas são exatas e não acumulam erro ao remover a mais antiga).
+
+Uma amostra vira evento `spike`/`drop` quando se afasta da média anterior por
+mais de ANOMALY_Z desvios e, ao mesmo tempo, por pelo menos ANOMALY_MIN_DELTA
+viewers e ANOMALY_MIN_PCT da média (evita alarmes em canais pequenos).
+"""
+import math
+import os
+from collections import deque
+
+ALPHA = float(os.environ.get('ANOMALY_ALPHA', '0.1'))
+Z_THRESHOLD = float(os.environ.get('ANOMALY_Z', '4'))
+MIN_DELTA = int(os.environ.get('ANOMALY_MIN_DELTA', '50'))
+MIN_PCT = float(os.environ.get('ANOMALY_MIN_PCT', '0.3'))
+# amostras antes de começar a alarmar (média/variância ainda instáveis)
+WARMUP = int(os.environ.get('ANOMALY_WARMUP', '10'))
+# segundos sem novo evento depois de um evento no mesmo canal
+COOLDOWN = int(os.environ.get('ANOMALY_COOLDOWN', '300'))
+SLOPE_WINDOW = int(os.environ.get('ANOMALY_SLOPE_WINDOW', '20'))
+
+
+class ViewerStats:
+    __slots__ = ('alpha', 'n', 'mean', 'var', 'last_event_ts', 'window', 'sx', 'sy', 'sxx', 'sxy', 'x0')
+
+    def __init__(self, alpha=ALPHA, slope_window=SLOPE_WINDOW):
+        self.alpha = alpha
+        self.window = deque(maxlen=slope_window)
+        self.reset()
+
+    def reset(self):
+        """Zera o estado (nova sessão ou canal saiu do ar)."""
+        self.n = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.last_event_ts = None
+        self.window.clear()
+        self.sx = self.sy = self.sxx = self.sxy = 0
+        self.x0 = None
+
+    def snapshot(self):
+        """Estado serializável em JSON (para o checkpoint do monitor)."""
+        return {'n': self.n, 'mean': self.mean, 'var': self.var, 'last_event_ts': self.last_event_ts,
+                'x0': self.x0, 'window': [list(p) for p in self.window]}
+
+    def restore(self, state):
+        """Recarrega um `snapshot`; as somas da inclinação são recalculadas a partir da janela."""
+        self.reset()
+        self.n = state['n']
+        self.mean = state['mean']
+        self.var = state['var']
+        self.last_event_ts = state['last_event_ts']
+        self.x0 = state['x0']
+        for x, y in state['window'][-self.window.maxlen:]:
+            self.window.append((x, y))
+            self.sx += x
+            self.sy += y
+            self.sxx += x * x
+            self.sxy += x * y
+
+    @property
+    def std(self):
+        return math.sqrt(self.var)
+
+    @property
+    def slope_per_min(self):
+        k = len(self.window)
+        den = k * self.sxx - self.sx * self.sx
+        if k < 2 or den == 0:
+            return 0.0
+        return (k * self.sxy - self.sx * self.sy) / den * 60.0
+
+    def _push(self, ts, viewers):
+        if self.x0 is None:
+            self.x0 = ts
+        x = ts - self.x0
+        if len(self.window) == self.window.maxlen:
+            ox, oy = self.window[0]
+            self.sx -= ox
+            self.sy -= oy
+            self.sxx -= ox * ox
+            self.sxy -= ox * oy
+        self.window.append((x, viewers))
+        self.sx += x
+        self.sy += viewers
+        self.sxx += x * x
+        self.sxy += x * viewers
+
+    def update(self, ts, viewers):
+        """Incorpora uma amostra ao vivo; devolve o evento detectado (dict) ou None."""
+        event = None
+        if self.n >= WARMUP and (self.last_event_ts is None or ts - self.last_event_ts >= COOLDOWN):
+            delta = viewers - self.mean
+            std = self.std
+            z = delta / std if std > 0 else (math.inf if delta else 0.0)
+            if abs(z) >= Z_THRESHOLD and abs(delta) >= MIN_DELTA and abs(delta) >= MIN_PCT * self.mean:
+                event = {
+                    'kind': 'spike' if delta > 0 else 'drop',
+                    'ts': ts,
+                    'viewers': viewers,
+                    'baseline': self.mean,
+                    'zscore': z if math.isfinite(z) else None,
+                }
+                self.last_event_ts = ts
+
+        if self.n == 0:
+            self.mean = float(viewers)
+        else:
+            diff = viewers - self.mean
+            incr = self.alpha * diff
+            self.mean += incr
+            self.var = (1.0 - self.alpha) * (self.var + diff * incr)
+        self.n += 1
+        self._push(ts, viewers)
+        if event is not None:
+            event['slope_per_min'] = self.slope_per_min
+        return event
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Stand-in local para `https://kick.com/api/v1/channels/{slug}`.
+
+Responde no mesmo formato usado por `monitor.fetch_channel`, com latência,
+taxa de erros (500), rate limit (429), fração de respostas lentas (cauda
+de latência) e alternância ao vivo/offline configuráveis. Slugs começando com `dead` respondem 404 sempre. `tick()`
+avança o estado sem requests e publica os eventos em tempo real (ver bench/fake_pusher.py).
+
+Uso standalone:
+    python bench/fake_kick.py --port 8099 --latency-ms 50 --error-rate 0.01
+    KICK_API_BASE=http://127.0.0.1:8099/api/v1 python monitor.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHANNEL_PATH = re.compile(r'^/api/v1/channels/([^/?]+)')
+LIVE_EVENT = 'App\\Events\\StreamerIsLive'
+STOP_EVENT = 'App\\Events\\StopStreamBroadcast'
+UPDATE_EVENT = 'App\\Events\\LivestreamUpdated'
+
+
+def channel_id(slug):
+    """Id numérico estável do canal (na Kick vem no JSON do canal e nomeia o canal Pusher)."""
+    return zlib.crc32(slug.encode('utf-8'))
+
+
+class FakeKick:
+    """Estado dos canais simulados e parâmetros de comportamento do servidor."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 flap_rate=0.05, live_fraction=0.5, seed=None, slow_rate=0.0, slow_ms=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.flap_rate = flap_rate
+        self.live_fraction = live_fraction
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.channels = {}
+        self.next_livestream_id = 1
+        self.requests = 0
+
+    def _state(self, slug):
+        st = self.channels.get(slug)
+        if st is None:
+            live = self.rng.random() < self.live_fraction
+            st = self.channels[slug] = {
+                'live': live,
+                'livestream_id': self._new_livestream_id() if live else None,
+                'viewers': int(self.rng.paretovariate(1.2) * 20),
+            }
+        return st
+
+    def _new_livestream_id(self):
+        ls_id = self.next_livestream_id
+        self.next_livestream_id += 1
+        return ls_id
+
+    def respond(self, slug):
+        """Devolve (status, corpo) para um GET do canal `slug`."""
+        with self.lock:
+            self.requests += 1
+            roll = self.rng.random()
+            if slug.startswith('dead'):
+                return 404, {'message': 'Not found'}
+            if roll < self.rate_limit_rate:
+                return 429, {'message': 'Too Many Attempts.'}
+            if roll < self.rate_limit_rate + self.error_rate:
+                return 500, {'message': 'Server Error'}
+            st = self._state(slug)
+            if self.rng.random() < self.flap_rate:
+                st['live'] = not st['live']
+                st['livestream_id'] = self._new_livestream_id() if st['live'] else None
+            if not st['live']:
+                return 200, {'id': channel_id(slug), 'slug': slug, 'livestream': None}
+            self._drift(st)
+            return 200, {'id': channel_id(slug), 'slug': slug, 'livestream': self._livestream(slug, st)}
+
+    def _drift(self, st):
+        st['viewers'] = max(0, int(st['viewers'] * self.rng.uniform(0.95, 1.05)) + self.rng.randint(-2, 2))
+
+    def _livestream(self, slug, st):
+        return {
+            'id': st['livestream_id'],
+            'is_live': True,
+            'viewer_count': st['viewers'],
+            'session_title': f'{slug} stream {st["livestream_id"]}',
+        }
+
+    def tick(self, publish):
+        """Avança todos os canais já vistos e chama publish(canal_pusher, evento, dados) para cada mudança."""
+        events = []
+        with self.lock:
+            for slug, st in self.channels.items():
+                name = f'channel.{channel_id(slug)}'
+                if self.rng.random() < self.flap_rate:
+                    st['live'] = not st['live']
+                    if st['live']:
+                        st['livestream_id'] = self._new_livestream_id()
+                        events.append((name, LIVE_EVENT, {'livestream': self._livestream(slug, st)}))
+                    else:
+                        events.append((name, STOP_EVENT, {'livestream': {'id': st['livestream_id'], 'channel': {'id': channel_id(slug)}}}))
+                        st['livestream_id'] = None
+                elif st['live']:
+                    self._drift(st)
+                    events.append((name, UPDATE_EVENT, {'livestream': {'id': st['livestream_id'], 'viewer_count': st['viewers']}}))
+        for event in events:
+            publish(*event)
+
+    def delay(self):
+        ms = max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms))
+        if self.slow_rate and self.rng.random() < self.slow_rate:
+            ms += self.slow_ms
+        if ms:
+            time.sleep(ms / 1000.0)
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            m = CHANNEL_PATH.match(self.path)
+            if not m:
+                status, body = 404, {'message': 'Not found'}
+            else:
+                fake.delay()
+                status, body = fake.respond(m.group(1))
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # backlog grande: milhares de workers conectam ao mesmo tempo no início
+    request_queue_size = 4096
+
+
+def start_server(fake, host='127.0.0.1', port=0):
+    """Sobe o servidor numa thread daemon; devolve (server, base_url para KICK_API_BASE)."""
+    server = _Server((host, port), make_handler(fake))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}/api/v1'
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='latência média por resposta')
+    parser.add_argument('--jitter-ms', type=float, default=10.0, help='variação uniforme da latência (+/-)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fração de respostas 500')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='fração de respostas com --slow-ms a mais de latência')
+    parser.add_argument('--slow-ms', type=float, default=2000.0, help='latência extra das respostas lentas')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fração de respostas 429')
+    parser.add_argument('--flap-rate', type=float, default=0.05, help='probabilidade de alternar ao vivo/offline por request')
+    parser.add_argument('--live-fraction', type=float, default=0.5, help='fração de canais que começam ao vivo')
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def fake_from_args(args):
+    return FakeKick(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, flap_rate=args.flap_rate,
+        live_fraction=args.live_fraction, seed=args.seed, slow_rate=args.slow_rate, slow_ms=args.slow_ms,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server, base = start_server(fake_from_args(args), args.host, args.port)
+    print(f'fake Kick API em {base} (KICK_API_BASE={base})')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Stand-in local do websocket em tempo real da Kick (subconjunto do protocolo Pusher).
+
+Implementa o que `realtime.RealtimeHub` usa: `pusher:connection_established`,
+`pusher:subscribe`/`unsubscribe` (responde `pusher_internal:subscription_succeeded`),
+`pusher:ping`/`pong` e a entrega de eventos em `channel.<id>`. Um ticker avança
+o estado da `FakeKick` compartilhada com a API REST fake e publica
+`StreamerIsLive`, `StopStreamBroadcast` e atualizações de viewers.
+
+Uso standalone (REST + websocket):
+    python bench/fake_pusher.py --port 8099 --ws-port 8098 --tick 2
+    KICK_API_BASE=http://127.0.0.1:8099/api/v1 KICK_PUSHER_URL=ws://127.0.0.1:8098/app/local python monitor.py --realtime
+"""
+import argparse
+import json
+import socketserver
+import sys
+import threading
+import time
+
+import fake_kick
+import report
+
+sys.path.insert(0, report.REPO_DIR)
+from realtime import OP_CLOSE, OP_PING, OP_PONG, ConnectionClosed, accept_key, encode_frame, read_frame  # noqa: E402
+
+
+class FakePusher:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}  # canal -> set(handler)
+        self.published = 0
+
+    def publish(self, channel, event, data):
+        frame = encode_frame(json.dumps({'event': event, 'channel': channel, 'data': json.dumps(data)}), mask=False)
+        with self.lock:
+            targets = list(self.subscribers.get(channel, ()))
+            self.published += 1
+        for h in targets:
+            h.send_frame(frame)
+
+    def subscribe(self, channel, handler):
+        with self.lock:
+            self.subscribers.setdefault(channel, set()).add(handler)
+
+    def unsubscribe(self, channel, handler):
+        with self.lock:
+            self.subscribers.get(channel, set()).discard(handler)
+
+    def drop(self, handler):
+        with self.lock:
+            for subs in self.subscribers.values():
+                subs.discard(handler)
+
+
+def make_handler(pusher):
+    class Handler(socketserver.StreamRequestHandler):
+        def setup(self):
+            super().setup()
+            self.send_lock = threading.Lock()
+
+        def send_frame(self, frame):
+            try:
+                with self.send_lock:
+                    self.wfile.write(frame)
+                    self.wfile.flush()
+            except OSError:
+                pass
+
+        def send_json(self, msg):
+            self.send_frame(encode_frame(json.dumps(msg), mask=False))
+
+        def recv_exact(self, n):
+            data = self.rfile.read(n)
+            if len(data) < n:
+                raise ConnectionClosed()
+            return data
+
+        def handle(self):
+            headers = {}
+            self.rfile.readline()  # GET /app/<key> HTTP/1.1
+            while True:
+                line = self.rfile.readline().decode('latin-1').strip()
+                if not line:
+                    break
+                k, _, v = line.partition(':')
+                headers[k.strip().lower()] = v.strip()
+            self.wfile.write((
+                'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                f'Sec-WebSocket-Accept: {accept_key(headers.get("sec-websocket-key", ""))}\r\n\r\n'
+            ).encode())
+            self.send_json({'event': 'pusher:connection_established',
+                            'data': json.dumps({'socket_id': f'{id(self)}.1', 'activity_timeout': 120})})
+            try:
+                while True:
+                    _, opcode, payload = read_frame(self.recv_exact)
+                    if opcode == OP_CLOSE:
+                        break
+                    if opcode == OP_PING:
+                        self.send_frame(encode_frame(payload, OP_PONG, mask=False))
+                        continue
+                    msg = json.loads(payload)
+                    event, data = msg.get('event'), msg.get('data') or {}
+                    if event == 'pusher:subscribe':
+                        pusher.subscribe(data['channel'], self)
+                        self.send_json({'event': 'pusher_internal:subscription_succeeded',
+                                        'channel': data['channel'], 'data': '{}'})
+                    elif event == 'pusher:unsubscribe':
+                        pusher.unsubscribe(data['channel'], self)
+                    elif event == 'pusher:ping':
+                        self.send_json({'event': 'pusher:pong', 'data': '{}'})
+            except (ConnectionClosed, OSError, ValueError):
+                pass
+            finally:
+                pusher.drop(self)
+
+    return Handler
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+
+def start_server(pusher, host='127.0.0.1', port=0):
+    """Sobe o websocket numa thread daemon; devolve (server, url para KICK_PUSHER_URL)."""
+    server = _Server((host, port), make_handler(pusher))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'ws://{host}:{server.server_address[1]}/app/local?protocol=7'
+
+
+def start_ticker(fake, pusher, interval):
+    """Avança a FakeKick a cada `interval` segundos publicando os eventos no FakePusher."""
+    def run():
+        while True:
+            time.sleep(interval)
+            fake.tick(pusher.publish)
+    threading.Thread(target=run, daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099, help='porta da API REST fake')
+    parser.add_argument('--ws-port', type=int, default=8098, help='porta do websocket')
+    parser.add_argument('--tick', type=float, default=2.0, help='segundos entre avanços de estado/eventos')
+    fake_kick.add_arguments(parser)
+    args = parser.parse_args()
+    fake = fake_kick.fake_from_args(args)
+    pusher = FakePusher()
+    _, base = fake_kick.start_server(fake, args.host, args.port)
+    _, ws_url = start_server(pusher, args.host, args.ws_port)
+    start_ticker(fake, pusher, args.tick)
+    print(f'fake Kick API em {base} (KICK_API_BASE={base})')
+    print(f'fake Pusher em {ws_url} (KICK_PUSHER_URL={ws_url})')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
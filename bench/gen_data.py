@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Gera um kick_monitor.sqlite3 sintético em grande escala para os benchmarks de leitura.
+
+- popularidade dos canais em lei de potência (Pareto): poucos canais grandes, cauda longa
+- sessões diárias com probabilidade por canal, início aleatório e duração lognormal
+  (mediana ~3h, entre 15min e 12h), com rampa de subida/descida de viewers
+- uma amostra a cada `--interval` segundos por canal, como o monitor grava
+  (fora do ar: viewers=-1, is_live=0, sem session_id), a não ser com --live-only
+- `sessions`, `peaks` e `channel_state` coerentes com as amostras
+
+Exemplos:
+    python bench/gen_data.py --out /tmp/bench.sqlite3 --channels 50 --days 7           # ~1M linhas
+    python bench/gen_data.py --out /tmp/big.sqlite3 --channels 2000 --days 180 --live-only
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import monitor  # noqa: E402
+
+DAY = 86400
+
+
+def channel_profiles(rng, n):
+    """(base_viewers, prob. de transmitir num dia) por canal, ordenados do maior para o menor."""
+    base = np.sort(rng.pareto(1.16, n) + 1.0)[::-1] * 15.0
+    stream_prob = rng.uniform(0.3, 0.95, n)
+    return base, stream_prob
+
+
+def gen_channel(rng, n_slots, interval, base, stream_prob, days):
+    """Devolve (viewers, is_live, session_idx, sessões[(start_slot, end_slot, livestream_id, title)])."""
+    viewers = np.full(n_slots, -1, dtype=np.int64)
+    is_live = np.zeros(n_slots, dtype=np.int64)
+    session_idx = np.full(n_slots, -1, dtype=np.int64)
+    sessions = []
+    slots_per_day = DAY // interval
+    for day in range(days):
+        if rng.random() > stream_prob:
+            continue
+        length = int(np.clip(rng.lognormal(np.log(3 * 3600), 0.5), 900, 12 * 3600)) // interval
+        first = day * slots_per_day + int(rng.integers(0, slots_per_day))
+        if sessions and first <= sessions[-1][1]:
+            first = sessions[-1][1] + 1
+        last = min(first + length, n_slots) - 1
+        if last <= first:
+            continue
+        n = last - first + 1
+        # rampa de subida/descida + ruído multiplicativo
+        shape = np.minimum(1.0, np.minimum(np.arange(1, n + 1), np.arange(n, 0, -1)) / max(1.0, n * 0.15))
+        level = base * rng.uniform(0.6, 1.4)
+        v = level * (0.3 + 0.7 * shape) * rng.lognormal(0.0, 0.08, n)
+        viewers[first:last + 1] = v.astype(np.int64)
+        is_live[first:last + 1] = 1
+        session_idx[first:last + 1] = len(sessions)
+        sessions.append((first, last, str(int(rng.integers(10 ** 7, 10 ** 8))), f'stream dia {day}'))
+    return viewers, is_live, session_idx, sessions
+
+
+def generate(out, channels, days, interval, live_only=False, raw_json=False, seed=42, end_ts=None):
+    if os.path.exists(out):
+        os.remove(out)
+    monitor.init_db(out)
+    conn = sqlite3.connect(out)
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    cur = conn.cursor()
+
+    rng = np.random.default_rng(seed)
+    end_ts = end_ts or int(time.time()) // interval * interval
+    start = end_ts - days * DAY
+    n_slots = days * DAY // interval
+    ts_grid = start + interval * np.arange(n_slots, dtype=np.int64)
+    base, stream_prob = channel_profiles(rng, channels)
+    next_sid = 1
+    total_rows = 0
+    t0 = time.time()
+
+    for ci in range(channels):
+        name = f'ch{ci:05d}'
+        viewers, is_live, session_idx, sessions = gen_channel(rng, n_slots, interval, base[ci], stream_prob[ci], days)
+        sid_of = np.array([next_sid + i for i in range(len(sessions))] + [0], dtype=np.int64)
+        sample_sid = sid_of[session_idx]  # -1 -> último elemento (0)
+        for i, (first, last, ls_id, title) in enumerate(sessions):
+            v = viewers[first:last + 1]
+            end = int(ts_grid[last]) if last < n_slots - 1 else None
+            cur.execute(
+                'INSERT INTO sessions (id, channel, livestream_id, title, start_ts, end_ts, avg_viewers, max_viewers, sample_count) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (next_sid + i, name, ls_id, title, int(ts_grid[first]), end,
+                 float(v.mean()), int(v.max()), int(v.size)),
+            )
+        next_sid += len(sessions)
+
+        mask = is_live.astype(bool) if live_only else np.ones(n_slots, dtype=bool)
+        ts_c, v_c, l_c, s_c = ts_grid[mask], viewers[mask], is_live[mask], sample_sid[mask]
+        if raw_json:
+            raws = [json.dumps({'livestream': {'viewer_count': int(v), 'is_live': bool(l)}}) if l else '{"livestream": null}'
+                    for v, l in zip(v_c.tolist(), l_c.tolist())]
+        else:
+            raws = [None] * len(ts_c)
+        cur.executemany(
+            'INSERT INTO samples (channel, ts, viewers, is_live, raw_json, session_id) VALUES (?, ?, ?, ?, ?, ?)',
+            zip([name] * len(ts_c), ts_c.tolist(), v_c.tolist(), l_c.tolist(), raws,
+                [s if s else None for s in s_c.tolist()]),
+        )
+        total_rows += len(ts_c)
+
+        _write_peaks(cur, name, ts_grid, viewers, is_live)
+        cur.execute('INSERT INTO channels (name) VALUES (?)', (name,))
+        last = n_slots - 1
+        cur.execute(
+            'INSERT INTO channel_state (channel, last_ts, viewers, is_live, session_id, title) VALUES (?, ?, ?, ?, ?, ?)',
+            (name, int(ts_grid[last]), int(viewers[last]), int(is_live[last]),
+             int(sample_sid[last]) or None, sessions[-1][3] if is_live[last] else None),
+        )
+        conn.commit()
+        if (ci + 1) % max(1, channels // 20) == 0:
+            rate = total_rows / max(1e-9, time.time() - t0)
+            print(f'  {ci + 1}/{channels} canais, {total_rows} linhas ({rate:,.0f} linhas/s)')
+
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+    return total_rows
+
+
+def _write_peaks(cur, name, ts_grid, viewers, is_live):
+    live = is_live.astype(bool)
+    if not live.any():
+        return
+    lv, lt = viewers[live], ts_grid[live]
+    last_ts = int(lt[-1])
+    overall = int(lv.argmax())
+
+    day_start = datetime.fromtimestamp(last_ts, tz=timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    week_start = day_start - timedelta(days=day_start.weekday())
+    month_start = day_start.replace(day=1)
+    daily, weekly, monthly = (int(lv[lt >= int(w.timestamp())].max()) for w in (day_start, week_start, month_start))
+    day, week, month = monitor.iso_date(last_ts), monitor.week_start_iso(last_ts), monitor.iso_month(last_ts)
+    cur.execute(
+        'INSERT INTO peaks (channel, peak_overall, peak_overall_ts, peak_daily, peak_daily_date, peak_weekly, peak_week_start, peak_monthly, peak_month) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (name, int(lv[overall]), int(lt[overall]), daily, day, weekly, week, monthly, month),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', required=True, help='arquivo SQLite de saída (sobrescrito)')
+    parser.add_argument('--channels', type=int, default=50)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--interval', type=int, default=monitor.POLL_INTERVAL, help='segundos entre amostras')
+    parser.add_argument('--live-only', action='store_true', help='grava só as amostras ao vivo')
+    parser.add_argument('--raw-json', action='store_true', help='preenche samples.raw_json (banco bem maior)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    slots = args.days * DAY // args.interval
+    print(f'gerando até {args.channels * slots:,} amostras ({args.channels} canais x {args.days} dias) em {args.out}')
+    t0 = time.time()
+    rows = generate(args.out, args.channels, args.days, args.interval, args.live_only, args.raw_json, args.seed)
+    print(f'{rows:,} amostras em {time.time() - t0:.1f}s ({os.path.getsize(args.out) / 2 ** 20:.1f} MB)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Benchmark ponta a ponta da ingestão do monitor contra a API fake (bench/fake_kick.py).
+
+Sobe o stand-in num processo separado (para não somar CPU ao monitor), cria
+um banco temporário com N canais sintéticos, roda o `Supervisor` real por
+`--duration` segundos e mede:
+
+- polls/s e latência do fetch (p50/p99)
+- atraso do poll (intervalo real entre polls do mesmo canal menos POLL_INTERVAL), p50/p99
+- linhas/s gravadas em `samples`
+- CPU (% de um core) e RSS do processo do monitor
+
+Com --realtime o monitor roda com o RealtimeHub contra o websocket fake
+(bench/fake_pusher.py), e o relatório inclui eventos recebidos por segundo.
+Com --spool as amostras passam pelo spool local (spool.py) e o drainer; com
+--lock-every/--lock-hold uma thread segura o lock de escrita do banco
+periodicamente (como um script de manutenção) e o relatório mostra quantas
+amostras coletadas não chegaram ao banco. Com MONITOR_PARTITIONS=1 no ambiente
+as amostras vão para as partições mensais (partitions.py). Com --slow-rate o
+fake atrasa uma fração das respostas em --slow-ms; --hedge liga os requests
+hedged (hedge.py) e --deadline ajusta o prazo por poll.
+
+O relatório vai para bench/results/ e pode ser comparado com um anterior via --baseline.
+
+Exemplo:
+    python bench/ingest.py --channels 1000 --duration 60 --interval 5 --latency-ms 80
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import fake_kick
+import fake_pusher
+import report
+
+sys.path.insert(0, report.REPO_DIR)
+
+
+def _serve_fake(args, conn):
+    fake = fake_kick.fake_from_args(args)
+    server, base = fake_kick.start_server(fake)
+    ws_url = None
+    if args.realtime:
+        pusher = fake_pusher.FakePusher()
+        _, ws_url = fake_pusher.start_server(pusher)
+        fake_pusher.start_ticker(fake, pusher, args.tick)
+    conn.send((base, ws_url))
+    conn.recv()  # bloqueia até o benchmark terminar
+    server.shutdown()
+
+
+def _count_samples(path):
+    import partitions
+    total = 0
+    # com MONITOR_PARTITIONS=1 as amostras ficam nas partições mensais (partitions.py)
+    for p in [path] + [partitions.path_for(path, m) for m in partitions.months(path)]:
+        conn = sqlite3.connect(p)
+        try:
+            total += conn.execute('SELECT COUNT(*) FROM samples').fetchone()[0]
+        finally:
+            conn.close()
+    return total
+
+
+def _count_quarantined(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM channel_health WHERE state = 'open'").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _lock_storm(db_path, every, hold, stop):
+    """Segura BEGIN IMMEDIATE por `hold` segundos a cada `every` segundos."""
+    conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    while not stop.wait(every):
+        conn.execute('BEGIN IMMEDIATE')
+        stop.wait(hold)
+        conn.execute('COMMIT')
+    conn.close()
+
+
+def run(args):
+    tmpdir = tempfile.mkdtemp(prefix='kick-bench-')
+    db_path = os.path.join(tmpdir, 'kick_monitor.sqlite3')
+
+    parent_conn, child_conn = multiprocessing.Pipe()
+    server_proc = multiprocessing.Process(target=_serve_fake, args=(args, child_conn), daemon=True)
+    server_proc.start()
+    base_url, ws_url = parent_conn.recv()
+
+    # o monitor lê caminhos e base da API do ambiente no import
+    os.environ['MONITOR_DB_PATH'] = db_path
+    os.environ['CHANNELS_FILE'] = os.path.join(tmpdir, 'channels.txt')
+    os.environ['FDS_DB_PATH'] = os.path.join(tmpdir, 'fds_bot.db')
+    os.environ['KICK_API_BASE'] = base_url
+    import breaker
+    import monitor
+    import realtime
+
+    logging.getLogger().setLevel(logging.WARNING)
+    monitor.POLL_INTERVAL = args.interval
+    monitor.HEDGER.hedge = args.hedge
+    if args.deadline:
+        monitor.HEDGER.deadline = args.deadline
+    monitor.init_db(db_path)
+    channels = [f'bench{i:05d}' for i in range(args.channels)]
+    # slugs 'dead*' respondem 404 no fake: devem cair em quarentena (breaker.py) e parar de ser pollados
+    channels += [f'dead{i:05d}' for i in range(args.dead)]
+    conn = monitor.get_conn(db_path)
+    conn.executemany('INSERT INTO channels (name) VALUES (?)', [(c,) for c in channels])
+    conn.commit()
+    conn.close()
+
+    polls = defaultdict(list)
+    fetch_times = []
+    fetch_errors = []
+    original_fetch = monitor.fetch_channel
+
+    def timed_fetch(channel, **kwargs):
+        t0 = time.monotonic()
+        polls[channel].append(t0)
+        try:
+            result = original_fetch(channel, **kwargs)
+            if breaker.classify(result[2]):
+                fetch_errors.append(channel)
+            return result
+        finally:
+            fetch_times.append(time.monotonic() - t0)
+
+    monitor.fetch_channel = timed_fetch
+
+    hub = realtime.RealtimeHub(ws_url) if args.realtime else None
+    spool_dir = os.path.join(tmpdir, 'spool') if args.spool else None
+    ring_path = db_path + '.ring' if args.ring else None
+    sup = monitor.Supervisor(list(channels), hub=hub, spool_dir=spool_dir, ring_path=ring_path)
+    sup_thread = threading.Thread(target=sup.start, daemon=True)
+    sup_thread.start()
+    storm_stop = threading.Event()
+    if args.lock_every:
+        threading.Thread(target=_lock_storm, args=(db_path, args.lock_every, args.lock_hold, storm_stop), daemon=True).start()
+
+    print(f'aquecendo {args.warmup}s com {len(channels)} canais (intervalo {args.interval}s, API {base_url})...')
+    time.sleep(args.warmup)
+    t0 = time.monotonic()
+    cpu0 = time.process_time()
+    rows0 = _count_samples(db_path)
+    fetch_mark = len(fetch_times)
+    events0 = hub.events_received if hub else 0
+    time.sleep(args.duration)
+    t1 = time.monotonic()
+    cpu1 = time.process_time()
+    rows1 = _count_samples(db_path)
+    rss = report.rss_mb()
+    window_fetches = fetch_times[fetch_mark:]
+    events1 = hub.events_received if hub else 0
+    covered = sum(1 for c in channels if hub.is_covered(c)) if hub else 0
+
+    storm_stop.set()
+    sup.stop_event.set()
+    sup.stop()
+    rows_final = _count_samples(db_path)
+    parent_conn.send('stop')
+    server_proc.join(timeout=5)
+
+    elapsed = t1 - t0
+    n_polls = sum(1 for ts in polls.values() for t in ts if t0 <= t < t1)
+    lags = []
+    for ts in polls.values():
+        for prev, cur in zip(ts, ts[1:]):
+            if t0 <= cur < t1:
+                lags.append(cur - prev - args.interval)
+    ms = lambda v: None if v is None else round(v * 1000.0, 2)
+    metrics = {
+        'polls_per_sec': n_polls / elapsed,
+        'expected_polls_per_sec': len(channels) / float(args.interval),
+        'fetch_ms': {'p50': ms(report.percentile(window_fetches, 50)), 'p99': ms(report.percentile(window_fetches, 99))},
+        'poll_lag_ms': {'p50': ms(report.percentile(lags, 50)), 'p99': ms(report.percentile(lags, 99))},
+        'db_rows_per_sec': (rows1 - rows0) / elapsed,
+        'cpu_percent': (cpu1 - cpu0) / elapsed * 100.0,
+        'rss_mb': rss,
+        'peak_rss_mb': report.peak_rss_mb(),
+    }
+    if not hub:
+        # cada fetch bem-sucedido gera uma amostra; com o banco travado além do timeout, o caminho direto descarta
+        metrics['samples_lost'] = len(fetch_times) - len(fetch_errors) - rows_final
+    metrics['fetch'] = monitor.HEDGER.stats()
+    if args.dead:
+        metrics['dead_polls_per_sec'] = sum(1 for c, ts in polls.items() if c.startswith('dead')
+                                            for t in ts if t0 <= t < t1) / elapsed
+        metrics['quarantined'] = _count_quarantined(db_path)
+    if hub:
+        metrics['realtime_events_per_sec'] = (events1 - events0) / elapsed
+        metrics['realtime_covered'] = covered
+    return {
+        'params': {
+            'channels': args.channels, 'duration': args.duration, 'warmup': args.warmup,
+            'interval': args.interval, 'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms,
+            'error_rate': args.error_rate, 'rate_limit_rate': args.rate_limit_rate,
+            'flap_rate': args.flap_rate, 'live_fraction': args.live_fraction,
+            'realtime': args.realtime, 'tick': args.tick, 'spool': args.spool,
+            'lock_every': args.lock_every, 'lock_hold': args.lock_hold, 'dead': args.dead,
+            'slow_rate': args.slow_rate, 'slow_ms': args.slow_ms, 'hedge': args.hedge,
+            'deadline': monitor.HEDGER.deadline, 'ring': args.ring,
+        },
+        'metrics': metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--channels', type=int, default=100, help='número de canais sintéticos (100 a 10000)')
+    parser.add_argument('--duration', type=float, default=30.0, help='segundos medidos')
+    parser.add_argument('--warmup', type=float, default=5.0, help='segundos antes de começar a medir')
+    parser.add_argument('--interval', type=int, default=5, help='POLL_INTERVAL usado no benchmark (segundos)')
+    parser.add_argument('--label', default=None, help='nome do relatório (padrão: revisão git)')
+    parser.add_argument('--baseline', default=None, help='relatório JSON anterior para comparar')
+    parser.add_argument('--out', default=report.RESULTS_DIR)
+    parser.add_argument('--realtime', action='store_true', help='ingestão por websocket (RealtimeHub + bench/fake_pusher.py)')
+    parser.add_argument('--spool', action='store_true', help='amostras pelo spool local + drainer')
+    parser.add_argument('--lock-every', type=float, default=0, help='segura o lock de escrita do banco a cada N segundos')
+    parser.add_argument('--lock-hold', type=float, default=35.0, help='segundos segurando o lock (padrão: além do timeout de 30s)')
+    parser.add_argument('--dead', type=int, default=0, help='canais extras com slug morto (404 no fake)')
+    parser.add_argument('--hedge', action='store_true', help='requests hedged após o p95 da latência (hedge.py)')
+    parser.add_argument('--deadline', type=float, default=None, help='prazo por poll em segundos (padrão: FETCH_DEADLINE_SECONDS)')
+    parser.add_argument('--ring', action='store_true', help='amostras também no ring buffer do dashboard (ring.py)')
+    parser.add_argument('--tick', type=float, default=2.0, help='com --realtime: segundos entre eventos do fake')
+    fake_kick.add_arguments(parser)
+    args = parser.parse_args()
+
+    result = run(args)
+    path = report.save_report('ingest', result, args.out, args.label)
+    m = result['metrics']
+    print(f"polls/s {m['polls_per_sec']:.1f} (esperado {m['expected_polls_per_sec']:.1f})")
+    print(f"fetch p50/p99 {m['fetch_ms']['p50']}/{m['fetch_ms']['p99']} ms")
+    print(f"atraso do poll p50/p99 {m['poll_lag_ms']['p50']}/{m['poll_lag_ms']['p99']} ms")
+    print(f"linhas/s {m['db_rows_per_sec']:.1f}  CPU {m['cpu_percent']:.1f}%  RSS {m['rss_mb']:.1f} MB")
+    if 'samples_lost' in m:
+        print(f"amostras perdidas {m['samples_lost']}")
+    f = m['fetch']
+    print(f"hedges {f['hedges']} ({f['hedge_wins']} venceram)  prazos estourados {f['deadline_exceeded']}")
+    if 'quarantined' in m:
+        print(f"canais mortos: {m['dead_polls_per_sec']:.2f} polls/s, {m['quarantined']} em quarentena")
+    if 'realtime_events_per_sec' in m:
+        print(f"eventos/s {m['realtime_events_per_sec']:.1f}  canais cobertos {m['realtime_covered']}/{result['params']['channels']}")
+    print(f'relatório salvo em {path}')
+    if args.baseline:
+        report.compare(result, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Benchmark das rotas de leitura de `dashboard.py` sobre um banco gerado por bench/gen_data.py.
+
+Cada rota é chamada pelo test client do Flask `--repeat` vezes (latência
+p50/p95/máx) e todo SQL que ela executa é capturado e passado por
+`EXPLAIN QUERY PLAN`. Planos com SCAN (tabela ou índice inteiro) são marcados como full scan.
+O relatório (tempos + planos) vai para bench/results/; com --baseline, além
+das diferenças de tempo, são listadas as rotas cujo plano mudou.
+Com --ring, os canais medidos ganham um ring buffer (ring.py) preenchido com as
+últimas amostras do banco, como o monitor faria com MONITOR_RING=1.
+
+Exemplo:
+    python bench/gen_data.py --out /tmp/bench.sqlite3 --channels 200 --days 30
+    python bench/read_paths.py --db /tmp/bench.sqlite3 --repeat 20
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import report
+
+sys.path.insert(0, report.REPO_DIR)
+import dashboard  # noqa: E402
+import ring  # noqa: E402
+from dashboard_metrics import is_full_scan  # noqa: E402
+
+
+def pick_targets(db_path):
+    """Escolhe canal grande, canal mediano e uma sessão longa do canal grande."""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute('SELECT channel FROM peaks ORDER BY peak_overall DESC').fetchall()
+        if not rows:
+            raise SystemExit('banco sem dados em peaks; gere com bench/gen_data.py')
+        big, mid = rows[0][0], rows[len(rows) // 2][0]
+        sess = conn.execute('SELECT id FROM sessions WHERE channel = ? ORDER BY sample_count DESC LIMIT 1', (big,)).fetchone()
+        top = [r[0] for r in rows[:50]]
+        return big, mid, (sess[0] if sess else 1), top
+    finally:
+        conn.close()
+
+
+def routes(big, mid, session_id, top):
+    return {
+        'index': '/',
+        'chart': f'/chart/{big}',
+        'chart_mid': f'/chart/{mid}',
+        'chart_session': f'/chart/{big}?session={session_id}',
+        'perfil': f'/perfil/{big}',
+        'sessions': f'/sessions/{big}',
+        'session_view': f'/session/{session_id}',
+        'api_samples': f'/api/samples/{big}?limit=200',
+        'api_samples_max': f'/api/samples/{big}?limit={dashboard.MAX_SAMPLES_LIMIT}',
+        'peaks': '/peaks',
+        'api_live': '/api/live',
+        'api_compare': f'/api/compare?channels={",".join(top)}&resolution=300',
+    }
+
+
+def explain(db_path, statements):
+    conn = sqlite3.connect(db_path)
+    plans = {}
+    try:
+        for sql in statements:
+            try:
+                detail = [r[3] for r in conn.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()]
+            except sqlite3.Error as e:
+                detail = [f'erro: {e}']
+            plans[sql] = detail
+    finally:
+        conn.close()
+    return plans
+
+
+def fill_ring(db_path, channels):
+    """RingWriter em ring.path_for(db_path) com as últimas ring.CAPACITY amostras de cada canal."""
+    writer = ring.RingWriter(ring.path_for(db_path), slots=max(len(channels), 1))
+    conn = sqlite3.connect(db_path)
+    try:
+        for ch in channels:
+            rows = conn.execute('SELECT ts, viewers, is_live FROM samples WHERE channel = ? ORDER BY ts DESC LIMIT ?',
+                                (ch, ring.CAPACITY)).fetchall()
+            for ts, viewers, is_live in reversed(rows):
+                writer.append(ch, ts, viewers, is_live)
+    finally:
+        conn.close()
+    return writer
+
+
+def run(args):
+    dashboard.DB_PATH = args.db
+    captured = []
+    original_get_db = dashboard.get_db
+
+    def traced_get_db():
+        db = original_get_db()
+        db.set_trace_callback(captured.append)
+        return db
+
+    dashboard.get_db = traced_get_db
+    client = dashboard.app.test_client()
+    big, mid, session_id, top = pick_targets(args.db)
+    writer = fill_ring(args.db, list(dict.fromkeys([big, mid] + top))) if args.ring else None
+
+    metrics, plans = {}, {}
+    for name, url in routes(big, mid, session_id, top).items():
+        if args.only and name not in args.only:
+            continue
+        client.get(url)  # aquece cache de páginas do SQLite
+        captured.clear()
+        resp = client.get(url)
+        statements = list(dict.fromkeys(captured))
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            client.get(url)
+            times.append((time.perf_counter() - t0) * 1000.0)
+        route_plans = explain(args.db, statements)
+        full_scan = any(is_full_scan(d) for d in route_plans.values())
+        metrics[name] = {
+            'p50_ms': report.percentile(times, 50),
+            'p95_ms': report.percentile(times, 95),
+            'max_ms': max(times),
+            'queries': len(statements),
+            'full_scans': sum(1 for d in route_plans.values() if is_full_scan(d)),
+        }
+        plans[name] = {'url': url, 'status': resp.status_code, 'plans': route_plans}
+        flag = '  FULL SCAN' if full_scan else ''
+        print(f"{name:16s} p50 {metrics[name]['p50_ms']:9.2f} ms  p95 {metrics[name]['p95_ms']:9.2f} ms  "
+              f"{len(statements)} queries{flag}")
+
+    if writer is not None:
+        writer.close()
+    conn = sqlite3.connect(args.db)
+    rows = conn.execute('SELECT COUNT(*) FROM samples').fetchone()[0]
+    conn.close()
+    return {
+        'params': {'db': os.path.abspath(args.db), 'samples': rows, 'repeat': args.repeat,
+                   'db_mb': os.path.getsize(args.db) / 2 ** 20, 'ring': args.ring},
+        'metrics': metrics,
+        'plans': plans,
+    }
+
+
+def compare_plans(result, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    changed = False
+    for name, info in result['plans'].items():
+        old = baseline.get('plans', {}).get(name)
+        if old is None:
+            continue
+        old_details = sorted(map(tuple, old['plans'].values()))
+        new_details = sorted(map(tuple, info['plans'].values()))
+        if old_details != new_details:
+            changed = True
+            print(f'\nplano mudou em {name}:')
+            for d in old_details:
+                print('  antes:  ' + ' | '.join(d))
+            for d in new_details:
+                print('  depois: ' + ' | '.join(d))
+    if not changed:
+        print('\nnenhum plano de query mudou em relação ao baseline')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help='banco gerado por bench/gen_data.py')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--only', nargs='*', help='rodar só estas rotas (nomes do relatório)')
+    parser.add_argument('--label', default=None)
+    parser.add_argument('--baseline', default=None, help='relatório JSON anterior para comparar')
+    parser.add_argument('--out', default=report.RESULTS_DIR)
+    parser.add_argument('--ring', action='store_true', help='últimas amostras servidas pelo ring buffer (MONITOR_RING=1)')
+    args = parser.parse_args()
+
+    result = run(args)
+    path = report.save_report('read', result, args.out, args.label)
+    print(f'relatório salvo em {path}')
+    if args.baseline:
+        report.compare(result, args.baseline)
+        compare_plans(result, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Helpers compartilhados pelos benchmarks: métricas de processo e relatórios JSON comparáveis entre commits."""
+import json
+import os
+import resource
+import subprocess
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                             capture_output=True, text=True, timeout=10)
+        rev = out.stdout.strip()
+        if rev:
+            dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                                   capture_output=True, text=True, timeout=10).stdout.strip()
+            return rev + ('-dirty' if dirty else '')
+    except Exception:
+        pass
+    return 'nogit'
+
+
+def rss_mb():
+    """RSS atual do processo em MB (Linux), com fallback para o pico do getrusage."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def save_report(kind, report, out_dir=RESULTS_DIR, label=None):
+    """Grava o relatório em `<out_dir>/<kind>-<rev>-<timestamp>.json` e devolve o caminho."""
+    os.makedirs(out_dir, exist_ok=True)
+    report = dict(report)
+    report.setdefault('kind', kind)
+    report.setdefault('revision', git_revision())
+    report.setdefault('created_at', int(time.time()))
+    if label:
+        report['label'] = label
+    name = f"{kind}-{label or report['revision']}-{time.strftime('%Y%m%d%H%M%S')}.json"
+    path = os.path.join(out_dir, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    return path
+
+
+def _flatten(d, prefix=''):
+    out = {}
+    for k, v in d.items():
+        key = f'{prefix}{k}'
+        if isinstance(v, dict):
+            out.update(_flatten(v, key + '.'))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = v
+    return out
+
+
+def compare(report, baseline_path):
+    """Imprime as métricas numéricas lado a lado com as do relatório de baseline."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    cur = _flatten(report.get('metrics', {}))
+    base = _flatten(baseline.get('metrics', {}))
+    print(f"\ncomparação com {os.path.basename(baseline_path)} ({baseline.get('revision')})")
+    for key in sorted(cur):
+        if key not in base:
+            continue
+        b, c = base[key], cur[key]
+        delta = f'{(c - b) / b * 100:+.1f}%' if b else 'n/a'
+        print(f'  {key:50s} {b:>12.3f} -> {c:>12.3f}  {delta}')
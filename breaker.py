@@ -0,0 +1,115 @@
+"""
+Circuit breaker por canal para slugs mortos e falhas persistentes.
+
+`CircuitBreaker` classifica cada poll que falhou (ver `classify`) e, depois de
+BREAKER_NOT_FOUND_THRESHOLD 404/410 seguidos (canal renomeado ou banido) ou
+BREAKER_FAILURE_THRESHOLD falhas seguidas de outro tipo (timeouts, 5xx),
+abre o circuito: o canal só é consultado de novo depois de um backoff que
+começa em BREAKER_BASE_BACKOFF e dobra a cada nova falha, até
+BREAKER_MAX_BACKOFF. O primeiro poll bem-sucedido fecha o circuito.
+
+429 (rate limit) não conta como falha do canal. Estados: `ok`, `failing`
+(falhas abaixo do limite) e `open`; o monitor grava a tabela
+`channel_health` só nas transições (e a cada aumento do backoff), não a cada poll.
+"""
+import os
+
+NOT_FOUND_THRESHOLD = int(os.environ.get('BREAKER_NOT_FOUND_THRESHOLD', '3'))
+FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '5'))
+BASE_BACKOFF = int(os.environ.get('BREAKER_BASE_BACKOFF', '300'))  # segundos
+MAX_BACKOFF = int(os.environ.get('BREAKER_MAX_BACKOFF', str(6 * 3600)))
+
+
+def classify(raw):
+    """(tipo, status HTTP, mensagem) de um poll que falhou, ou None se `raw` não é um erro de fetch_channel."""
+    if not isinstance(raw, dict) or 'error' not in raw:
+        return None
+    status = raw.get('status')
+    if status in (404, 410):
+        kind = 'not_found'
+    elif status == 429:
+        kind = 'rate_limited'
+    elif status is not None and status >= 500:
+        kind = 'server'
+    elif status is not None:
+        kind = 'http'
+    else:
+        kind = raw.get('kind') or 'network'
+    return kind, status, raw['error']
+
+
+class CircuitBreaker:
+    __slots__ = ('state', 'failures', 'kind', 'status', 'error', 'opened_ts', 'backoff', 'next_probe_ts',
+                 'last_failure_ts', 'last_success_ts')
+
+    def __init__(self):
+        self.state = 'ok'
+        self.failures = 0
+        self.kind = self.status = self.error = None
+        self.opened_ts = None
+        self.backoff = 0
+        self.next_probe_ts = None
+        self.last_failure_ts = None
+        self.last_success_ts = None
+
+    def record_success(self, now):
+        """Registra um poll bem-sucedido; True se o canal vinha falhando (transição a persistir)."""
+        changed = self.state != 'ok'
+        self.state = 'ok'
+        self.failures = 0
+        self.backoff = 0
+        self.next_probe_ts = None
+        self.last_success_ts = now
+        return changed
+
+    def record_failure(self, now, kind, status=None, error=None):
+        """Registra uma falha classificada; True se o estado mudou ou o backoff aumentou."""
+        if kind == 'rate_limited':
+            return False
+        was_ok = self.state == 'ok'
+        self.failures += 1
+        self.kind, self.status, self.error = kind, status, error
+        self.last_failure_ts = now
+        threshold = NOT_FOUND_THRESHOLD if kind == 'not_found' else FAILURE_THRESHOLD
+        if self.state != 'open' and self.failures < threshold:
+            self.state = 'failing'
+            return was_ok
+        if self.state != 'open':
+            self.state = 'open'
+            self.opened_ts = now
+            self.backoff = BASE_BACKOFF
+        else:
+            self.backoff = min(MAX_BACKOFF, self.backoff * 2)
+        self.next_probe_ts = now + self.backoff
+        return True
+
+    def delay(self, now, interval):
+        """Segundos até o próximo poll: `interval` normalmente, até o probe com o circuito aberto."""
+        if self.state == 'open':
+            return max(interval, self.next_probe_ts - now)
+        return interval
+
+    def row(self):
+        return {
+            'state': self.state, 'kind': self.kind, 'status': self.status, 'error': self.error,
+            'failures': self.failures, 'opened_ts': self.opened_ts, 'backoff_seconds': self.backoff,
+            'next_probe_ts': self.next_probe_ts, 'last_failure_ts': self.last_failure_ts,
+            'last_success_ts': self.last_success_ts,
+        }
+
+    def snapshot(self):
+        return self.row()
+
+    def restore(self, state):
+        """Recarrega `snapshot`/uma linha de `channel_health` (checkpoint ou banco, no start do worker)."""
+        if not state or state.get('state') not in ('failing', 'open'):
+            return
+        self.state = state['state']
+        self.kind, self.status, self.error = state.get('kind'), state.get('status'), state.get('error')
+        self.failures = state.get('failures') or 0
+        self.opened_ts = state.get('opened_ts')
+        self.last_failure_ts = state.get('last_failure_ts')
+        self.last_success_ts = state.get('last_success_ts')
+        if self.state == 'open':
+            self.backoff = state.get('backoff_seconds') or BASE_BACKOFF
+            self.next_probe_ts = state.get('next_probe_ts') or 0
@@ -0,0 +1,63 @@
+"""
+Fila de capturas de tela dirigida pelo estado ao vivo dos canais.
+
+Com MONITOR_CAPTURE=1 o monitor mantém a tabela `capture_jobs` com uma linha
+por canal ao vivo e o screenshot-worker (screenshot-worker/capture.js) consome
+essa fila em vez de percorrer uma lista fixa de canais:
+
+- a linha nasce quando a session começa (`last_capture_ts` NULL: captura
+  imediata) e some quando a session fecha, por qualquer caminho (worker,
+  reconcile, quarentena);
+- `cadence_seconds` vem da faixa de viewers do canal (CAPTURE_TIERS,
+  "mínimo de viewers:segundos" em ordem crescente); o worker só regrava a
+  linha quando a faixa muda, não a cada amostra, com uma margem de
+  CAPTURE_HYSTERESIS para canais oscilando em volta de um limite;
+- um job está pendente quando `last_capture_ts + cadence_seconds` já passou;
+  o consumidor o reserva gravando `claimed_ts` (reservas mais velhas que o
+  lease dele voltam para a fila) e ao terminar grava `last_capture_ts`.
+
+O custo da captura passa a acompanhar o número de canais ao vivo, não o
+tamanho do catálogo.
+"""
+import os
+
+ENABLED = os.environ.get('MONITOR_CAPTURE') == '1'
+# padrão: canais pequenos a cada 15min, médios a cada 10min, grandes a cada 5min, os maiores a cada 2min
+TIERS = os.environ.get('CAPTURE_TIERS', '0:900,100:600,1000:300,10000:120')
+HYSTERESIS = float(os.environ.get('CAPTURE_HYSTERESIS', '0.1'))
+
+
+def parse_tiers(spec):
+    """[(mínimo de viewers, segundos), ...] em ordem crescente de viewers."""
+    tiers = []
+    for part in spec.split(','):
+        if part.strip():
+            low, seconds = part.split(':')
+            tiers.append((int(low), int(seconds)))
+    tiers.sort()
+    if not tiers or tiers[0][0] > 0:
+        raise ValueError(f'CAPTURE_TIERS precisa de uma faixa começando em 0: {spec!r}')
+    return tiers
+
+
+_TIERS = parse_tiers(TIERS)
+
+
+def tier(viewers, previous=None, tiers=_TIERS):
+    """Índice da faixa de `viewers`; com `previous`, só troca de faixa fora da margem de histerese."""
+    viewers = max(0, viewers or 0)
+    index = 0
+    for i, (low, _) in enumerate(tiers):
+        if viewers >= low:
+            index = i
+    if previous is None or previous == index or not 0 <= previous < len(tiers):
+        return index
+    if index > previous:
+        # subir: a faixa mais alta cujo limite foi passado com folga
+        return max([previous] + [i for i in range(previous + 1, index + 1) if viewers >= tiers[i][0] * (1 + HYSTERESIS)])
+    # descer: a faixa mais alta cujo limite ainda não ficou para trás com folga
+    return max(i for i in range(0, previous + 1) if viewers >= tiers[i][0] * (1 - HYSTERESIS))
+
+
+def cadence(index, tiers=_TIERS):
+    return tiers[index][1]
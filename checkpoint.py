@@ -0,0 +1,77 @@
+"""
+Checkpoint do estado em memória dos workers, para reinício a quente.
+
+Cada worker publica a cada iteração um snapshot do seu canal (dict simples):
+
+- `session`: session aberta ({'id', 'livestream_id'}) ou None;
+- `last_sample`: [ts, viewers, is_live] da última amostra gravada;
+- `peaks`: janelas de pico conhecidas (mesma ordem de colunas de `peaks`);
+- `stats`: estado de anomaly.ViewerStats (ViewerStats.snapshot);
+- `next_due`: horário (epoch) do próximo poll agendado;
+- `health`: estado do breaker.CircuitBreaker do canal (quarentena e backoff).
+
+O Supervisor grava todos os snapshots a cada CHECKPOINT_INTERVAL segundos num
+arquivo JSON comprimido com zlib, escrito num temporário e trocado com
+os.replace (um crash no meio nunca deixa um checkpoint truncado). No restart,
+`load` devolve os snapshots se o arquivo for da mesma versão de schema e mais
+recente que `max_age`; qualquer problema vira um início a frio normal.
+"""
+import json
+import logging
+import os
+import time
+import zlib
+
+CHECKPOINT_INTERVAL = int(os.environ.get('CHECKPOINT_INTERVAL', '60'))
+FORMAT_VERSION = 1
+
+
+def path_for(db_path):
+    """Caminho padrão do checkpoint de um banco do monitor."""
+    return db_path + '.checkpoint'
+
+
+def save(path, schema_version, snapshots):
+    payload = {
+        'format': FORMAT_VERSION,
+        'schema_version': schema_version,
+        'saved_at': time.time(),
+        'channels': snapshots,
+    }
+    data = zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(data)
+
+
+def load(path, schema_version, max_age):
+    """Snapshots por canal do checkpoint em `path`, ou {} se ausente, velho ou incompatível."""
+    try:
+        with open(path, 'rb') as f:
+            payload = json.loads(zlib.decompress(f.read()))
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, zlib.error):
+        logging.warning("Checkpoint %s ilegível; iniciando a frio", path)
+        return {}
+    if payload.get('format') != FORMAT_VERSION or payload.get('schema_version') != schema_version:
+        logging.info("Checkpoint %s de outra versão; iniciando a frio", path)
+        return {}
+    age = time.time() - payload.get('saved_at', 0)
+    if age > max_age:
+        logging.info("Checkpoint %s tem %.0fs (máx. %ss); iniciando a frio", path, age, max_age)
+        return {}
+    return payload.get('channels') or {}
+
+
+def discard(path):
+    """Remove o checkpoint (ex.: depois de reescrever sessions/peaks fora do monitor)."""
+    for p in (path, f'{path}.tmp'):
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
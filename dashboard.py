@@ -1,734 +1,143 @@
+import csv
+import io
+import json
 import os
+import re
 import sqlite3
-from flask import Flask, render_template_string, request
+import threading
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from urllib.parse import quote
 
-app = Flask(__name__)
-
-DB_PATH = os.path.join(os.path.dirname(__file__), "fds_bot.db")
-
-
-def init_channels_table():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(
-        """
-        CREATE TABLE IF NOT EXISTS channels (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL
-        )
-        """
-    )
-    conn.commit()
-    conn.close()
-
-
-def get_channels_list():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT name FROM channels ORDER BY name")
-    channels = [row[0] for row in c.fetchall()]
-    conn.close()
-    return channels
-
-
-def add_channel(name):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    try:
-        c.execute("INSERT INTO channels (name) VALUES (?)", (name,))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
+import numpy as np
+from flask import Flask, Response, render_template, g, jsonify, request, stream_with_context
 
-
-def edit_channel(old_name, new_name):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    try:
-        c.execute("UPDATE channels SET name=? WHERE name=?", (new_name, old_name))
-        conn.commit()
-        return c.rowcount > 0
-    finally:
-        conn.close()
-
-
-def delete_channel(name):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DELETE FROM channels WHERE name=?", (name,))
-    conn.commit()
-    deleted = c.rowcount > 0
-    conn.close()
-    return deleted
-
-
-init_channels_table()
-
-
-@app.route('/')
-def index():
-    channels = get_channels_list()
-    return render_template_string('''
-<!doctype html>
-<html>
-<head>
-  <meta charset="utf-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-  <title>Dashboard</title>
-  <style>body{padding:20px}</style>
-</head>
-<body>
-  <div class="container">
-    <h1>Dashboard</h1>
-    <p><a class="btn btn-primary" href="/usuarios">Gerenciar canais</a></p>
-    <h5>Canais (SQLite)</h5>
-    <ul>
-    {% for ch in channels %}
-      <li>{{ch}}</li>
-    {% endfor %}
-    </ul>
-  </div>
-</body>
-</html>
-''', channels=channels)
-
-
-@app.route('/usuarios', methods=['GET', 'POST'])
-def usuarios():
-    msg = None
-    channels = get_channels_list()
-    if request.method == 'POST':
-        action = request.form.get('action')
-        name = request.form.get('name', '').strip()
-        old_name = request.form.get('old_name', '').strip()
-        if action == 'add' and name:
-            if add_channel(name):
-                msg = f'Canal {name} adicionado.'
-            else:
-                msg = 'Canal já existe.'
-        elif action == 'edit' and old_name and name:
-            if edit_channel(old_name, name):
-                msg = f'Canal {old_name} alterado para {name}.'
-            else:
-                msg = 'Canal não encontrado ou nome já existe.'
-        elif action == 'delete' and old_name:
-            if delete_channel(old_name):
-                msg = f'Canal {old_name} removido.'
-            else:
-                msg = 'Canal não encontrado.'
-        channels = get_channels_list()
-
-    return render_template_string('''
-<!doctype html>
-<html>
-<head>
-  <meta charset="utf-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-  <title>Gerenciar Canais</title>
-  <style>body{padding:20px}</style>
-</head>
-<body>
-  <div class="container">
-    <h2 class="mb-4">Gerenciar Canais</h2>
-    {% if msg %}<div class="alert alert-info">{{msg}}</div>{% endif %}
-    <form method="post" class="mb-3">
-      <div class="input-group mb-2">
-        <input type="text" name="name" class="form-control" placeholder="Novo canal" required>
-        <button class="btn btn-success" name="action" value="add" type="submit">Adicionar</button>
-      </div>
-    </form>
-    <table class="table table-bordered">
-      <thead><tr><th>Canal</th><th>Ações</th></tr></thead>
-      <tbody>
-      {% for ch in channels %}
-        <tr>
-          <form method="post">
-            <td>
-              <input type="hidden" name="old_name" value="{{ch}}">
-              <input type="text" name="name" value="{{ch}}" class="form-control">
-            </td>
-            <td>
-              <button class="btn btn-primary btn-sm" name="action" value="edit" type="submit">Editar</button>
-              <button class="btn btn-danger btn-sm" name="action" value="delete" type="submit" onclick="return confirm('Remover canal?')">Remover</button>
-            </td>
-          </form>
-        </tr>
-      {% endfor %}
-      </tbody>
-    </table>
-    <a href="/" class="btn btn-outline-secondary">Voltar</a>
-  </div>
-</body>
-</html>
-''', channels=channels, msg=msg)
-
-
-if __name__ == '__main__':
-    app.run(debug=True)
-    <html>
-    <head>
-        channels = get_channels_list()
-        if request.method == 'POST':
-          action = request.form.get('action')
-      <meta charset="utf-8">
-      <meta name="viewport" content="width=device-width, initial-scale=1">
-      <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-      <title>Gerenciar Canais</title>
-      <style>body{padding:20px}</style>
-    </head>
-    <body>
-      <div class="container">
-        <h2 class="mb-4">Gerenciar Canais</h2>
-        {% if msg %}<div class="alert alert-info">{{msg}}</div>{% endif %}
-        <form method="post" class="mb-3">
-          <div class="input-group mb-2">
-            <input type="text" name="name" class="form-control" placeholder="Novo canal" required>
-            <button class="btn btn-success" name="action" value="add" type="submit">Adicionar</button>
-          </div>
-        </form>
-        <table class="table table-bordered">
-          <thead><tr><th>Canal</th><th>Ações</th></tr></thead>
-          <tbody>
-          {% for ch in channels %}
-            <tr>
-              <form method="post">
-                <td>
-                  <input type="hidden" name="old_name" value="{{ch}}">
-                  <input type="text" name="name" value="{{ch}}" class="form-control">
-                </td>
-                <td>
-                  <button class="btn btn-primary btn-sm" name="action" value="edit" type="submit">Editar</button>
-                  <button class="btn btn-danger btn-sm" name="action" value="delete" type="submit" onclick="return confirm('Remover canal?')">Remover</button>
-                </td>
-              </form>
-            </tr>
-          {% endfor %}
-          </tbody>
-        </table>
-        <a href="/" class="btn btn-outline-secondary">Voltar</a>
-      </div>
-    </body>
-    </html>
-    ''', channels=channels, msg=msg)
-from flask import Flask, render_template_string, g, jsonify, request
-import sqlite3
-import os
-from datetime import datetime, timezone, timedelta
-
-app = Flask(__name__)
-CHANNELS_FILE = os.path.join(os.path.dirname(__file__), "channels.txt")
-
-def get_channels_list():
-    if not os.path.exists(CHANNELS_FILE):
-        return []
-    with open(CHANNELS_FILE, "r", encoding="utf-8") as f:
-        return [line.strip() for line in f if line.strip()]
-
-def save_channels_list(channels):
-    with open(CHANNELS_FILE, "w", encoding="utf-8") as f:
-        for ch in channels:
-            f.write(ch + "\n")
-
-@app.route('/usuarios', methods=['GET', 'POST'])
-def usuarios():
-    msg = None
-    channels = get_channels_list()
-    if request.method == 'POST':
-        action = request.form.get('action')
-        name = request.form.get('name', '').strip()
-        old_name = request.form.get('old_name', '').strip()
-        if action == 'add' and name:
-            if name not in channels:
-                channels.append(name)
-                save_channels_list(channels)
-                msg = f'Canal {name} adicionado.'
-            else:
-                msg = 'Canal já existe.'
-        elif action == 'edit' and old_name and name:
-            if old_name in channels:
-                idx = channels.index(old_name)
-                channels[idx] = name
-                save_channels_list(channels)
-                msg = f'Canal {old_name} alterado para {name}.'
-            else:
-                msg = 'Canal não encontrado.'
-        elif action == 'delete' and old_name:
-            if old_name in channels:
-                channels.remove(old_name)
-                save_channels_list(channels)
-                msg = f'Canal {old_name} removido.'
-            else:
-                msg = 'Canal não encontrado.'
-    return render_template_string('''
-    <!doctype html>
-    <html>
-    <head>
-      <meta charset="utf-8">
-      <meta name="viewport" content="width=device-width, initial-scale=1">
-      <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-      <title>Gerenciar Canais</title>
-      <style>body{padding:20px}</style>
-    </head>
-    <body>
-      <div class="container">
-        <h2 class="mb-4">Gerenciar Canais</h2>
-        {% if msg %}<div class="alert alert-info">{{msg}}</div>{% endif %}
-        <form method="post" class="mb-3">
-          <div class="input-group mb-2">
-            <input type="text" name="name" class="form-control" placeholder="Novo canal" required>
-            <button class="btn btn-success" name="action" value="add" type="submit">Adicionar</button>
-          </div>
-        </form>
-        <table class="table table-bordered">
-          <thead><tr><th>Canal</th><th>Ações</th></tr></thead>
-          <tbody>
-          {% for ch in channels %}
-            <tr>
-              <form method="post">
-                <td>
-                  <input type="hidden" name="old_name" value="{{ch}}">
-                  <input type="text" name="name" value="{{ch}}" class="form-control">
-                </td>
-                <td>
-                  <button class="btn btn-primary btn-sm" name="action" value="edit" type="submit">Editar</button>
-                  <button class="btn btn-danger btn-sm" name="action" value="delete" type="submit" onclick="return confirm('Remover canal?')">Remover</button>
-                </td>
-              </form>
-            </tr>
-          {% endfor %}
-          </tbody>
-        </table>
-        <a href="/" class="btn btn-outline-secondary">Voltar</a>
-      </div>
-    </body>
-    </html>
-    ''', channels=channels, msg=msg)
-from flask import Flask, render_template_string, g, jsonify, request
-import sqlite3
-import os
-from datetime import datetime, timezone, timedelta
-app = Flask(__name__)
-app = Flask(__name__)
-from flask import Flask, render_template_string, g, jsonify, request
-import sqlite3
-import os
-from datetime import datetime, timezone, timedelta
-CHANNELS_FILE = os.path.join(os.path.dirname(__file__), "channels.txt")
-
-def get_channels_list():
-    if not os.path.exists(CHANNELS_FILE):
-        return []
-    with open(CHANNELS_FILE, "r", encoding="utf-8") as f:
-        return [line.strip() for line in f if line.strip()]
-
-def save_channels_list(channels):
-    with open(CHANNELS_FILE, "w", encoding="utf-8") as f:
-        for ch in channels:
-            f.write(ch + "\n")
-
-@app.route('/usuarios', methods=['GET', 'POST'])
-def usuarios():
-    msg = None
-    channels = get_channels_list()
-    if request.method == 'POST':
-        action = request.form.get('action')
-        name = request.form.get('name', '').strip()
-        old_name = request.form.get('old_name', '').strip()
-        if action == 'add' and name:
-            if name not in channels:
-                channels.append(name)
-                save_channels_list(channels)
-                msg = f'Canal {name} adicionado.'
-            else:
-                msg = 'Canal já existe.'
-        elif action == 'edit' and old_name and name:
-            if old_name in channels:
-                idx = channels.index(old_name)
-                channels[idx] = name
-                save_channels_list(channels)
-                msg = f'Canal {old_name} alterado para {name}.'
-            else:
-                msg = 'Canal não encontrado.'
-        elif action == 'delete' and old_name:
-            if old_name in channels:
-                channels.remove(old_name)
-                save_channels_list(channels)
-                msg = f'Canal {old_name} removido.'
-            else:
-                msg = 'Canal não encontrado.'
-    return render_template_string('''
-    <!doctype html>
-    <html>
-    <head>
-      <meta charset="utf-8">
-      <meta name="viewport" content="width=device-width, initial-scale=1">
-      <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-      <title>Gerenciar Canais</title>
-      <style>body{padding:20px}</style>
-    </head>
-    <body>
-      <div class="container">
-        <h2 class="mb-4">Gerenciar Canais</h2>
-        {% if msg %}<div class="alert alert-info">{{msg}}</div>{% endif %}
-        <form method="post" class="mb-3">
-          <div class="input-group mb-2">
-            <input type="text" name="name" class="form-control" placeholder="Novo canal" required>
-            <button class="btn btn-success" name="action" value="add" type="submit">Adicionar</button>
-          </div>
-        </form>
-        <table class="table table-bordered">
-          <thead><tr><th>Canal</th><th>Ações</th></tr></thead>
-          <tbody>
-          {% for ch in channels %}
-            <tr>
-              <form method="post">
-                <td>
-                  <input type="hidden" name="old_name" value="{{ch}}">
-                  <input type="text" name="name" value="{{ch}}" class="form-control">
-                </td>
-                <td>
-                  <button class="btn btn-primary btn-sm" name="action" value="edit" type="submit">Editar</button>
-                  <button class="btn btn-danger btn-sm" name="action" value="delete" type="submit" onclick="return confirm('Remover canal?')">Remover</button>
-                </td>
-              </form>
-            </tr>
-          {% endfor %}
-          </tbody>
-        </table>
-        <a href="/" class="btn btn-outline-secondary">Voltar</a>
-      </div>
-    </body>
-    </html>
-    ''', channels=channels, msg=msg)
-
-from flask import Flask, render_template_string, g, jsonify, request
-import sqlite3
-import os
-from datetime import datetime, timezone, timedelta
+import partitions
+import ring
+from dashboard_metrics import REGISTRY, TimedConnection, current_route
+from sketch import QuantileSketch
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "kick_monitor.sqlite3")
-app = Flask(__name__)
-
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        db = g._database = sqlite3.connect(DB_PATH)
-    return db
+# Fuso horário usado para exibir timestamps (offset em horas, ex: -3 para GMT-3)
+TZ_OFFSET_HOURS = float(os.environ.get('DASHBOARD_TZ_OFFSET', '-3'))
+TZ_OFFSET_SECONDS = int(TZ_OFFSET_HOURS * 3600)
+TZ_LABEL = ' (GMT%+g)' % TZ_OFFSET_HOURS
+# limite máximo de linhas em /api/samples; intervalos maiores devem usar /api/export
+MAX_SAMPLES_LIMIT = 5000
+# linhas por página do export (keyset em (ts, id) sobre idx_samples_channel_ts)
+EXPORT_PAGE_SIZE = 5000
+EXPORT_COLUMNS = ('ts', 'viewers', 'is_live', 'session_id')
+EXPORT_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+# limites do /api/compare
+COMPARE_MAX_CHANNELS = 200
+COMPARE_MAX_BUCKETS = 10000
+QUANTILE_PERIODS = ('day', 'week', 'month')
+# /api/search: o bm25 é calculado só para os SEARCH_CANDIDATES títulos mais recentes que casam
+# (termos comuns casam com dezenas de milhares), o que também limita a paginação
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_CANDIDATES = 2000
+# canais sem poll há mais que isso não aparecem como ao vivo (monitor parado, canal removido)
+LIVE_STALE_SECONDS = 600
 
-@app.teardown_appcontext
-def close_connection(exception):
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
-
-def fmt_ts(ts):
-    try:
-        TZ = timezone(timedelta(hours=-3))
-        return datetime.fromtimestamp(int(ts), tz=TZ).strftime('%d/%m/%Y %H:%M') + ' (GMT-3)'
-    except Exception:
-        return str(ts)
-
-@app.route('/')
-def index():
-    db = get_db()
-    cur = db.cursor()
-    cur.execute('SELECT DISTINCT channel FROM samples ORDER BY channel')
-    channels = [r[0] for r in cur.fetchall()]
-    # Picos
-    peaks = {}
-    cur.execute('SELECT channel, peak_overall, peak_daily, peak_weekly, peak_monthly FROM peaks')
-    for r in cur.fetchall():
-        peaks[r[0]] = {
-            'overall': r[1], 'daily': r[2], 'weekly': r[3], 'monthly': r[4]
-        }
-    # Sessões recentes
-    sessions = {}
-    for ch in channels:
-        cur.execute('SELECT id, title, start_ts, end_ts, avg_viewers, max_viewers FROM sessions WHERE channel=? ORDER BY start_ts DESC LIMIT 3', (ch,))
-        sessions[ch] = [
-            {
-                'id': s[0], 'title': s[1], 'start': fmt_ts(s[2]), 'end': fmt_ts(s[3]) if s[3] else None,
-                'avg': s[4], 'max': s[5]
-            } for s in cur.fetchall()
-        ]
-    return render_template_string('''
-    <!doctype html>
-    <html>
-    <head>
-      <meta charset="utf-8">
-      <meta name="viewport" content="width=device-width, initial-scale=1">
-      <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-      <title>Kick Dashboard</title>
-      <style>body{padding:20px}</style>
-    </head>
-    <body>
-      <div class="container">
-        <div class="d-flex justify-content-between align-items-center mb-4">
-          <h1>Kick Dashboard</h1>
-          <a class="btn btn-outline-primary" href="/usuarios">Gerenciar canais</a>
-        </div>
-        <div class="row">
-        {% for ch in channels %}
-          <div class="col-md-6 col-lg-4 mb-4">
-            <div class="card h-100">
-              <div class="card-body">
-                <h4 class="card-title">{{ch}}</h4>
-                <p><a class="btn btn-sm btn-primary" href="/perfil/{{ch}}">Abrir dashboard</a></p>
-                <h6>Picos</h6>
-                {% if peaks.get(ch) %}
-                  <ul>
-                    <li>Overall: {{peaks[ch]['overall']}}</li>
-                    <li>Hoje: {{peaks[ch]['daily']}}</li>
-                    <li>Semana: {{peaks[ch]['weekly']}}</li>
-                    <li>Mês: {{peaks[ch]['monthly']}}</li>
-                  </ul>
-                {% else %}<span class="text-muted">Sem dados de pico</span>{% endif %}
-                <h6 class="mt-3">Sessões recentes</h6>
-                {% if sessions[ch] %}
-                  <ul>
-                  {% for s in sessions[ch] %}
-                    <li>
-                      <a href="/perfil/{{ch}}?session={{s['id']}}">{{s['title'] or 'Session'}}</a>
-                      <br><small>{{s['start']}} - {{s['end'] or 'em andamento'}}</small>
-                      <br><small>avg: {{s['avg']}} | max: {{s['max']}}</small>
-                    </li>
-                  {% endfor %}
-                  </ul>
-                {% else %}<span class="text-muted">Sem sessões</span>{% endif %}
-              </div>
-            </div>
-          </div>
-        {% endfor %}
-        </div>
-      </div>
-    </body>
-    </html>
-    ''', channels=channels, peaks=peaks, sessions=sessions)
-
-@app.route('/perfil/<channel>')
-def perfil(channel):
-    db = get_db()
-    cur = db.cursor()
-    session_id = request.args.get('session')
-    if session_id:
-        cur.execute('SELECT ts, viewers FROM samples WHERE channel=? AND session_id=? ORDER BY ts ASC', (channel, session_id))
-    else:
-        cur.execute('SELECT ts, viewers FROM samples WHERE channel=? ORDER BY ts DESC LIMIT 200', (channel,))
-    rows = cur.fetchall()[::-1]
-    times = []
-    viewers = []
-    for ts, v in rows:
-        dt = datetime.fromtimestamp(ts, timezone.utc) - timedelta(hours=3)
-        times.append(dt.strftime('%d/%m %H:%M'))
-        viewers.append(v)
-    # Picos
-    cur.execute('SELECT peak_overall, peak_daily, peak_weekly, peak_monthly FROM peaks WHERE channel=?', (channel,))
-    pr = cur.fetchone() or (0,0,0,0)
-    # Sessões
-    cur.execute('SELECT id, title, start_ts, end_ts, avg_viewers, max_viewers FROM sessions WHERE channel=? ORDER BY start_ts DESC LIMIT 10', (channel,))
-    sess = [
-        {
-            'id': s[0], 'title': s[1], 'start': fmt_ts(s[2]), 'end': fmt_ts(s[3]) if s[3] else None,
-            'avg': s[4], 'max': s[5]
-        } for s in cur.fetchall()
-    ]
-    return render_template_string('''
-    <!doctype html>
-    <html>
-    <head>
-      <meta charset="utf-8">
-      <meta name="viewport" content="width=device-width, initial-scale=1">
-      <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-      <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-      <title>Dashboard {{channel}}</title>
-      <style>body{padding:20px}</style>
-    </head>
-    <body>
-      <div class="container">
-        <div class="d-flex justify-content-between align-items-center mb-3">
-          <h2>Dashboard: {{channel}}</h2>
-          <a class="btn btn-sm btn-outline-secondary" href="/">Voltar</a>
-        </div>
-        <div class="row">
-          <div class="col-md-8">
-            <canvas id="myChart"></canvas>
-            <script>
-              const ctx = document.getElementById('myChart').getContext('2d');
-              const chart = new Chart(ctx, {
-                type: 'line',
-                data: {
-                  labels: {{ times|tojson }},
-                  datasets: [{
-                    label: 'Viewers',
-                    data: {{ viewers|tojson }},
-                    borderColor: 'rgb(13,110,253)',
-                    backgroundColor: 'rgba(13,110,253,0.1)',
-                    tension: 0.2
-                  }]
-                },
-                options: { scales: { x: { display: true } }, plugins: { legend: { display: false } } }
-              });
-            </script>
-          </div>
-          <div class="col-md-4">
-            <div class="card mb-3">
-              <div class="card-body">
-                <h5 class="card-title">Picos</h5>
-                <ul>
-                  <li>Overall: {{pr[0]}}</li>
-                  <li>Hoje: {{pr[1]}}</li>
-                  <li>Semana: {{pr[2]}}</li>
-                  <li>Mês: {{pr[3]}}</li>
-                </ul>
-              </div>
-            </div>
-            <div class="card">
-              <div class="card-body">
-                <h5 class="card-title">Sessões recentes</h5>
-                <ul>
-                  {% for s in sess %}
-                  <li>
-                    <a href="/perfil/{{channel}}?session={{s['id']}}">{{s['title'] or 'Session'}}</a>
-                    <br><small>{{s['start']}} - {{s['end'] or 'em andamento'}}</small>
-                    <br><small>avg: {{s['avg']}} | max: {{s['max']}}</small>
-                  </li>
-                  {% endfor %}
-                </ul>
-              </div>
-            </div>
-          </div>
-        </div>
-      </div>
-    </body>
-    </html>
-    ''', channel=channel, times=times, viewers=viewers, pr=pr, sess=sess)
-
-if __name__ == '__main__':
-    app.run(debug=True)
-from flask import Flask, render_template_string, g, jsonify, request
-import sqlite3
-import os
-from datetime import datetime, timezone, timedelta
-
-DB_PATH = os.path.join(os.path.dirname(__file__), "kick_monitor.sqlite3")
 app = Flask(__name__)
 
 def get_db():
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DB_PATH)
+        # uri=True: as partições de samples são anexadas com mode=ro (ver samples_db)
+        db = sqlite3.connect(DB_PATH, factory=TimedConnection, uri=True)
+        g._database = db
     return db
 
-@app.teardown_appcontext
-def close_connection(exception):
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
+def samples_db(since=None, until=None):
+    """get_db com as partições mensais de samples que cobrem [since, until) anexadas atrás da view `samples`.
 
-@app.route('/')
-def index():
-    db = get_db()
-    cur = db.cursor()
-    cur.execute('SELECT DISTINCT channel FROM samples ORDER BY channel')
-    channels = [r[0] for r in cur.fetchall()]
-    return render_template_string('''
-    <html>
-    <head>
-      <title>Kick Dashboard</title>
-      <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css">
-    </head>
-    <body class="container">
-      <h1 class="mt-4 mb-4">Kick Dashboard</h1>
-      <h3>Canais monitorados:</h3>
-      <ul>
-        {% for c in channels %}
-          <li><a href="/chart/{{c}}">{{c}}</a></li>
-        {% endfor %}
-      </ul>
-    </body>
-    </html>
-    ''', channels=channels)
-
-@app.route('/chart/<channel>')
-def chart(channel):
+    Sem partições em disco é o próprio get_db. Intervalos com mais de
+    partitions.MAX_ATTACHED meses levantam partitions.TooManyPartitions.
+    """
     db = get_db()
-    cur = db.cursor()
-    cur.execute('SELECT ts, viewers FROM samples WHERE channel=? ORDER BY ts DESC LIMIT 100', (channel,))
-    rows = cur.fetchall()
-    times = []
-    viewers = []
-    for ts, v in reversed(rows):
-        dt = datetime.fromtimestamp(ts, timezone.utc) - timedelta(hours=3)
-        times.append(dt.strftime('%d/%m %H:%M'))
-        viewers.append(v)
-    return render_template_string('''
-    <html>
-    <head>
-      <title>Gráfico de {{channel}}</title>
-      <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-      <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css">
-    </head>
-    <body class="container">
-      <h1 class="mt-4 mb-4">Gráfico de viewers: {{channel}}</h1>
-      <canvas id="myChart"></canvas>
-      <script>
-        const ctx = document.getElementById('myChart').getContext('2d');
-        const chart = new Chart(ctx, {
-          type: 'line',
-          data: {
-            labels: {{ times|tojson }},
-            datasets: [{
-              label: 'Viewers',
-              data: {{ viewers|tojson }},
-              borderColor: 'rgb(75, 192, 192)',
-              tension: 0.1
-            }]
-          }
-        });
-      </script>
-      <a href="/">Voltar</a>
-    </body>
-    </html>
-    ''', channel=channel, times=times, viewers=viewers)
-
-if __name__ == '__main__':
-    app.run(debug=True)
-from flask import Flask, render_template_string, g, jsonify, request
-import sqlite3
-import os
-from datetime import datetime, timezone, timedelta
-
-DB_PATH = os.path.join(os.path.dirname(__file__), "kick_monitor.sqlite3")
-app = Flask(__name__)
-if __name__ == '__main__':
-  app.run(debug=True)
-  app.run(debug=True)
-  app.run(debug=True)
-
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        db = sqlite3.connect(DB_PATH)
-        g._database = db
+    partitions.attach(db, DB_PATH, partitions.overlapping(DB_PATH, since, until), readonly=True)
     return db
 
+_rings = threading.local()
+
+def ring_reader():
+    """RingReader da thread (mmap próprio, sem lock) para o ring buffer do monitor em DB_PATH."""
+    path = ring.path_for(DB_PATH)
+    reader = getattr(_rings, 'reader', None)
+    if reader is None or reader.path != path:
+        if reader is not None:
+            reader.close()
+        reader = _rings.reader = ring.RingReader(path)
+    return reader
+
+def latest_samples(db, channel, limit):
+    """Últimas `limit` amostras (ts, viewers) do canal, mais recentes primeiro.
+
+    Se o monitor roda com MONITOR_RING=1 e o anel do canal já tem `limit`
+    amostras, vêm do ring buffer sem SQL. Senão, com partições lê do mês mais novo para trás, um mês anexado por vez, até
+    juntar `limit` linhas; a `samples` do banco principal (amostras ainda não
+    migradas) entra sempre.
+    """
+    rows = ring_reader().latest(channel, limit)
+    if rows is not None:
+        return rows
+    rows = []
+    for month in reversed(partitions.months(DB_PATH)):
+        if len(rows) >= limit:
+            break
+        partitions.attach(db, DB_PATH, [month], readonly=True)
+        rows += db.execute(
+            f'SELECT ts, viewers FROM {partitions.schema(month)}.samples WHERE channel = ? ORDER BY ts DESC LIMIT ?',
+            (channel, limit - len(rows)),
+        ).fetchall()
+    rows += db.execute('SELECT ts, viewers FROM main.samples WHERE channel = ? ORDER BY ts DESC LIMIT ?',
+                       (channel, limit)).fetchall()
+    rows.sort(key=lambda r: r[0], reverse=True)
+    return rows[:limit]
+
+def session_samples_db(session_id):
+    """samples_db com as partições do intervalo da session (sessions.start_ts/end_ts)."""
+    r = get_db().execute('SELECT start_ts, end_ts FROM sessions WHERE id = ?', (session_id,)).fetchone()
+    if not r:
+        return get_db()
+    return samples_db(r[0], r[1] + 1 if r[1] is not None else None)
+
+@app.before_request
+def start_request_timer():
+    g._request_t0 = time.perf_counter()
+    current_route.set(request.url_rule.rule if request.url_rule else '<404>')
+
+@app.after_request
+def record_request_time(response):
+    route, t0 = current_route.get(), g._request_t0
+    # call_on_close roda quando o servidor termina de enviar o corpo, então
+    # respostas em streaming (export) contam o tempo todo
+    response.call_on_close(lambda: REGISTRY.record_route(route, (time.perf_counter() - t0) * 1000.0))
+    return response
+
 @app.teardown_appcontext
 def close_connection(exception):
     db = getattr(g, '_database', None)
     if db is not None:
         db.close()
 
+@lru_cache(maxsize=4096)
+def _fmt_day(day):
+    return datetime.fromtimestamp(day * 86400, tz=timezone.utc).strftime('%Y-%m-%d')
+
 def fmt_ts(ts):
+    # offset fixo: a data é cacheada por dia e hora/minuto/segundo saem de aritmética,
+    # evitando criar datetime + strftime para cada linha das páginas de gráfico
     try:
-        TZ = timezone(timedelta(hours=-3))  # GMT-3
-        return datetime.fromtimestamp(int(ts), tz=TZ).strftime('%Y-%m-%d %H:%M:%S') + ' (GMT-3)'
-    except Exception:
+        day, secs = divmod(int(ts) + TZ_OFFSET_SECONDS, 86400)
+    except (TypeError, ValueError):
         return str(ts)
+    h, rem = divmod(secs, 3600)
+    m, s = divmod(rem, 60)
+    return f'{_fmt_day(day)} {h:02d}:{m:02d}:{s:02d}{TZ_LABEL}'
 
 INDEX_HTML = '''
 <!doctype html>
@@ -765,7 +174,7 @@ INDEX_HTML = '''
             </ul>
           </div>
         </div>
-        <div class="card">
+        <div class="card mb-3">
           <div class="card-body">
             <h5 class="card-title">Picos</h5>
             {% for p in peaks %}
@@ -775,8 +184,43 @@ INDEX_HTML = '''
             {% endfor %}
           </div>
         </div>
+        <div class="card">
+          <div class="card-body">
+            <h5 class="card-title">Saúde dos canais</h5>
+            <p class="mb-2">
+              <span class="badge bg-success">{{health.counts.ok}} ok</span>
+              <span class="badge bg-warning text-dark">{{health.counts.failing}} falhando</span>
+              <span class="badge bg-danger">{{health.counts.open}} em quarentena</span>
+            </p>
+            {% for h in health.channels %}
+              <div class="mb-1">
+                <strong>{{h.channel}}</strong>: {{h.kind}}{% if h.status %} {{h.status}}{% endif %}, {{h.failures}} falhas
+                {% if h.state == 'open' %}<br><small class="text-muted">próximo probe {{h.next_probe_display}}</small>{% endif %}
+              </div>
+            {% endfor %}
+          </div>
+        </div>
       </div>
       <div class="col-md-8">
+        <div class="card mb-3">
+          <div class="card-body">
+            <h5 class="card-title">Ao vivo agora</h5>
+            {% if live %}
+              <table class="table table-sm mb-0">
+                <thead><tr><th>canal</th><th>viewers</th><th>título</th></tr></thead>
+                <tbody>
+                {% for l in live %}
+                  <tr>
+                    <td><a href="/chart/{{l.channel}}">{{l.channel}}</a></td>
+                    <td>{{l.viewers}}</td>
+                    <td>{{l.title or ''}}</td>
+                  </tr>
+                {% endfor %}
+                </tbody>
+              </table>
+            {% else %}<span class="text-muted">Nenhum canal ao vivo</span>{% endif %}
+          </div>
+        </div>
         <div class="card">
           <div class="card-body">
             <h5 class="card-title">Visualização</h5>
@@ -793,33 +237,7 @@ INDEX_HTML = '''
 </html>
 '''
 
-@app.route('/')
-def index():
-    db = get_db()
-    cur = db.cursor()
-    cur.execute('SELECT channel, peak_overall, peak_daily, peak_weekly, peak_monthly FROM peaks ORDER BY channel')
-    rows = cur.fetchall()
-    channels = [r[0] for r in rows]
-    peaks = [{
-        'channel': r[0], 'overall': r[1], 'daily': r[2], 'weekly': r[3], 'monthly': r[4]
-    } for r in rows]
-    return render_template_string(INDEX_HTML, channels=channels, peaks=peaks)
-
-@app.route('/chart/<channel>')
-def chart(channel):
-    db = get_db()
-    cur = db.cursor()
-    session_id = request.args.get('session')
-    if session_id:
-        cur.execute('SELECT ts, viewers FROM samples WHERE channel = ? AND session_id = ? ORDER BY ts ASC', (channel, session_id))
-    else:
-        cur.execute('SELECT ts, viewers FROM samples WHERE channel = ? ORDER BY ts DESC LIMIT 200', (channel,))
-    rows = cur.fetchall()[::-1]
-    labels = [fmt_ts(r[0]) for r in rows]
-    data = [r[1] for r in rows]
-    cur.execute('SELECT peak_overall, peak_daily, peak_weekly, peak_monthly FROM peaks WHERE channel = ?', (channel,))
-    pr = cur.fetchone() or (0, 0, 0, 0)
-    return render_template_string('''
+CHART_HTML = '''
 <!doctype html>
 <html>
 <head>
@@ -907,33 +325,80 @@ def chart(channel):
   </div>
 </body>
 </html>
-''', channel=channel, labels=labels, data=data, pr=pr)
+'''
 
-@app.route('/api/samples/<channel>')
-def api_samples(channel):
-    db = get_db()
-    cur = db.cursor()
-    limit = request.args.get('limit', '200')
-    try:
-        limit = int(limit)
-    except Exception:
-        limit = 200
-    cur.execute('SELECT ts, viewers FROM samples WHERE channel = ? ORDER BY ts DESC LIMIT ?', (channel, limit))
-    rows = cur.fetchall()
-    res = []
-    for r in rows:
-        ts, v = r
-        res.append({'ts': ts, 'ts_display': fmt_ts(ts), 'viewers': v})
-    return jsonify(res)
+PERFIL_HTML = '''
+<!doctype html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1">
+  <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
+  <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+  <title>Dashboard {{channel}}</title>
+  <style>body{padding:20px}</style>
+</head>
+<body>
+  <div class="container">
+    <div class="d-flex justify-content-between align-items-center mb-3">
+      <h2>Dashboard: {{channel}}</h2>
+      <a class="btn btn-sm btn-outline-secondary" href="/">Voltar</a>
+    </div>
+    <div class="row">
+      <div class="col-md-8">
+        <canvas id="myChart"></canvas>
+        <script>
+          const ctx = document.getElementById('myChart').getContext('2d');
+          const chart = new Chart(ctx, {
+            type: 'line',
+            data: {
+              labels: {{ times|tojson }},
+              datasets: [{
+                label: 'Viewers',
+                data: {{ viewers|tojson }},
+                borderColor: 'rgb(13,110,253)',
+                backgroundColor: 'rgba(13,110,253,0.1)',
+                tension: 0.2
+              }]
+            },
+            options: { scales: { x: { display: true } }, plugins: { legend: { display: false } } }
+          });
+        </script>
+      </div>
+      <div class="col-md-4">
+        <div class="card mb-3">
+          <div class="card-body">
+            <h5 class="card-title">Picos</h5>
+            <ul>
+              <li>Overall: {{pr[0]}}</li>
+              <li>Hoje: {{pr[1]}}</li>
+              <li>Semana: {{pr[2]}}</li>
+              <li>Mês: {{pr[3]}}</li>
+            </ul>
+          </div>
+        </div>
+        <div class="card">
+          <div class="card-body">
+            <h5 class="card-title">Sessões recentes</h5>
+            <ul>
+              {% for s in sess %}
+              <li>
+                <a href="/perfil/{{channel}}?session={{s['id']}}">{{s['title'] or 'Session'}}</a>
+                <br><small>{{s['start']}} - {{s['end'] or 'em andamento'}}</small>
+                <br><small>avg: {{s['avg']}} | max: {{s['max']}}</small>
+              </li>
+              {% endfor %}
+            </ul>
+          </div>
+        </div>
+      </div>
+    </div>
+  </div>
+</body>
+</html>
+'''
 
-@app.route('/sessions/<channel>')
-def sessions(channel):
-    db = get_db()
-    cur = db.cursor()
-    cur.execute('SELECT id, title, start_ts, end_ts, avg_viewers, max_viewers FROM sessions WHERE channel = ? ORDER BY start_ts DESC LIMIT 200', (channel,))
-    rows = cur.fetchall()
-    rows_formatted = [(r[0], r[1], fmt_ts(r[2]) if r[2] else None, fmt_ts(r[3]) if r[3] else None, r[4], r[5]) for r in rows]
-    return render_template_string('''
+SESSIONS_HTML = '''
 <!doctype html>
 <html>
 <head>
@@ -968,22 +433,9 @@ def sessions(channel):
   </div>
 </body>
 </html>
-''', channel=channel, rows=rows_formatted)
+'''
 
-@app.route('/session/<int:session_id>')
-def session_view(session_id):
-    db = get_db()
-    cur = db.cursor()
-    cur.execute('SELECT channel, title, start_ts, end_ts, avg_viewers, max_viewers FROM sessions WHERE id = ?', (session_id,))
-    s = cur.fetchone()
-    if not s:
-        return 'Session not found', 404
-    channel = s[0]
-    cur.execute('SELECT ts, viewers FROM samples WHERE session_id = ? ORDER BY ts ASC', (session_id,))
-    rows = cur.fetchall()
-    labels = [fmt_ts(r[0]) for r in rows]
-    data = [r[1] for r in rows]
-    return render_template_string('''
+SESSION_HTML = '''
 <!doctype html>
 <html>
 <head>
@@ -1011,7 +463,459 @@ def session_view(session_id):
   </div>
 </body>
 </html>
-''', session_id=session_id, channel=channel, title=s[1], start=fmt_ts(s[2]) if s[2] else None, end=fmt_ts(s[3]) if s[3] else None, avg=s[4], max=s[5], labels=labels, data=data)
+'''
+
+# Templates compilados uma única vez no import (render_template_string recompila a cada request)
+INDEX_TEMPLATE = app.jinja_env.from_string(INDEX_HTML)
+CHART_TEMPLATE = app.jinja_env.from_string(CHART_HTML)
+PERFIL_TEMPLATE = app.jinja_env.from_string(PERFIL_HTML)
+SESSIONS_TEMPLATE = app.jinja_env.from_string(SESSIONS_HTML)
+SESSION_TEMPLATE = app.jinja_env.from_string(SESSION_HTML)
+
+@app.route('/')
+def index():
+    db = get_db()
+    cur = db.cursor()
+    cur.execute('SELECT channel, peak_overall, peak_daily, peak_weekly, peak_monthly FROM peaks ORDER BY channel')
+    rows = cur.fetchall()
+    channels = [r[0] for r in rows]
+    peaks = [{
+        'channel': r[0], 'overall': r[1], 'daily': r[2], 'weekly': r[3], 'monthly': r[4]
+    } for r in rows]
+    return render_template(INDEX_TEMPLATE, channels=channels, peaks=peaks, live=get_live_leaderboard(cur),
+                           health=get_channel_health(cur))
+
+def get_live_leaderboard(cur, limit=100):
+    """Canais ao vivo ordenados por viewers, lidos de `channel_state` (mantida pelo monitor)."""
+    try:
+        cur.execute(
+            'SELECT channel, viewers, last_ts, session_id, title FROM channel_state '
+            'WHERE is_live = 1 AND last_ts >= ? ORDER BY viewers DESC LIMIT ?',
+            (int(time.time()) - LIVE_STALE_SECONDS, limit),
+        )
+    except sqlite3.OperationalError:
+        # monitor ainda não criou a tabela
+        return []
+    return [{
+        'channel': r[0], 'viewers': r[1], 'ts': r[2], 'session_id': r[3], 'title': r[4]
+    } for r in cur.fetchall()]
+
+HEALTH_KEYS = ('channel', 'state', 'kind', 'status', 'error', 'failures', 'opened_ts', 'backoff_seconds', 'next_probe_ts',
+               'last_failure_ts', 'last_success_ts', 'updated_ts')
+
+def get_channel_health(cur, limit=100):
+    """Contagem de canais por estado do breaker do monitor (`channel_health`) e os que estão falhando.
+
+    Canais sem linha em `channel_health` nunca falharam e contam como `ok`;
+    em quarentena (`open`) primeiro, depois por número de falhas.
+    """
+    counts = {'ok': 0, 'failing': 0, 'open': 0}
+    try:
+        total = cur.execute(
+            'SELECT COUNT(*) FROM (SELECT channel FROM channel_state UNION SELECT channel FROM channel_health)'
+        ).fetchone()[0]
+        for state, n in cur.execute("SELECT state, COUNT(*) FROM channel_health WHERE state != 'ok' GROUP BY state"):
+            counts[state] = n
+        cur.execute(
+            f"SELECT {', '.join(HEALTH_KEYS)} FROM channel_health WHERE state != 'ok' "
+            "ORDER BY state = 'open' DESC, failures DESC, channel LIMIT ?",
+            (limit,),
+        )
+    except sqlite3.OperationalError:
+        # monitor ainda não criou as tabelas
+        return {'counts': counts, 'channels': []}
+    channels = [dict(zip(HEALTH_KEYS, r)) for r in cur.fetchall()]
+    for h in channels:
+        h['next_probe_display'] = fmt_ts(h['next_probe_ts']) if h['next_probe_ts'] else None
+    counts['ok'] = max(0, total - counts['failing'] - counts['open'])
+    return {'counts': counts, 'channels': channels}
+
+@app.route('/chart/<channel>')
+def chart(channel):
+    db = get_db()
+    cur = db.cursor()
+    session_id = request.args.get('session')
+    if session_id:
+        cur = session_samples_db(session_id).cursor()
+        cur.execute('SELECT ts, viewers FROM samples WHERE channel = ? AND session_id = ? ORDER BY ts ASC', (channel, session_id))
+        rows = cur.fetchall()
+    else:
+        rows = latest_samples(db, channel, 200)[::-1]
+    labels = [fmt_ts(r[0]) for r in rows]
+    data = [r[1] for r in rows]
+    cur.execute('SELECT peak_overall, peak_daily, peak_weekly, peak_monthly FROM peaks WHERE channel = ?', (channel,))
+    pr = cur.fetchone() or (0, 0, 0, 0)
+    return render_template(CHART_TEMPLATE, channel=channel, labels=labels, data=data, pr=pr)
+
+@app.route('/perfil/<channel>')
+def perfil(channel):
+    db = get_db()
+    cur = db.cursor()
+    session_id = request.args.get('session')
+    if session_id:
+        cur = session_samples_db(session_id).cursor()
+        cur.execute('SELECT ts, viewers FROM samples WHERE channel=? AND session_id=? ORDER BY ts ASC', (channel, session_id))
+        rows = cur.fetchall()
+    else:
+        rows = latest_samples(db, channel, 200)[::-1]
+    times = [fmt_ts(r[0]) for r in rows]
+    viewers = [r[1] for r in rows]
+    # Picos
+    cur.execute('SELECT peak_overall, peak_daily, peak_weekly, peak_monthly FROM peaks WHERE channel=?', (channel,))
+    pr = cur.fetchone() or (0,0,0,0)
+    # Sessões
+    cur.execute('SELECT id, title, start_ts, end_ts, avg_viewers, max_viewers FROM sessions WHERE channel=? ORDER BY start_ts DESC LIMIT 10', (channel,))
+    sess = [
+        {
+            'id': s[0], 'title': s[1], 'start': fmt_ts(s[2]), 'end': fmt_ts(s[3]) if s[3] else None,
+            'avg': s[4], 'max': s[5]
+        } for s in cur.fetchall()
+    ]
+    return render_template(PERFIL_TEMPLATE, channel=channel, times=times, viewers=viewers, pr=pr, sess=sess)
+
+@app.route('/api/samples/<channel>')
+def api_samples(channel):
+    db = get_db()
+    limit = request.args.get('limit', '200')
+    try:
+        limit = int(limit)
+    except Exception:
+        limit = 200
+    limit = max(0, min(limit, MAX_SAMPLES_LIMIT))
+    rows = latest_samples(db, channel, limit)
+    res = []
+    for r in rows:
+        ts, v = r
+        res.append({'ts': ts, 'ts_display': fmt_ts(ts), 'viewers': v})
+    return jsonify(res)
+
+def _int_arg(name, default=None):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+def iter_sample_pages(channel, since=None, until=None, page_size=EXPORT_PAGE_SIZE, path=None):
+    """Gera páginas de (id, ts, viewers, is_live, session_id) em ordem (ts, id).
+
+    Usa paginação keyset a partir da última linha lida, então cada página é uma
+    busca no índice (channel, ts) e a memória fica limitada a uma página. Com
+    partições o intervalo é lido um mês por vez (_sample_windows).
+    """
+    path = path or DB_PATH
+    # check_same_thread=False: no modo ASGI cada página pode ser lida por uma thread diferente do pool
+    conn = sqlite3.connect(path, check_same_thread=False, factory=TimedConnection, uri=True)
+    try:
+        cur = conn.cursor()
+        # (ts, id) da última linha emitida; id=-1 inclui as linhas com ts == since
+        last_ts = since if since is not None else -1
+        last_id = -1
+        upper = until if until is not None else 2 ** 62
+        for months, window_end in _sample_windows(path, since, until):
+            partitions.attach(conn, path, months, readonly=True)
+            while True:
+                cur.execute(
+                    'SELECT id, ts, viewers, is_live, session_id FROM samples '
+                    'WHERE channel = ? AND (ts, id) > (?, ?) AND ts < ? '
+                    'ORDER BY ts, id LIMIT ?',
+                    (channel, last_ts, last_id, min(upper, window_end or upper), page_size),
+                )
+                rows = cur.fetchall()
+                if rows:
+                    yield rows
+                    last_id, last_ts = rows[-1][0], rows[-1][1]
+                if len(rows) < page_size:
+                    break
+    finally:
+        conn.close()
+
+def _sample_windows(path, since=None, until=None):
+    """Trechos (meses anexados, fim exclusivo ou None) lidos em ordem por iter_sample_pages.
+
+    Antes da primeira partição só a `samples` do banco principal, depois um mês
+    por trecho (cada um com a `samples` principal junto); o último vai até o fim.
+    """
+    months = partitions.overlapping(path, since, until)
+    if not months:
+        return [((), None)]
+    windows = [((), partitions.month_range(months[0])[0])]
+    windows += [((m,), partitions.month_range(m)[1]) for m in months]
+    windows[-1] = (windows[-1][0], None)
+    return windows
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Latência por rota, tempo por statement SQL e as últimas queries lentas (com plano)."""
+    return jsonify(REGISTRY.snapshot())
+
+@app.route('/api/events')
+def api_events():
+    """Picos/quedas de viewers detectados pelo monitor (tabela `events`), mais recentes primeiro.
+
+    Parâmetros opcionais: channel, kind=spike|drop, since (epoch) e limit (padrão 100, máx. 1000).
+    """
+    where, params = [], []
+    channel = request.args.get('channel')
+    if channel:
+        where.append('channel = ?')
+        params.append(channel)
+    kind = request.args.get('kind')
+    if kind:
+        where.append('kind = ?')
+        params.append(kind)
+    since = _int_arg('since')
+    if since is not None:
+        where.append('ts >= ?')
+        params.append(since)
+    limit = max(1, min(_int_arg('limit', 100), 1000))
+    sql = 'SELECT channel, ts, kind, viewers, baseline, zscore, slope_per_min, session_id FROM events'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    try:
+        rows = get_db().cursor().execute(sql + ' ORDER BY ts DESC LIMIT ?', (*params, limit)).fetchall()
+    except sqlite3.OperationalError:
+        # monitor ainda não criou a tabela
+        rows = []
+    keys = ('channel', 'ts', 'kind', 'viewers', 'baseline', 'zscore', 'slope_per_min', 'session_id')
+    return jsonify([dict(zip(keys, r), ts_display=fmt_ts(r[1])) for r in rows])
+
+def fts_query(text):
+    """Texto livre -> consulta FTS5: cada palavra entre aspas (operadores do usuário não valem), todas obrigatórias;
+    a última, com 2+ letras, também como prefixo enquanto o usuário digita."""
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    if len(words[-1]) >= 2 and not text[-1:].isspace():
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+def search_sessions(cur, query, channel=None, limit=SEARCH_PAGE_SIZE, offset=0):
+    """Sessions cujo título (em qualquer momento da live) ou canal casa com `query` (sintaxe FTS5), por relevância (bm25).
+
+    Uma linha por session, com o título que melhor casou: (session_id, channel,
+    title, ts do título, score, start_ts, end_ts, avg_viewers, max_viewers).
+    Só os SEARCH_CANDIDATES títulos mais recentes que casam entram no ranking.
+    """
+    if channel:
+        # restringe já no índice; a igualdade exata fica no JOIN
+        channel_terms = ' '.join(f'"{w}"' for w in re.findall(r'\w+', channel))
+        if channel_terms:
+            query = f'({query}) AND channel : ({channel_terms})'
+    # a subquery percorre o índice em ordem de rowid (sem ordenar) e só calcula bm25 para os candidatos;
+    # MIN(score) com GROUP BY: as outras colunas vêm da linha do melhor título da session
+    hits = cur.execute(
+        'SELECT t.session_id, t.channel, t.title, t.ts, MIN(f.score) AS score FROM ('
+        '    SELECT rowid, bm25(session_titles_fts) AS score FROM session_titles_fts'
+        '    WHERE session_titles_fts MATCH ? ORDER BY rowid DESC LIMIT ?'
+        ') f JOIN session_titles t ON t.id = f.rowid '
+        f'{"WHERE t.channel = ? " if channel else ""}GROUP BY t.session_id ORDER BY score LIMIT ? OFFSET ?',
+        (query, SEARCH_CANDIDATES, *((channel,) if channel else ()), limit, offset),
+    ).fetchall()
+    if not hits:
+        return []
+    ids = [h[0] for h in hits]
+    sessions = {r[0]: r[1:] for r in cur.execute(
+        f'SELECT id, start_ts, end_ts, avg_viewers, max_viewers FROM sessions WHERE id IN ({",".join("?" * len(ids))})', ids)}
+    return [(*h, *sessions.get(h[0], (None,) * 4)) for h in hits]
+
+@app.route('/api/search')
+def api_search():
+    """Busca sessions por palavras do título (inclusive títulos trocados no meio da live) ou do nome do canal.
+
+    Parâmetros: q (texto livre; todas as palavras precisam aparecer, a última
+    vale como prefixo), channel (opcional), page (a partir de 1) e per_page
+    (padrão 20, máx. 100). Ordenado por relevância entre os títulos mais
+    recentes que casam (ver search_sessions).
+    """
+    query = fts_query(request.args.get('q', ''))
+    if query is None:
+        return jsonify({'error': 'q required'}), 400
+    page = max(1, _int_arg('page', 1))
+    per_page = max(1, min(_int_arg('per_page', SEARCH_PAGE_SIZE), SEARCH_MAX_PAGE_SIZE))
+    if (page - 1) * per_page >= SEARCH_CANDIDATES:
+        return jsonify({'error': f'only the first {SEARCH_CANDIDATES} matches are ranked; refine the query'}), 400
+    try:
+        rows = search_sessions(get_db().cursor(), query, request.args.get('channel'), per_page + 1, (page - 1) * per_page)
+    except sqlite3.OperationalError:
+        # monitor ainda não criou o índice (ou SQLite sem FTS5)
+        return jsonify({'error': 'search index not available'}), 503
+    keys = ('session_id', 'channel', 'title', 'title_ts', 'score', 'start_ts', 'end_ts', 'avg_viewers', 'max_viewers')
+    results = [dict(zip(keys, r), start_display=fmt_ts(r[5]) if r[5] else None, live=r[5] is not None and r[6] is None)
+               for r in rows[:per_page]]
+    return jsonify({'q': request.args.get('q'), 'page': page, 'per_page': per_page,
+                    'has_more': len(rows) > per_page, 'results': results})
+
+@app.route('/api/quantiles/<channel>')
+def api_quantiles(channel):
+    """p50/p90/p99 de viewers por dia, semana ou mês, mesclando os sketches das sessions.
+
+    Parâmetros: period=day|week|month (padrão day), since/until (início do
+    período, AAAA-MM-DD ou AAAA-MM, inclusivos). `overall` mescla todos os
+    períodos retornados. Sessions são atribuídas ao período em que começaram (UTC).
+    """
+    period = request.args.get('period', 'day')
+    if period not in QUANTILE_PERIODS:
+        return jsonify({'error': 'period must be day, week or month'}), 400
+    sql = 'SELECT period_start, sketch FROM channel_sketches WHERE channel = ? AND period = ?'
+    params = [channel, period]
+    if request.args.get('since'):
+        sql += ' AND period_start >= ?'
+        params.append(request.args['since'])
+    if request.args.get('until'):
+        sql += ' AND period_start <= ?'
+        params.append(request.args['until'])
+    try:
+        rows = get_db().cursor().execute(sql + ' ORDER BY period_start', params).fetchall()
+    except sqlite3.OperationalError:
+        # monitor ainda não criou a tabela
+        rows = []
+    overall = QuantileSketch()
+    periods = []
+    for start, blob in rows:
+        sk = QuantileSketch.from_bytes(blob)
+        overall.merge(sk)
+        p50, p90, p99 = sk.quantiles((0.5, 0.9, 0.99))
+        periods.append({'period_start': start, 'samples': sk.count, 'p50': p50, 'p90': p90, 'p99': p99})
+    p50, p90, p99 = overall.quantiles((0.5, 0.9, 0.99))
+    return jsonify({
+        'channel': channel,
+        'period': period,
+        'periods': periods,
+        'overall': {'samples': overall.count, 'p50': p50, 'p90': p90, 'p99': p99},
+    })
+
+@app.route('/api/live')
+def api_live():
+    limit = max(1, min(_int_arg('limit', 100), 1000))
+    return jsonify(get_live_leaderboard(get_db().cursor(), limit))
+
+@app.route('/api/health')
+def api_health():
+    limit = max(1, min(_int_arg('limit', 100), 1000))
+    return jsonify(get_channel_health(get_db().cursor(), limit))
+
+@app.route('/api/export/<channel>')
+def api_export(channel):
+    """Exporta samples de um canal em NDJSON (padrão) ou CSV, em streaming.
+
+    Parâmetros: since/until (epoch, intervalo [since, until)) e format=ndjson|csv.
+    """
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    since = _int_arg('since')
+    until = _int_arg('until')
+
+    def generate():
+        if fmt == 'csv':
+            yield export_header(fmt)
+        for rows in iter_sample_pages(channel, since, until):
+            yield encode_sample_page(rows, fmt)
+
+    resp = Response(stream_with_context(generate()), mimetype=EXPORT_MIMETYPES[fmt])
+    resp.headers['Content-Disposition'] = export_disposition(channel, fmt)
+    return resp
+
+def export_disposition(channel, fmt):
+    """Content-Disposition do export: o canal vem da URL, então nunca entra cru no header.
+
+    `filename` leva só [A-Za-z0-9._-] (o resto vira _) e `filename*` (RFC 6266)
+    o nome completo percent-encoded em UTF-8.
+    """
+    name = f'{channel}.{fmt}'
+    fallback = re.sub(r'[^A-Za-z0-9._-]', '_', name)
+    return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(name, safe="")}'
+
+def export_header(fmt):
+    return ','.join(EXPORT_COLUMNS) + '\r\n' if fmt == 'csv' else ''
+
+def encode_sample_page(rows, fmt):
+    """Serializa uma página de iter_sample_pages como NDJSON ou CSV."""
+    if fmt == 'csv':
+        buf = io.StringIO()
+        csv.writer(buf).writerows(r[1:] for r in rows)
+        return buf.getvalue()
+    return ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, r[1:]))) + '\n' for r in rows)
+
+@app.route('/api/compare')
+def api_compare():
+    """Séries de vários canais alinhadas numa grade de tempo comum.
+
+    Parâmetros: channels=a,b,c, since/until (epoch, padrão últimas 3h) e
+    resolution (segundos, padrão 60). Cada bucket guarda a última amostra do
+    canal nele (viewers se ao vivo, 0 se offline), como o /api/timeseries do
+    web-dashboard; -1 marca bucket sem amostra. Resposta colunar: um array
+    `ts` compartilhado e um array de inteiros por canal em `series`.
+    """
+    channels = list(dict.fromkeys(c.strip() for c in request.args.get('channels', '').split(',') if c.strip()))
+    if not channels:
+        return jsonify({'error': 'channels required'}), 400
+    if len(channels) > COMPARE_MAX_CHANNELS:
+        return jsonify({'error': f'at most {COMPARE_MAX_CHANNELS} channels'}), 400
+    now = int(time.time())
+    resolution = max(1, _int_arg('resolution', 60))
+    until = _int_arg('until', now)
+    start = _int_arg('since', until - 10800) // resolution * resolution
+    n_buckets = max(0, -(-(until - start) // resolution))
+    if n_buckets > COMPARE_MAX_BUCKETS:
+        return jsonify({'error': f'range/resolution exceeds {COMPARE_MAX_BUCKETS} buckets'}), 400
+
+    # uma única query: o GROUP BY com MAX(ts) faz o SQLite devolver as colunas
+    # da última amostra de cada (canal, bucket), então só chega ao Python uma
+    # linha por bucket preenchido
+    placeholders = ','.join('?' * len(channels))
+    try:
+        cur = samples_db(start, until).cursor()
+    except partitions.TooManyPartitions as e:
+        return jsonify({'error': str(e)}), 400
+    cur.execute(
+        f'SELECT channel, (ts - ?) / ? AS b, MAX(ts), viewers, is_live FROM samples '
+        f'WHERE channel IN ({placeholders}) AND ts >= ? AND ts < ? GROUP BY channel, b',
+        (start, resolution, *channels, start, until),
+    )
+    index = {ch: i for i, ch in enumerate(channels)}
+    rows = np.array(
+        [(index[r[0]], r[1], r[3] or 0, r[4] or 0) for r in cur.fetchall()],
+        dtype=np.int64,
+    ).reshape(-1, 4)
+    grid = np.full((len(channels), n_buckets), -1, dtype=np.int64)
+    grid[rows[:, 0], rows[:, 1]] = np.where(rows[:, 3] > 0, rows[:, 2], 0)
+    ts = start + resolution * np.arange(n_buckets, dtype=np.int64)
+    return jsonify({
+        'resolution': resolution,
+        'channels': channels,
+        'ts': ts.tolist(),
+        'series': dict(zip(channels, grid.tolist())),
+    })
+
+@app.route('/sessions/<channel>')
+def sessions(channel):
+    db = get_db()
+    cur = db.cursor()
+    cur.execute('SELECT id, title, start_ts, end_ts, avg_viewers, max_viewers FROM sessions WHERE channel = ? ORDER BY start_ts DESC LIMIT 200', (channel,))
+    rows = cur.fetchall()
+    rows_formatted = [(r[0], r[1], fmt_ts(r[2]) if r[2] else None, fmt_ts(r[3]) if r[3] else None, r[4], r[5]) for r in rows]
+    return render_template(SESSIONS_TEMPLATE, channel=channel, rows=rows_formatted)
+
+@app.route('/session/<int:session_id>')
+def session_view(session_id):
+    db = get_db()
+    cur = db.cursor()
+    cur.execute('SELECT channel, title, start_ts, end_ts, avg_viewers, max_viewers FROM sessions WHERE id = ?', (session_id,))
+    s = cur.fetchone()
+    if not s:
+        return 'Session not found', 404
+    channel = s[0]
+    cur = samples_db(s[2], s[3] + 1 if s[3] is not None else None).cursor()
+    cur.execute('SELECT ts, viewers FROM samples WHERE session_id = ? ORDER BY ts ASC', (session_id,))
+    rows = cur.fetchall()
+    labels = [fmt_ts(r[0]) for r in rows]
+    data = [r[1] for r in rows]
+    return render_template(SESSION_TEMPLATE, session_id=session_id, channel=channel, title=s[1], start=fmt_ts(s[2]) if s[2] else None, end=fmt_ts(s[3]) if s[3] else None, avg=s[4], max=s[5], labels=labels, data=data)
 
 @app.route('/peaks')
 def peaks():
@@ -1035,4 +939,4 @@ def peaks():
     return jsonify(res)
 
 if __name__ == '__main__':
-  app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
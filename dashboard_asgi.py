@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Modo de produção (ASGI) do dashboard.
+
+- As views Flask de `dashboard.py` rodam num pool de threads limitado
+  (DASHBOARD_DB_THREADS), então o event loop nunca bloqueia no SQLite.
+- `/api/export/<canal>` é servido nativamente em async: cada página é lida no
+  pool e enviada com `await send`, então um download longo não prende uma
+  thread enquanto o cliente consome os dados.
+
+Uso:
+    python dashboard_asgi.py
+    # ou, equivalente, direto pelo uvicorn / gunicorn:
+    uvicorn dashboard_asgi:application --host 0.0.0.0 --port 5000 --workers 4
+    gunicorn dashboard_asgi:application -k uvicorn.workers.UvicornWorker -w 4 -b 0.0.0.0:5000
+
+Para desenvolvimento continue usando `python dashboard.py`.
+"""
+import asyncio
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import parse_qs
+
+from asgiref.sync import AsyncToSync, SyncToAsync
+from asgiref.wsgi import WsgiToAsgi
+
+import dashboard
+
+HOST = os.environ.get('DASHBOARD_HOST', '0.0.0.0')
+PORT = int(os.environ.get('DASHBOARD_PORT', '5000'))
+WORKERS = int(os.environ.get('DASHBOARD_WORKERS', '4'))
+# threads por worker para as leituras no SQLite (views Flask + páginas do export)
+DB_THREADS = int(os.environ.get('DASHBOARD_DB_THREADS', '16'))
+
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix='dashboard-db')
+
+EXPORT_PATH = re.compile(r'^/api/export/([^/]+)$')
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi do asgiref com as views rodando no pool limitado (DB_EXECUTOR).
+
+    O WsgiToAsgi roda a aplicação com thread_sensitive=True, que sozinho
+    serializa todas as requisições numa única thread. Código thread-sensitive
+    roda na thread do código sync mais externo (regra documentada do asgiref),
+    então basta chamar o WsgiToAsgi padrão de dentro de uma thread do pool.
+    """
+
+    async def __call__(self, scope, receive, send):
+        call = AsyncToSync(super().__call__)
+        await SyncToAsync(call, thread_sensitive=False, executor=DB_EXECUTOR)(scope, receive, send)
+
+
+def _closing(wsgi_app):
+    # o WsgiToAsgi do asgiref nunca chama close() no corpo da resposta (PEP 3333),
+    # e é no close que o Flask roda os call_on_close (tempo por rota em /api/metrics)
+    def app(environ, start_response):
+        body = wsgi_app(environ, start_response)
+        try:
+            for chunk in body:
+                yield chunk
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+    return app
+
+
+flask_app = PooledWsgiToAsgi(_closing(dashboard.app))
+
+
+def _int_param(query, name):
+    try:
+        return int(query[name][0])
+    except (KeyError, ValueError):
+        return None
+
+
+async def _send_error(send, status, message):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps({'error': message}).encode()})
+
+
+def _close_pages(pages, pending):
+    """Fecha o gerador de páginas depois do next() em andamento: uma desconexão cancela o await, não a thread do pool,
+    e fechar o gerador enquanto ele roda dá "generator already executing"."""
+    if pending is not None and not pending.cancel():
+        wait([pending])
+    pages.close()
+
+
+async def export_samples(scope, receive, send, channel):
+    """Versão async de dashboard.api_export (mesmos parâmetros e formato)."""
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    fmt = query.get('format', ['ndjson'])[0].lower()
+    if fmt not in dashboard.EXPORT_MIMETYPES:
+        await _send_error(send, 400, 'format must be ndjson or csv')
+        return
+    loop = asyncio.get_running_loop()
+    pending = None
+    pages = dashboard.iter_sample_pages(channel, _int_param(query, 'since'), _int_param(query, 'until'))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', dashboard.EXPORT_MIMETYPES[fmt].encode()),
+                (b'content-disposition', dashboard.export_disposition(channel, fmt).encode()),
+            ],
+        })
+        header = dashboard.export_header(fmt)
+        if header:
+            await send({'type': 'http.response.body', 'body': header.encode(), 'more_body': True})
+        while True:
+            pending = DB_EXECUTOR.submit(next, pages, None)
+            rows = await asyncio.wrap_future(pending)
+            if rows is None:
+                break
+            body = dashboard.encode_sample_page(rows, fmt).encode()
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        # fecha a conexão do gerador (também quando o cliente desconecta no meio)
+        await loop.run_in_executor(DB_EXECUTOR, _close_pages, pages, pending)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            DB_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        m = EXPORT_PATH.match(scope['path'])
+        if m:
+            await export_samples(scope, receive, send, m.group(1))
+            return
+    await flask_app(scope, receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run('dashboard_asgi:application', host=HOST, port=PORT, workers=WORKERS)
@@ -0,0 +1,240 @@
+"""
+Métricas de latência do dashboard (rotas e SQL) e log de queries lentas.
+
+- `Histogram`: contagem por faixas fixas de latência (ms), com soma, máximo e
+  percentis aproximados pelo limite superior da faixa.
+- `TimedConnection` / `TimedCursor`: `sqlite3.connect(..., factory=TimedConnection)`
+  cronometra cada statement (execute + fetch*/iteração) e registra em `REGISTRY`.
+- Statements acima de DASHBOARD_SLOW_QUERY_MS vão para o log de queries lentas
+  (DASHBOARD_SLOW_QUERY_LOG, uma linha JSON por query) com statement,
+  parâmetros, rota e `EXPLAIN QUERY PLAN`.
+
+As métricas são por processo: no modo ASGI com vários workers cada um tem as suas.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+SLOW_QUERY_MS = float(os.environ.get('DASHBOARD_SLOW_QUERY_MS', '200'))
+SLOW_QUERY_LOG = os.environ.get('DASHBOARD_SLOW_QUERY_LOG') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'slow_queries.log')
+# queries lentas mantidas em memória para o endpoint de métricas
+SLOW_QUERY_KEEP = 100
+# limite de statements distintos acompanhados (o IN (?, ?, ...) do /api/compare varia com o nº de canais)
+MAX_TRACKED_QUERIES = 1000
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+# rota (regra do Flask) da requisição em andamento, para atribuir as queries
+current_route = ContextVar('current_route', default=None)
+
+
+def is_full_scan(plan):
+    # SEARCH = busca por faixa no índice; SCAN (mesmo USING INDEX) percorre a tabela/índice inteiro
+    return any(d.startswith('SCAN ') and 'CONSTANT ROW' not in d for d in plan)
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum_ms', 'max_ms')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        i = 0
+        while ms > BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank = self.count * p / 100.0
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'avg_ms': round(self.sum_ms / self.count, 3) if self.count else None,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(self.max_ms, 3),
+            'buckets': {('+Inf' if b == float('inf') else str(b)): n for b, n in zip(BUCKETS_MS, self.counts) if n},
+        }
+
+
+class Registry:
+    def __init__(self, slow_ms=SLOW_QUERY_MS, slow_log=SLOW_QUERY_LOG):
+        self.slow_ms = slow_ms
+        self.slow_log = slow_log
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.routes = {}
+        self.queries = {}
+        self.query_routes = {}
+        self.slow = deque(maxlen=SLOW_QUERY_KEEP)
+
+    def record_route(self, route, ms):
+        with self.lock:
+            h = self.routes.get(route)
+            if h is None:
+                h = self.routes[route] = Histogram()
+            h.add(ms)
+
+    def record_query(self, conn, sql, params, ms):
+        route = current_route.get()
+        with self.lock:
+            h = self.queries.get(sql)
+            if h is None:
+                if len(self.queries) >= MAX_TRACKED_QUERIES:
+                    sql = '<outras>'
+                    h = self.queries.setdefault(sql, Histogram())
+                else:
+                    h = self.queries[sql] = Histogram()
+            h.add(ms)
+            if route:
+                self.query_routes.setdefault(sql, set()).add(route)
+        if ms >= self.slow_ms:
+            self._log_slow(conn, sql, params, ms, route)
+
+    def _log_slow(self, conn, sql, params, ms, route):
+        try:
+            # cursor comum (não cronometrado) para não registrar o próprio EXPLAIN
+            plan = [r[3] for r in sqlite3.Cursor(conn).execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()]
+        except sqlite3.Error as e:
+            plan = [f'erro: {e}']
+        entry = {
+            'ts': int(time.time()),
+            'route': route,
+            'ms': round(ms, 3),
+            'sql': sql,
+            'params': _jsonable(params),
+            'plan': plan,
+            'full_scan': is_full_scan(plan),
+        }
+        with self.lock:
+            self.slow.append(entry)
+        logging.warning("Query lenta (%.1f ms, rota %s): %s %s", ms, route, sql, plan)
+        if self.slow_log:
+            try:
+                with open(self.slow_log, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + '\n')
+            except OSError:
+                logging.exception("Falha ao gravar log de queries lentas em %s", self.slow_log)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'since': int(self.started),
+                'slow_query_ms': self.slow_ms,
+                'routes': {r: h.snapshot() for r, h in sorted(self.routes.items())},
+                'queries': [
+                    dict(sql=sql, routes=sorted(self.query_routes.get(sql, ())), **h.snapshot())
+                    for sql, h in sorted(self.queries.items(), key=lambda kv: -kv[1].sum_ms)
+                ],
+                'slow_queries': list(self.slow),
+            }
+
+
+def _jsonable(params):
+    if isinstance(params, dict):
+        return {k: _jsonable(v) for k, v in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [_jsonable(v) for v in params]
+    if isinstance(params, bytes):
+        return f'<{len(params)} bytes>'
+    return params
+
+
+REGISTRY = Registry()
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor que soma o tempo de execute + fetch*/iteração de cada statement.
+
+    O SQLite só avança a query durante os fetches (ou `for row in cur`), então
+    o statement é registrado quando o resultado se esgota, no próximo execute
+    ou quando a conexão é fechada.
+    """
+
+    def __init__(self, connection):
+        super().__init__(connection)
+        self._sql = None
+        self._params = ()
+        self._elapsed = 0.0
+
+    def _timed(self, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._elapsed += time.perf_counter() - t0
+
+    def execute(self, sql, params=()):
+        self.finish()
+        self._sql, self._params, self._elapsed = sql, params, 0.0
+        return self._timed(super().execute, sql, params)
+
+    def __next__(self):
+        try:
+            return self._timed(super().__next__)
+        except StopIteration:
+            self.finish()
+            raise
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self.finish()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if not rows:
+            self.finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self.finish()
+        return rows
+
+    def finish(self):
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            REGISTRY.record_query(self.connection, sql, self._params, self._elapsed * 1000.0)
+
+
+class TimedConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cursors = []
+
+    def cursor(self, factory=TimedCursor):
+        cur = super().cursor(factory)
+        if isinstance(cur, TimedCursor):
+            self._cursors.append(cur)
+        return cur
+
+    def close(self):
+        for cur in self._cursors:
+            cur.finish()
+        self._cursors.clear()
+        super().close()
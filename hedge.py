@@ -0,0 +1,176 @@
+"""
+Prazo por poll e requisições "hedged" para cortar a cauda de latência do fetch.
+
+`Hedger.call` devolve a primeira resposta bem-sucedida sem nunca passar de
+FETCH_DEADLINE_SECONDS (padrão 10) desde o início do poll: estourado o prazo,
+levanta `DeadlineExceeded` (um TimeoutError, classificado como `timeout` pelo
+breaker). Sem hedge o request roda na própria thread do worker (quem faz o
+request respeita o prazo que recebe).
+
+Com MONITOR_HEDGE=1 as tentativas rodam num pool de HEDGE_THREADS threads
+compartilhado pelos workers; tentativas que perderam a corrida ou ainda não
+começaram quando o prazo acabou são canceladas, e as que já estão no meio do
+request desistem sozinhas no prazo. Se a primeira tentativa não respondeu depois do p95 da
+latência recente (janela das últimas HEDGE_WINDOW respostas de todos os
+canais, no mínimo HEDGE_MIN_DELAY segundos), uma segunda é disparada e vale a
+que responder primeiro. Erros HTTP (404, 429, 5xx) não geram hedge: só a
+demora. Para não multiplicar a carga na API (nem provocar 429), hedges ficam
+limitados a HEDGE_MAX_RATIO das requisições (padrão 5%).
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEADLINE = float(os.environ.get('FETCH_DEADLINE_SECONDS', '10'))
+ENABLED = os.environ.get('MONITOR_HEDGE') == '1'
+QUANTILE = float(os.environ.get('HEDGE_QUANTILE', '0.95'))
+MIN_DELAY = float(os.environ.get('HEDGE_MIN_DELAY', '0.05'))  # segundos
+MAX_RATIO = float(os.environ.get('HEDGE_MAX_RATIO', '0.05'))
+WINDOW = int(os.environ.get('HEDGE_WINDOW', '1000'))
+# threads do pool de tentativas com hedge (requests simultâneos de todos os canais)
+THREADS = int(os.environ.get('HEDGE_THREADS', '64'))
+MIN_HISTORY = 50  # respostas antes do primeiro hedge (sem p95 confiável, sem hedge)
+BURST = 10  # hedges acumuláveis além da taxa
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class LatencyWindow:
+    """Latências das últimas `size` respostas; o quantil é recalculado a cada `refresh` registros."""
+
+    def __init__(self, size=WINDOW, refresh=50):
+        self.values = deque(maxlen=size)
+        self.refresh = refresh
+        self._since = 0
+        self._sorted = []
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.values.append(seconds)
+            self._since += 1
+            if self._since >= self.refresh:
+                self._sorted = sorted(self.values)
+                self._since = 0
+
+    def quantile(self, q):
+        """Quantil `q` (0 a 1) da janela, ou None com menos de MIN_HISTORY respostas."""
+        values = self._sorted
+        if len(values) < MIN_HISTORY:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Hedger:
+    def __init__(self, deadline=DEADLINE, hedge=ENABLED, quantile=QUANTILE, min_delay=MIN_DELAY, max_ratio=MAX_RATIO,
+                 threads=THREADS):
+        self.deadline = deadline
+        self.hedge = hedge
+        self.threads = threads
+        self._executor = None
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.latency = LatencyWindow()
+        self._lock = threading.Lock()
+        self._tokens = float(BURST)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+
+    def hedge_delay(self):
+        """Segundos até disparar o hedge, ou None se ainda não há histórico."""
+        p = self.latency.quantile(self.quantile)
+        return None if p is None else max(self.min_delay, p)
+
+    def _take_token(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            self.hedges += 1
+            return True
+
+    def _pool(self):
+        # criado no primeiro hedge: sem MONITOR_HEDGE nenhuma thread extra
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='hedge')
+            return self._executor
+
+    def _timed(self, fn, deadline):
+        t0 = time.monotonic()
+        result = fn(deadline)
+        # latência de cada tentativa bem-sucedida, inclusive as que perderam a corrida
+        self.latency.record(time.monotonic() - t0)
+        return result
+
+    def _attempt(self, fn, deadline):
+        def run():
+            if time.monotonic() >= deadline:
+                raise DeadlineExceeded('tentativa não começou no prazo')
+            return self._timed(fn, deadline)
+        return self._pool().submit(run)
+
+    def _expired(self):
+        with self._lock:
+            self.deadline_exceeded += 1
+        return DeadlineExceeded(f'sem resposta em {self.deadline:.1f}s')
+
+    def call(self, fn):
+        """Roda `fn(deadline)` (deadline em time.monotonic()) com prazo e hedge; devolve o resultado da primeira que der certo.
+
+        Se todas as tentativas falharem antes do prazo, levanta o erro da
+        primeira; se o prazo estourar, `DeadlineExceeded`.
+        """
+        deadline = time.monotonic() + self.deadline
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(BURST, self._tokens + self.max_ratio)
+        if not self.hedge:
+            try:
+                return self._timed(fn, deadline)
+            except Exception as e:
+                if time.monotonic() < deadline:
+                    raise
+                raise self._expired() from e
+        primary = self._attempt(fn, deadline)
+        pending = {primary}
+        delay = self.hedge_delay()
+        if delay is not None and delay < self.deadline:
+            done, _ = wait(pending, timeout=delay)
+            if not done and self._take_token():
+                pending.add(self._attempt(fn, deadline))
+        failure = None
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is not primary:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return future.result()
+                    if failure is None or future is primary:
+                        failure = future.exception()
+        finally:
+            for future in pending:
+                future.cancel()
+        if failure is not None and not pending:
+            raise failure
+        raise self._expired()
+
+    def stats(self):
+        p = self.latency.quantile(self.quantile)
+        return {
+            'requests': self.requests, 'hedges': self.hedges, 'hedge_wins': self.hedge_wins,
+            'deadline_exceeded': self.deadline_exceeded, 'hedge_delay_ms': None if p is None else round(p * 1000.0, 1),
+        }
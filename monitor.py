@@ -12,24 +12,59 @@ Use `run_supervisor.py` para reiniciar o processo se ele encerrar.
 import urllib.request
 import urllib.error
 import json
+import base64
 import sqlite3
 import threading
+import itertools
 import time
 import os
 import sys
 import logging
+from contextlib import nullcontext
 from datetime import datetime, timezone
 
+import anomaly
+import breaker
+import capture
+import checkpoint
+import hedge
+import partitions
+import profiler
+import realtime
+import ring
+import sketch
+import spool
+
 # Allow overriding DB paths via environment (useful in containers)
 DB_PATH = os.environ.get('MONITOR_DB_PATH') or os.path.join(os.path.dirname(__file__), "kick_monitor.sqlite3")
 # channels.txt fallback path
 CHANNELS_FILE = os.environ.get('CHANNELS_FILE') or os.path.join(os.path.dirname(__file__), "channels.txt")
 # fallback path for the web/dashboard DB used to store channels
 FDS_DB_FALLBACK = os.environ.get('FDS_DB_PATH') or os.path.join(os.path.dirname(__file__), "fds_bot.db")
+# base da API da Kick; sobrescrevível para apontar para um stand-in local (ver bench/fake_kick.py)
+KICK_API_BASE = (os.environ.get('KICK_API_BASE') or "https://kick.com/api/v1").rstrip('/')
 POLL_INTERVAL = 30  # segundos
 SUPERVISOR_INTERVAL = 5  # segundos, checa status dos workers
 RECONCILE_INTERVAL = 60  # segundos entre runs do reconciler
+# prazo total do stop para os workers terminarem (todos param em paralelo); acima do prazo de um fetch
+STOP_TIMEOUT = float(os.environ.get('MONITOR_STOP_TIMEOUT', '15'))
 STALE_MINUTES = 10  # minutos de inatividade para considerar uma session encerrada
+# estado dos workers salvo periodicamente para reinício a quente (ver checkpoint.py)
+CHECKPOINT_PATH = os.environ.get('MONITOR_CHECKPOINT_PATH') or checkpoint.path_for(DB_PATH)
+# spool local das amostras (ver spool.py); MONITOR_SPOOL=0 volta a gravar direto no banco a cada poll
+SPOOL_DIR = os.environ.get('MONITOR_SPOOL_DIR') or DB_PATH + '.spool'
+USE_SPOOL = os.environ.get('MONITOR_SPOOL', '1') != '0'
+SPOOL_DRAIN_INTERVAL = float(os.environ.get('SPOOL_DRAIN_INTERVAL', '1'))  # segundos entre drenagens
+SPOOL_BATCH = 1000  # registros por transação do drainer
+SPOOL_LOCK_TIMEOUT = 5  # segundos esperando o lock do banco antes de tentar de novo mais tarde
+# últimas amostras por canal em memória compartilhada para o dashboard (ver ring.py)
+RING_PATH = ring.path_for(DB_PATH)
+# versão do schema criado por init_db (PRAGMA user_version); incremente ao mudar tabelas, colunas ou índices
+SCHEMA_VERSION = 5
+# iterações do worker acima disso são logadas com o tempo de cada etapa (fetch, parse, session, insert, peaks)
+SLOW_POLL_SECONDS = float(os.environ.get('SLOW_POLL_SECONDS', '5'))
+# prazo por poll e hedge compartilhados por todos os workers (ver hedge.py)
+HEDGER = hedge.Hedger()
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
@@ -54,9 +89,34 @@ def get_conn(path=DB_PATH, timeout=30):
     return conn
 
 
+def get_samples_conn(path=DB_PATH, timeout=30, months=()):
+    """get_conn para quem lê ou grava `samples`: com partições (partitions.ENABLED) anexa as do mês
+    atual e do anterior, mais `months`, atrás da view temporária `samples`."""
+    conn = get_conn(path, timeout=timeout)
+    if partitions.ENABLED:
+        attach_sample_partitions(conn, path, months)
+    return conn
+
+
+def attach_sample_partitions(conn, path=DB_PATH, months=()):
+    """Cria as partições do mês atual e de `months` (destinos de escrita) e as anexa junto com a do mês anterior."""
+    now = partitions.month_of(int(time.time()))
+    for month in {now, *months}:
+        partitions.create(path, month)
+    return partitions.attach(conn, path, {partitions.add_months(now, -1), now, *months})
+
+
+def _samples_table(ts):
+    return partitions.table(ts) if partitions.ENABLED else 'samples'
+
+
 def init_db(path=DB_PATH):
     conn = get_conn(path)
     cur = conn.cursor()
+    # banco já no schema atual: pula CREATE/PRAGMA table_info/índices (restart rápido)
+    if cur.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+        conn.close()
+        return
 
     # Create base tables if they don't exist
     cur.execute(
@@ -102,6 +162,111 @@ def init_db(path=DB_PATH):
         )
         """
     )
+    # estado atual por canal (última amostra), mantido a cada poll pelos workers;
+    # permite montar o ranking "ao vivo agora" sem varrer samples
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS channel_state (
+            channel TEXT PRIMARY KEY,
+            last_ts INTEGER,
+            viewers INTEGER,
+            is_live INTEGER,
+            session_id INTEGER,
+            title TEXT,
+            ewma_viewers REAL,
+            ewma_std REAL,
+            slope_per_min REAL
+        )
+        """
+    )
+    # picos/quedas bruscas de viewers detectados pelos workers (anomaly.ViewerStats)
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            viewers INTEGER,
+            baseline REAL,
+            zscore REAL,
+            slope_per_min REAL,
+            session_id INTEGER
+        )
+        """
+    )
+    # sketches de viewers (sketch.QuantileSketch) mesclados por canal e período (day/week/month),
+    # para quantis de audiência sem reler samples; período = início da session em UTC
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS channel_sketches (
+            channel TEXT NOT NULL,
+            period TEXT NOT NULL,
+            period_start TEXT NOT NULL,
+            sketch BLOB,
+            sample_count INTEGER,
+            PRIMARY KEY (channel, period, period_start)
+        )
+        """
+    )
+    # posição do spool já carregada no banco, gravada na mesma transação dos registros
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS spool_state (
+            name TEXT PRIMARY KEY,
+            segment INTEGER NOT NULL,
+            position INTEGER NOT NULL
+        )
+        """
+    )
+    # saúde por canal (breaker.CircuitBreaker): falhas persistentes e quarentena de slugs mortos,
+    # gravada só nas transições de estado
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS channel_health (
+            channel TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            kind TEXT,
+            status INTEGER,
+            error TEXT,
+            failures INTEGER,
+            opened_ts INTEGER,
+            backoff_seconds INTEGER,
+            next_probe_ts INTEGER,
+            last_failure_ts INTEGER,
+            last_success_ts INTEGER,
+            updated_ts INTEGER
+        )
+        """
+    )
+    # fila de capturas de tela (capture.py): uma linha por canal ao vivo, consumida pelo screenshot-worker
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS capture_jobs (
+            channel TEXT PRIMARY KEY,
+            session_id INTEGER NOT NULL,
+            viewers INTEGER,
+            cadence_seconds INTEGER NOT NULL,
+            enqueued_ts INTEGER NOT NULL,
+            last_capture_ts INTEGER,
+            claimed_ts INTEGER,
+            claimed_by TEXT
+        )
+        """
+    )
+    # títulos de cada session (o título muda no meio da live), uma linha por troca;
+    # indexados para busca em session_titles_fts (ver _create_title_index)
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS session_titles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id INTEGER NOT NULL,
+            channel TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            title TEXT NOT NULL
+        )
+        """
+    )
     # channels table (for DB-based channel management)
     cur.execute(
         """
@@ -114,6 +279,8 @@ def init_db(path=DB_PATH):
     conn.commit()
 
     # Automatic migrations: ensure expected columns exist; add them when missing.
+    failed = []
+
     def ensure_columns(table, expected):
         try:
             cur.execute(f"PRAGMA table_info({table})")
@@ -125,8 +292,10 @@ def init_db(path=DB_PATH):
                         cur.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_def}")
                     except Exception:
                         logging.exception("Falha ao adicionar coluna %s.%s", table, col)
+                        failed.append(table)
         except Exception:
             logging.exception("Erro ao verificar colunas para tabela %s", table)
+            failed.append(table)
 
     samples_expected = {
         'raw_json': 'TEXT',
@@ -146,23 +315,77 @@ def init_db(path=DB_PATH):
         'avg_viewers': 'REAL',
         'max_viewers': 'INTEGER',
         'sample_count': 'INTEGER',
+        'p50_viewers': 'REAL',
+        'p90_viewers': 'REAL',
+        'p99_viewers': 'REAL',
+        'viewers_sketch': 'BLOB',
+    }
+    channel_state_expected = {
+        'ewma_viewers': 'REAL',
+        'ewma_std': 'REAL',
+        'slope_per_min': 'REAL',
     }
 
     ensure_columns('samples', samples_expected)
     ensure_columns('peaks', peaks_expected)
     ensure_columns('sessions', sessions_expected)
+    ensure_columns('channel_state', channel_state_expected)
 
     # Helpful indexes
     try:
         cur.execute("CREATE INDEX IF NOT EXISTS idx_samples_channel_ts ON samples(channel, ts)")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_sessions_channel_start ON sessions(channel, start_ts)")
+        # /session/<id>, _close_session e reconcile_sessions filtram samples só por session_id
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_samples_session ON samples(session_id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_events_channel_ts ON events(channel, ts)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_session_titles_session ON session_titles(session_id, ts)")
     except Exception:
         logging.exception("Falha ao criar índices")
+        failed.append('indexes')
 
+    if not cur.execute("SELECT 1 FROM session_titles LIMIT 1").fetchone():
+        # bancos anteriores ao histórico: o título de abertura de cada session
+        cur.execute("INSERT INTO session_titles (session_id, channel, ts, title) "
+                    "SELECT id, channel, COALESCE(start_ts, 0), title FROM sessions WHERE title IS NOT NULL AND title <> '' ORDER BY id")
+    try:
+        _create_title_index(cur)
+    except sqlite3.OperationalError:
+        # SQLite sem FTS5: os títulos continuam gravados, só a busca do dashboard fica indisponível
+        logging.exception("Falha ao criar o índice de busca de títulos (FTS5)")
+        failed.append('session_titles_fts')
+
+    # só marca a versão se tudo migrou; senão o próximo start tenta de novo
+    if not failed:
+        cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     conn.commit()
     conn.close()
 
 
+def _create_title_index(cur):
+    """Índice FTS5 de session_titles (título e canal), mantido por triggers; reconstruído se acabou de ser criado."""
+    exists = cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'session_titles_fts'").fetchone()
+    cur.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS session_titles_fts USING fts5("
+        "title, channel, content='session_titles', content_rowid='id', tokenize='unicode61 remove_diacritics 2', "
+        "prefix='2 3')"  # índices de prefixo: busca enquanto o usuário digita
+    )
+    cur.executescript("""
+        CREATE TRIGGER IF NOT EXISTS session_titles_ai AFTER INSERT ON session_titles BEGIN
+            INSERT INTO session_titles_fts (rowid, title, channel) VALUES (new.id, new.title, new.channel);
+        END;
+        CREATE TRIGGER IF NOT EXISTS session_titles_ad AFTER DELETE ON session_titles BEGIN
+            INSERT INTO session_titles_fts (session_titles_fts, rowid, title, channel) VALUES ('delete', old.id, old.title, old.channel);
+        END;
+        CREATE TRIGGER IF NOT EXISTS session_titles_au AFTER UPDATE ON session_titles BEGIN
+            INSERT INTO session_titles_fts (session_titles_fts, rowid, title, channel) VALUES ('delete', old.id, old.title, old.channel);
+            INSERT INTO session_titles_fts (rowid, title, channel) VALUES (new.id, new.title, new.channel);
+        END;
+    """)
+    if not exists:
+        cur.execute("INSERT INTO session_titles_fts (session_titles_fts) VALUES ('rebuild')")
+
+
 def read_channels(path=CHANNELS_FILE):
     # Try reading channels from kick_monitor.sqlite3 (channels table)
     try:
@@ -212,12 +435,34 @@ def read_channels(path=CHANNELS_FILE):
     return channels
 
 
-def fetch_channel(channel):
-    url = f"https://kick.com/api/v1/channels/{channel}"
+def _span(trace, name):
+    return trace.span(name) if trace is not None else nullcontext()
+
+
+def _http_get(url, deadline):
+    """GET de `url` que desiste em `deadline` (time.monotonic()), inclusive no meio de uma resposta lenta."""
     req = urllib.request.Request(url, headers={"User-Agent": "kick-monitor/1.0"})
+    with urllib.request.urlopen(req, timeout=max(0.001, deadline - time.monotonic())) as resp:
+        chunks = []
+        while True:
+            if time.monotonic() > deadline:
+                raise hedge.DeadlineExceeded('resposta não terminou no prazo')
+            chunk = resp.read(65536)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+
+def fetch_channel(channel, trace=None):
+    """(viewers, is_live, JSON do canal) ou (-1, 0, {'error': ...}) se o poll falhou.
+
+    O request respeita o prazo e o hedge de `HEDGER` (hedge.py).
+    """
+    url = f"{KICK_API_BASE}/channels/{channel}"
     try:
-        with urllib.request.urlopen(req, timeout=12) as resp:
-            data = resp.read().decode("utf-8")
+        with _span(trace, 'fetch'):
+            data = HEDGER.call(lambda deadline: _http_get(url, deadline)).decode("utf-8")
+        with _span(trace, 'parse'):
             j = json.loads(data)
             viewers = None
             is_live = 0
@@ -233,47 +478,375 @@ def fetch_channel(channel):
             return int(viewers), int(is_live), j
     except urllib.error.HTTPError as e:
         logging.error("HTTP error ao buscar %s: %s", channel, e)
-        return -1, 0, {"error": str(e)}
+        return -1, 0, {"error": str(e), "status": e.code}
     except Exception as e:
         logging.error("Erro ao buscar %s: %s", channel, e)
-        return -1, 0, {"error": str(e)}
+        timeout = isinstance(e, TimeoutError) or isinstance(getattr(e, 'reason', None), TimeoutError)
+        return -1, 0, {"error": str(e), "kind": 'timeout' if timeout else 'network'}
 
 
-def save_sample(channel, viewers, is_live, raw_json, session_id=None, path=DB_PATH):
-    ts = int(time.time())
-    conn = get_conn(path)
-    cur = conn.cursor()
+def save_sample(channel, viewers, is_live, raw_json, session_id=None, path=DB_PATH, title=None, trace=None, stats=None,
+                peaks=None, ts=None, spool=None):
+    """Grava a amostra e atualiza channel_state e picos.
+
+    Com `stats` (anomaly.ViewerStats do worker), amostras ao vivo alimentam a
+    detecção incremental e eventuais picos/quedas vão para `events` na mesma transação.
+    `peaks` é o cache de picos do worker (ver update_peaks). Com `spool`
+    (spool.Spool) a amostra só é anexada ao spool e drain_spool a grava depois:
+    o poll não espera por locks do banco.
+    """
+    if ts is None:
+        ts = int(time.time())
+    if spool is not None:
+        with _span(trace, 'insert'):
+            spool_sample(spool, channel, ts, viewers, is_live, raw_json, session_id, title, stats, peaks, path)
+        return
+    with _span(trace, 'insert'):
+        if not _insert_sample(channel, ts, viewers, is_live, raw_json, session_id, path, title, stats):
+            return
+    with _span(trace, 'peaks'):
+        try:
+            update_peaks(channel, ts, viewers, path, cache=peaks)
+        except Exception as e:
+            logging.exception("Falha ao atualizar picos: %s", e)
+
+
+def _raw_str(raw_json):
     # serializar JSON de forma segura
     try:
-        raw_str = json.dumps(raw_json, ensure_ascii=False, default=str)
+        return json.dumps(raw_json, ensure_ascii=False, default=str)
     except Exception:
         try:
-            raw_str = str(raw_json)
+            return str(raw_json)
         except Exception:
-            raw_str = None
+            return None
+
+
+def _observe(stats, ts, viewers, is_live):
+    """Passa uma amostra ao vivo por `stats`; devolve ((média, desvio, inclinação) ou None, evento ou None)."""
+    if stats is None or not is_live or viewers is None or viewers < 0:
+        return None, None
+    event = stats.update(ts, viewers)
+    return (stats.mean, stats.std, stats.slope_per_min), event
+
+
+def _insert_sample(channel, ts, viewers, is_live, raw_json, session_id, path, title, stats=None):
+    conn = get_samples_conn(path, months=[partitions.month_of(ts)] if partitions.ENABLED else ())
+    cur = conn.cursor()
+    trend, event = _observe(stats, ts, viewers, is_live)
+    if not _write_sample(cur, channel, ts, viewers, is_live, _raw_str(raw_json), session_id, title, trend, event):
+        conn.rollback()
+        conn.close()
+        return False
+    conn.commit()
+    conn.close()
+    return True
+
+
+def _write_sample(cur, channel, ts, viewers, is_live, raw_str, session_id, title, trend=None, event=None):
+    """Insere a amostra, o evento e o channel_state no cursor/transação do chamador; False se a amostra não entrou.
+
+    Com partições a conexão precisa ter a partição do mês de `ts` anexada (ver get_samples_conn).
+    """
+    table = _samples_table(ts)
     try:
         cur.execute(
-            "INSERT INTO samples (channel, ts, viewers, is_live, raw_json, session_id) VALUES (?, ?, ?, ?, ?, ?)",
+            f"INSERT INTO {table} (channel, ts, viewers, is_live, raw_json, session_id) VALUES (?, ?, ?, ?, ?, ?)",
             (channel, ts, viewers, is_live, raw_str, session_id),
         )
     except Exception:
         logging.exception("DB insert falhou para sample (tentando fallback sem raw_json)")
         try:
             cur.execute(
-                "INSERT INTO samples (channel, ts, viewers, is_live, session_id) VALUES (?, ?, ?, ?, ?)",
+                f"INSERT INTO {table} (channel, ts, viewers, is_live, session_id) VALUES (?, ?, ?, ?, ?)",
                 (channel, ts, viewers, is_live, session_id),
             )
         except Exception:
             logging.exception("DB insert falhou no fallback para sample; descartando amostra")
-            conn.rollback()
-            conn.close()
-            return
+            return False
+    if event is not None:
+        try:
+            save_event(cur, channel, event, session_id)
+        except Exception:
+            logging.exception("Falha ao gravar evento para %s", channel)
+    try:
+        update_channel_state(cur, channel, ts, viewers, is_live, session_id, title, trend)
+    except Exception:
+        logging.exception("Falha ao atualizar channel_state para %s", channel)
+    return True
+
+
+def spool_sample(spool, channel, ts, viewers, is_live, raw_json, session_id=None, title=None, stats=None, peaks=None,
+                 path=DB_PATH):
+    """Equivalente a _insert_sample + update_peaks que só anexa um registro ao spool.
+
+    Estatísticas e eventos são calculados aqui, na ordem das amostras; o cache
+    de picos decide se o drainer precisa tocar `peaks`.
+    """
+    trend, event = _observe(stats, ts, viewers, is_live)
+    spool.append({
+        'type': 'sample', 'channel': channel, 'ts': ts, 'viewers': viewers, 'is_live': is_live,
+        'raw_json': _raw_str(raw_json), 'session_id': session_id, 'title': title,
+        'trend': trend, 'event': event, 'peaks': _peaks_changed(channel, ts, viewers, path, peaks),
+    })
+
+
+def spool_open_session(spool, session_id, channel, livestream_id, title, start_ts):
+    """_create_session pelo spool, com o id já reservado pelo Supervisor (ver next_session_id)."""
+    spool.append({'type': 'open', 'session_id': session_id, 'channel': channel, 'livestream_id': livestream_id,
+                  'title': title, 'start_ts': start_ts})
+    logging.info("Nova session criada para %s: id=%s livestream_id=%s", channel, session_id, livestream_id)
+    return session_id
+
+
+def spool_close_session(spool, session_id, end_ts, viewers_sketch=None):
+    """_close_session pelo spool: aplicado depois das amostras da session que ainda não foram drenadas."""
+    blob = base64.b64encode(viewers_sketch.to_bytes()).decode('ascii') if viewers_sketch is not None else None
+    spool.append({'type': 'close', 'session_id': session_id, 'end_ts': end_ts, 'sketch': blob})
+
+
+def spool_position(conn):
+    r = conn.execute("SELECT segment, position FROM spool_state WHERE name = 'samples'").fetchone()
+    return (r[0], r[1]) if r else (0, 0)
+
+
+def next_session_id(conn, sample_spool):
+    """Primeiro id livre de session, contando os 'open' do spool ainda não drenados.
+
+    Com o spool os ids são reservados pelo monitor (único processo que insere
+    sessions) para as amostras já saírem com session_id sem esperar o banco.
+    """
+    top = conn.execute("SELECT MAX(id) FROM sessions").fetchone()[0] or 0
+    # AUTOINCREMENT: não reutilizar ids de sessions apagadas
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'sessions'").fetchone()
+    top = max(top, seq[0] if seq else 0)
+    position = spool_position(conn)
+    while True:
+        records, next_position = sample_spool.read(position, SPOOL_BATCH)
+        if not records and next_position == position:
+            return top + 1
+        top = max([top] + [r['session_id'] for r in records if r['type'] == 'open'])
+        position = next_position
+
+
+def _apply_spool_record(cur, rec):
+    if rec['type'] == 'health':
+        _write_channel_health(cur, rec['channel'], rec['ts'], rec['health'])
+        return
+    if rec['type'] == 'forget':
+        _delete_channel_state(cur, rec['channel'])
+        return
+    if rec['type'] == 'capture':
+        _write_capture_job(cur, rec['channel'], rec['session_id'], rec['viewers'], rec['cadence'], rec['ts'])
+        return
+    if rec['type'] == 'open':
+        cur.execute("INSERT INTO sessions (id, channel, livestream_id, title, start_ts) VALUES (?, ?, ?, ?, ?)",
+                    (rec['session_id'], rec['channel'], rec['livestream_id'], rec['title'], rec['start_ts']))
+        _write_session_title(cur, rec['session_id'], rec['channel'], rec['start_ts'], rec['title'])
+        return
+    if rec['type'] == 'title':
+        _write_session_title(cur, rec['session_id'], rec['channel'], rec['ts'], rec['title'])
+        return
+    if rec['type'] == 'close':
+        blob = rec.get('sketch')
+        viewers_sketch = sketch.QuantileSketch.from_bytes(base64.b64decode(blob)) if blob else None
+        _finish_session(cur, rec['session_id'], rec['end_ts'], viewers_sketch)
+        return
+    channel, ts, viewers = rec['channel'], rec['ts'], rec['viewers']
+    if _write_sample(cur, channel, ts, viewers, rec['is_live'], rec['raw_json'], rec['session_id'], rec['title'],
+                     rec['trend'], rec['event']) and rec['peaks']:
+        upsert_peaks(cur, channel, ts, viewers)
+
+
+def drain_spool(sample_spool, path=DB_PATH, batch=SPOOL_BATCH, timeout=SPOOL_LOCK_TIMEOUT):
+    """Carrega no banco os registros pendentes do spool, `batch` por transação; devolve quantos aplicou.
+
+    A posição consumida vai para `spool_state` na mesma transação dos registros,
+    então nada é aplicado duas vezes mesmo com crash no meio. Se o banco ficar
+    travado por mais de `timeout` segundos, sqlite3.OperationalError sobe para o
+    chamador tentar de novo depois; os registros continuam no spool. Com
+    partições o lote grava em mais de um arquivo e o SQLite só garante a
+    atomicidade por arquivo em WAL: um crash no meio do commit pode perder ou
+    repetir as amostras daquele lote.
+    """
+    conn = get_samples_conn(path, timeout=timeout)
+    conn.isolation_level = None  # transações explícitas (BEGIN IMMEDIATE por lote)
+    try:
+        position = spool_position(conn)
+        applied = 0
+        while True:
+            records, next_position = sample_spool.read(position, batch)
+            if not records and next_position == position:
+                break
+            if partitions.ENABLED:
+                # ATTACH não roda dentro de transação: partições dos meses do lote antes do BEGIN
+                attach_sample_partitions(conn, path, {partitions.month_of(r['ts']) for r in records if r['type'] == 'sample'})
+            cur = conn.cursor()
+            cur.execute('BEGIN IMMEDIATE')
+            try:
+                for rec in records:
+                    try:
+                        _apply_spool_record(cur, rec)
+                    except sqlite3.OperationalError:
+                        raise
+                    except Exception:
+                        logging.exception("Spool: registro %s inválido descartado", rec.get('type'))
+                cur.execute(
+                    "INSERT INTO spool_state (name, segment, position) VALUES ('samples', ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET segment = excluded.segment, position = excluded.position",
+                    next_position,
+                )
+                cur.execute('COMMIT')
+            except BaseException:
+                cur.execute('ROLLBACK')
+                raise
+            position = next_position
+            applied += len(records)
+        sample_spool.truncate(position[0])
+        return applied
+    finally:
+        conn.close()
+
+
+def update_channel_state(cur, channel, ts, viewers, is_live, session_id=None, title=None, trend=None):
+    """Upsert da linha de `channel_state` do canal (executa no cursor/transação do chamador).
+
+    `trend` ((média, desvio, inclinação) de anomaly.ViewerStats) preenche média/desvio EWMA
+    e inclinação; sem ele ficam NULL.
+    """
+    ewma, std, slope = trend if trend is not None else (None, None, None)
+    cur.execute(
+        """
+        INSERT INTO channel_state (channel, last_ts, viewers, is_live, session_id, title, ewma_viewers, ewma_std, slope_per_min)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(channel) DO UPDATE SET
+            last_ts = excluded.last_ts,
+            viewers = excluded.viewers,
+            is_live = excluded.is_live,
+            session_id = excluded.session_id,
+            title = excluded.title,
+            ewma_viewers = excluded.ewma_viewers,
+            ewma_std = excluded.ewma_std,
+            slope_per_min = excluded.slope_per_min
+        """,
+        (channel, ts, viewers, is_live, session_id, title, ewma, std, slope),
+    )
+
+
+def save_event(cur, channel, event, session_id=None):
+    """Insere um evento de anomaly.ViewerStats.update em `events` (cursor/transação do chamador)."""
+    cur.execute(
+        "INSERT INTO events (channel, ts, kind, viewers, baseline, zscore, slope_per_min, session_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (channel, event['ts'], event['kind'], event['viewers'], event['baseline'], event['zscore'],
+         event['slope_per_min'], session_id),
+    )
+    logging.info("Evento %s em %s: %s viewers (média %.0f)", event['kind'], channel, event['viewers'], event['baseline'])
+
+
+def _delete_channel_state(cur, channel):
+    """Apaga channel_state, channel_health e capture_jobs do canal (cursor/transação do chamador)."""
+    cur.execute("DELETE FROM channel_state WHERE channel = ?", (channel,))
+    cur.execute("DELETE FROM channel_health WHERE channel = ?", (channel,))
+    cur.execute("DELETE FROM capture_jobs WHERE channel = ?", (channel,))
+
+
+def delete_channel_state(channel, path=DB_PATH, spool=None):
+    """Esquece o estado de um canal removido (direto no banco ou pelo spool).
+
+    Com o spool a remoção é um registro 'forget' depois dos últimos registros
+    do worker: apagar direto no banco deixaria o drainer recriar as linhas com
+    as amostras/health/capture do canal que ainda estavam no spool.
+    """
+    if spool is not None:
+        spool.append({'type': 'forget', 'channel': channel})
+        return
+    conn = get_conn(path)
+    _delete_channel_state(conn.cursor(), channel)
+    conn.commit()
+    conn.close()
+
+
+HEALTH_COLUMNS = ('state', 'kind', 'status', 'error', 'failures', 'opened_ts', 'backoff_seconds', 'next_probe_ts',
+                  'last_failure_ts', 'last_success_ts')
+
+
+def _get_channel_health(channel, path=DB_PATH):
+    conn = get_conn(path)
+    r = conn.execute(f"SELECT {', '.join(HEALTH_COLUMNS)} FROM channel_health WHERE channel = ?", (channel,)).fetchone()
+    conn.close()
+    return dict(zip(HEALTH_COLUMNS, r)) if r else None
+
+
+def _write_channel_health(cur, channel, ts, row):
+    """Upsert da linha de `channel_health` (breaker.CircuitBreaker.row) no cursor/transação do chamador."""
+    cur.execute(
+        f"INSERT INTO channel_health (channel, {', '.join(HEALTH_COLUMNS)}, updated_ts) "
+        f"VALUES (?, {', '.join('?' * len(HEALTH_COLUMNS))}, ?) "
+        f"ON CONFLICT(channel) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in HEALTH_COLUMNS)}, "
+        "updated_ts = excluded.updated_ts",
+        (channel, *(row[c] for c in HEALTH_COLUMNS), ts),
+    )
+
+
+def save_channel_health(channel, health, ts, spool=None):
+    """Grava o estado do breaker do canal (direto no banco ou pelo spool, como as amostras)."""
+    if spool is not None:
+        spool.append({'type': 'health', 'channel': channel, 'ts': ts, 'health': health.row()})
+        return
+    conn = get_conn()
+    _write_channel_health(conn.cursor(), channel, ts, health.row())
+    conn.commit()
+    conn.close()
+
+
+def _write_capture_job(cur, channel, session_id, viewers, cadence_seconds, ts):
+    """Upsert do job de captura do canal; uma session nova volta a pedir captura imediata."""
+    cur.execute(
+        "INSERT INTO capture_jobs (channel, session_id, viewers, cadence_seconds, enqueued_ts) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(channel) DO UPDATE SET viewers = excluded.viewers, cadence_seconds = excluded.cadence_seconds, "
+        "last_capture_ts = CASE WHEN session_id = excluded.session_id THEN last_capture_ts END, "
+        "claimed_ts = CASE WHEN session_id = excluded.session_id THEN claimed_ts END, "
+        "claimed_by = CASE WHEN session_id = excluded.session_id THEN claimed_by END, "
+        "enqueued_ts = CASE WHEN session_id = excluded.session_id THEN enqueued_ts ELSE excluded.enqueued_ts END, "
+        "session_id = excluded.session_id",
+        (channel, session_id, viewers, cadence_seconds, ts),
+    )
+
+
+def save_capture_job(channel, session_id, viewers, cadence_seconds, ts, spool=None):
+    """Publica/atualiza o job de captura do canal ao vivo (direto no banco ou pelo spool)."""
+    if spool is not None:
+        spool.append({'type': 'capture', 'channel': channel, 'session_id': session_id, 'viewers': viewers,
+                      'cadence': cadence_seconds, 'ts': ts})
+        return
+    conn = get_conn()
+    _write_capture_job(conn.cursor(), channel, session_id, viewers, cadence_seconds, ts)
+    conn.commit()
+    conn.close()
+
+
+def _write_session_title(cur, session_id, channel, ts, title):
+    """Registra o título da session em session_titles se ele mudou desde o último registrado."""
+    if not title:
+        return
+    r = cur.execute("SELECT title FROM session_titles WHERE session_id = ? ORDER BY ts DESC, id DESC LIMIT 1",
+                    (session_id,)).fetchone()
+    if r and r[0] == title:
+        return
+    cur.execute("INSERT INTO session_titles (session_id, channel, ts, title) VALUES (?, ?, ?, ?)",
+                (session_id, channel, ts, title))
+
+
+def save_session_title(session_id, channel, title, ts, spool=None):
+    """Troca de título no meio da session (direto no banco ou pelo spool)."""
+    if spool is not None:
+        spool.append({'type': 'title', 'session_id': session_id, 'channel': channel, 'title': title, 'ts': ts})
+        return
+    conn = get_conn()
+    _write_session_title(conn.cursor(), session_id, channel, ts, title)
     conn.commit()
     conn.close()
-    try:
-        update_peaks(channel, ts, viewers, path)
-    except Exception as e:
-        logging.exception("Falha ao atualizar picos: %s", e)
 
 
 def iso_date(ts):
@@ -295,58 +868,100 @@ def week_start_iso(ts):
 from datetime import timedelta
 
 
-def update_peaks(channel, ts, viewers, path=DB_PATH):
-    conn = get_conn(path)
-    cur = conn.cursor()
-    cur.execute("SELECT peak_overall, peak_daily, peak_daily_date, peak_weekly, peak_week_start, peak_monthly, peak_month FROM peaks WHERE channel = ?", (channel,))
-    row = cur.fetchone()
+def merge_peaks(row, ts, viewers):
+    """Picos (na ordem do RETURNING de upsert_peaks) depois de uma amostra, sem tocar o banco."""
     today = iso_date(ts)
     month = iso_month(ts)
-    # compute week start iso (YYYY-MM-DD)
     week_start = week_start_iso(ts)
-
     if row is None:
-        # insert new
-        cur.execute(
-            "INSERT INTO peaks (channel, peak_overall, peak_overall_ts, peak_daily, peak_daily_date, peak_weekly, peak_week_start, peak_monthly, peak_month) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (channel, viewers, ts, viewers, today, viewers, week_start, viewers, month),
-        )
-    else:
-        (peak_overall, peak_daily, peak_daily_date, peak_weekly, peak_week_start, peak_monthly, peak_month) = row
-        # overall
-        if viewers > (peak_overall or 0):
-            cur.execute("UPDATE peaks SET peak_overall = ?, peak_overall_ts = ? WHERE channel = ?", (viewers, ts, channel))
-        # daily
-        if peak_daily_date != today:
-            # new day -> reset daily peak
-            cur.execute("UPDATE peaks SET peak_daily = ?, peak_daily_date = ? WHERE channel = ?", (viewers, today, channel))
-        else:
-            if viewers > (peak_daily or 0):
-                cur.execute("UPDATE peaks SET peak_daily = ? WHERE channel = ?", (viewers, channel))
-        # weekly (compare week_start)
-        if peak_week_start != week_start:
-            cur.execute("UPDATE peaks SET peak_weekly = ?, peak_week_start = ? WHERE channel = ?", (viewers, week_start, channel))
-        else:
-            if viewers > (peak_weekly or 0):
-                cur.execute("UPDATE peaks SET peak_weekly = ? WHERE channel = ?", (viewers, channel))
-        # monthly
-        if peak_month != month:
-            cur.execute("UPDATE peaks SET peak_monthly = ?, peak_month = ? WHERE channel = ?", (viewers, month, channel))
-        else:
-            if viewers > (peak_monthly or 0):
-                cur.execute("UPDATE peaks SET peak_monthly = ? WHERE channel = ?", (viewers, channel))
+        return [viewers, viewers, today, viewers, week_start, viewers, month]
+    overall, daily, daily_date, weekly, week, monthly, peak_month = row
+    return [
+        viewers if viewers > (overall or 0) else overall,
+        max(daily or 0, viewers) if daily_date == today else viewers,
+        today,
+        max(weekly or 0, viewers) if week == week_start else viewers,
+        week_start,
+        max(monthly or 0, viewers) if peak_month == month else viewers,
+        month,
+    ]
+
+
+def upsert_peaks(cur, channel, ts, viewers):
+    """Aplica a amostra em `peaks` (cursor/transação do chamador); devolve a linha resultante.
+
+    Janela nova (dia/semana/mês) reinicia o pico daquela janela; senão fica o
+    maior. O MAX sobre o valor gravado faz um cache desatualizado do chamador
+    nunca regredir um pico.
+    """
+    cur.execute(
+        """
+        INSERT INTO peaks (channel, peak_overall, peak_overall_ts, peak_daily, peak_daily_date, peak_weekly, peak_week_start, peak_monthly, peak_month)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(channel) DO UPDATE SET
+            peak_overall_ts = CASE WHEN excluded.peak_overall > COALESCE(peak_overall, 0) THEN excluded.peak_overall_ts ELSE peak_overall_ts END,
+            peak_overall = CASE WHEN excluded.peak_overall > COALESCE(peak_overall, 0) THEN excluded.peak_overall ELSE peak_overall END,
+            peak_daily = CASE WHEN peak_daily_date IS excluded.peak_daily_date THEN MAX(COALESCE(peak_daily, 0), excluded.peak_daily) ELSE excluded.peak_daily END,
+            peak_daily_date = excluded.peak_daily_date,
+            peak_weekly = CASE WHEN peak_week_start IS excluded.peak_week_start THEN MAX(COALESCE(peak_weekly, 0), excluded.peak_weekly) ELSE excluded.peak_weekly END,
+            peak_week_start = excluded.peak_week_start,
+            peak_monthly = CASE WHEN peak_month IS excluded.peak_month THEN MAX(COALESCE(peak_monthly, 0), excluded.peak_monthly) ELSE excluded.peak_monthly END,
+            peak_month = excluded.peak_month
+        RETURNING peak_overall, peak_daily, peak_daily_date, peak_weekly, peak_week_start, peak_monthly, peak_month
+        """,
+        (channel, viewers, ts, viewers, iso_date(ts), viewers, week_start_iso(ts), viewers, iso_month(ts)),
+    )
+    return list(cur.fetchone())
+
+
+def update_peaks(channel, ts, viewers, path=DB_PATH, cache=None):
+    """Atualiza os picos geral/diário/semanal/mensal do canal.
+
+    `cache` (dict do worker) guarda em 'row' os picos já conhecidos: amostras
+    que não superam nenhum pico da janela atual não tocam o banco.
+    """
+    row = cache.get('row') if cache is not None else None
+    if row is not None and merge_peaks(row, ts, viewers) == row:
+        return
+    conn = get_conn(path)
+    cur = conn.cursor()
+    new_row = upsert_peaks(cur, channel, ts, viewers)
     conn.commit()
     conn.close()
+    if cache is not None:
+        cache['row'] = new_row
+
+
+def _peaks_changed(channel, ts, viewers, path=DB_PATH, cache=None):
+    """Se a amostra muda algum pico, segundo o cache do worker (que é atualizado); sem cache, sempre True."""
+    if cache is None:
+        return True
+    if cache.get('row') is None:
+        # uma leitura por worker; em WAL leitores não esperam writers
+        conn = get_conn(path)
+        r = conn.execute(
+            "SELECT peak_overall, peak_daily, peak_daily_date, peak_weekly, peak_week_start, peak_monthly, peak_month "
+            "FROM peaks WHERE channel = ?", (channel,)).fetchone()
+        conn.close()
+        cache['row'] = list(r) if r else None
+    new_row = merge_peaks(cache['row'], ts, viewers)
+    if new_row == cache['row']:
+        return False
+    cache['row'] = new_row
+    return True
 
 
 def _get_open_session(channel, path=DB_PATH):
     conn = get_conn(path)
     cur = conn.cursor()
-    cur.execute("SELECT id, livestream_id FROM sessions WHERE channel = ? AND end_ts IS NULL ORDER BY start_ts DESC LIMIT 1", (channel,))
+    cur.execute(
+        "SELECT id, livestream_id, COALESCE((SELECT title FROM session_titles t WHERE t.session_id = s.id "
+        "ORDER BY ts DESC, t.id DESC LIMIT 1), title) "
+        "FROM sessions s WHERE channel = ? AND end_ts IS NULL ORDER BY start_ts DESC LIMIT 1", (channel,))
     r = cur.fetchone()
     conn.close()
     if r:
-        return {'id': r[0], 'livestream_id': r[1]}
+        return {'id': r[0], 'livestream_id': r[1], 'title': r[2]}
     return None
 
 
@@ -355,159 +970,506 @@ def _create_session(channel, livestream_id, title, start_ts, path=DB_PATH):
     cur = conn.cursor()
     cur.execute("INSERT INTO sessions (channel, livestream_id, title, start_ts) VALUES (?, ?, ?, ?)", (channel, livestream_id, title, start_ts))
     sid = cur.lastrowid
+    _write_session_title(cur, sid, channel, start_ts, title)
     conn.commit()
     conn.close()
     logging.info("Nova session criada para %s: id=%s livestream_id=%s", channel, sid, livestream_id)
     return sid
 
 
-def _close_session(session_id, end_ts, path=DB_PATH):
+def _close_session(session_id, end_ts, path=DB_PATH, viewers_sketch=None):
+    """Fecha a session e grava métricas, quantis e o sketch de viewers.
+
+    `viewers_sketch` é o sketch mantido pelo worker desde o início da session;
+    sem ele (reconcile, session recuperada após restart) é reconstruído a partir de samples.
+    """
+    conn = get_samples_conn(path)
+    _finish_session(conn.cursor(), session_id, end_ts, viewers_sketch)
+    conn.commit()
+    conn.close()
+
+
+def _finish_session(cur, session_id, end_ts, viewers_sketch=None):
+    """Corpo de _close_session no cursor/transação do chamador (também usado pelo drainer do spool)."""
     # atualiza end_ts e calcula métricas a partir de samples
-    conn = get_conn(path)
-    cur = conn.cursor()
+    cur.execute("SELECT channel, start_ts, end_ts FROM sessions WHERE id = ?", (session_id,))
+    session_row = cur.fetchone()
     cur.execute("UPDATE sessions SET end_ts = ? WHERE id = ?", (end_ts, session_id))
     # compute metrics
     cur.execute("SELECT AVG(viewers), MAX(viewers), COUNT(*) FROM samples WHERE session_id = ?", (session_id,))
     avg_v, max_v, cnt = cur.fetchone()
     cur.execute("UPDATE sessions SET avg_viewers = ?, max_viewers = ?, sample_count = ? WHERE id = ?", (avg_v or 0, max_v or 0, cnt or 0, session_id))
-    conn.commit()
-    conn.close()
-    logging.info("Session %s fechada: end_ts=%s avg=%.2f max=%s samples=%s", session_id, end_ts, avg_v or 0, max_v or 0, cnt or 0)
+    if viewers_sketch is None:
+        viewers_sketch = sketch.QuantileSketch()
+        for (v,) in cur.execute("SELECT viewers FROM samples WHERE session_id = ?", (session_id,)):
+            viewers_sketch.add(v)
+    p50, p90, p99 = viewers_sketch.quantiles((0.5, 0.9, 0.99))
+    blob = viewers_sketch.to_bytes()
+    cur.execute(
+        "UPDATE sessions SET p50_viewers = ?, p90_viewers = ?, p99_viewers = ?, viewers_sketch = ? WHERE id = ?",
+        (p50, p90, p99, blob, session_id),
+    )
+    # session fora do ar: sai da fila de capturas
+    cur.execute("DELETE FROM capture_jobs WHERE session_id = ?", (session_id,))
+    # só na primeira vez que a session fecha, para não contar duas vezes
+    # (ex.: reconcile fechou durante uma queda da API e o worker fecha de novo depois)
+    if session_row and session_row[1] and session_row[2] is None and viewers_sketch.count:
+        merge_channel_sketches(cur, session_row[0], session_row[1], viewers_sketch)
+    logging.info("Session %s fechada: end_ts=%s avg=%.2f max=%s samples=%s p50=%s p90=%s p99=%s",
+                 session_id, end_ts, avg_v or 0, max_v or 0, cnt or 0, p50, p90, p99)
+
+
+SKETCH_PERIODS = (('day', iso_date), ('week', week_start_iso), ('month', iso_month))
+
+
+def merge_channel_sketches(cur, channel, ts, viewers_sketch):
+    """Mescla o sketch de uma session nos períodos day/week/month do canal que contêm `ts`."""
+    for period, period_start_fn in SKETCH_PERIODS:
+        start = period_start_fn(ts)
+        cur.execute(
+            "SELECT sketch FROM channel_sketches WHERE channel = ? AND period = ? AND period_start = ?",
+            (channel, period, start),
+        )
+        r = cur.fetchone()
+        merged = sketch.QuantileSketch.from_bytes(r[0]) if r and r[0] else sketch.QuantileSketch(viewers_sketch.accuracy)
+        merged.merge(viewers_sketch)
+        cur.execute(
+            """
+            INSERT INTO channel_sketches (channel, period, period_start, sketch, sample_count) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(channel, period, period_start) DO UPDATE SET
+                sketch = excluded.sketch, sample_count = excluded.sample_count
+            """,
+            (channel, period, start, merged.to_bytes(), merged.count),
+        )
+
+
+class _PollFailed(Exception):
+    """Poll sem resposta utilizável (ver breaker.classify); o worker só espera o próximo."""
+
+
+def worker_main_loop(channel, stop_event, hub=None, restored=None, snapshots=None, spool=None, session_ids=None,
+                     ring_buffer=None):
+    """Loop de coleta de um canal.
+
+    Com `hub` (realtime.RealtimeHub), observações vindas do websocket são
+    processadas como polls assim que chegam e o poll REST do canal passa a ser
+    só reconciliação enquanto ele tiver cobertura em tempo real.
 
+    `restored` é o snapshot do canal lido do checkpoint (reinício a quente) e
+    `snapshots` o dict do Supervisor onde o worker publica o seu a cada iteração.
+    Com `spool` (spool.Spool) amostras, aberturas e fechamentos de session vão
+    para o spool em vez do banco, com ids de session tirados de `session_ids`.
 
-def worker_main_loop(channel, stop_event):
+    Polls que falham não geram amostra: alimentam o breaker.CircuitBreaker do
+    canal, que depois de falhas seguidas (404 = slug morto) põe o canal em
+    quarentena com backoff exponencial e registra o estado em `channel_health`.
+
+    Com `ring_buffer` (ring.RingWriter) cada amostra também vai para o bloco
+    do canal no ring buffer lido pelo dashboard.
+    """
     logging.info("Worker iniciado para: %s", channel)
-    # recuperar sessão aberta se existir
-    current = _get_open_session(channel)
+    stats = anomaly.ViewerStats()
+    health = breaker.CircuitBreaker()
+    peaks = {}
+    last_sample = None
+    observed = None
+    last_poll = None  # time.monotonic() do último poll REST; observações do websocket não contam
+    capture_tier = None  # faixa de viewers publicada em capture_jobs para a session atual
+    delay = 0
+    if restored:
+        current = restored.get('session')
+        if restored.get('stats'):
+            stats.restore(restored['stats'])
+        health.restore(restored.get('health'))
+        peaks['row'] = restored.get('peaks')
+        last_sample = restored.get('last_sample')
+        # retoma a agenda de antes do restart em vez de todos os canais pollarem juntos
+        delay = min(POLL_INTERVAL, (restored.get('next_due') or 0) - time.time())
+    else:
+        # recuperar sessão aberta se existir
+        current = _get_open_session(channel)
+        health.restore(_get_channel_health(channel))
+    # canal em quarentena: só volta a ser consultado no próximo probe
+    delay = max(delay, health.delay(time.time(), 0))
+    if delay > 0:
+        stop_event.wait(delay)
+    # a session do checkpoint pode ter sido trocada depois dele: confirmar no banco antes de criar outra
+    confirm_session = bool(restored)
     while not stop_event.is_set():
+        trace = profiler.PollTrace()
         try:
-            viewers, is_live, raw = fetch_channel(channel)
-            # extrair id da livestream se disponível
-            livestream = None
-            if isinstance(raw, dict):
-                livestream = raw.get('livestream') or raw.get('live_stream')
-            ls_id = None
-            title = None
-            if isinstance(livestream, dict):
-                ls_id = str(livestream.get('id') or livestream.get('uuid') or '')
-                title = livestream.get('session_title') or livestream.get('title') or None
-
-            ts = int(time.time())
+            failure = None
+            # ts da amostra é o momento do request, não o da resposta: uma resposta lenta não desloca o ponto no gráfico
+            requested_ts = int(time.time())
+            if observed is not None and observed[1]:
+                ls = observed[2].get('livestream') or {}
+                if not (ls.get('id') or ls.get('uuid')):
+                    # evento de live sem o id da livestream não abre session: consulta o canal pelo REST agora
+                    observed = None
+            if observed is not None:
+                viewers, is_live, raw = observed
+            else:
+                last_poll = time.monotonic()
+                viewers, is_live, raw = fetch_channel(channel, trace=trace)
+                failure = breaker.classify(raw)
+                if hub is not None and failure is None:
+                    hub.observe_poll(channel, raw)
+            if failure is not None:
+                # sem amostra de erro (viewers=-1): a session segue aberta e o reconcile
+                # a fecha se as falhas passarem de STALE_MINUTES
+                ts = requested_ts
+                if health.record_failure(ts, *failure):
+                    if health.state == 'open':
+                        logging.warning("%s em quarentena após %s falhas (%s %s); próximo probe em %ss",
+                                        channel, health.failures, failure[0], failure[1] or '', health.backoff)
+                        if current:
+                            # canal morto/fora: encerrar a session na última amostra vista
+                            close_session(current['id'], last_sample[0] if last_sample else ts, current.get('sketch'),
+                                          spool)
+                            current = None
+                            stats.reset()
+                    save_channel_health(channel, health, ts, spool)
+                raise _PollFailed
+            with trace.span('parse'):
+                # extrair id da livestream se disponível
+                livestream = None
+                if isinstance(raw, dict):
+                    livestream = raw.get('livestream') or raw.get('live_stream')
+                ls_id = None
+                title = None
+                if isinstance(livestream, dict):
+                    ls_id = str(livestream.get('id') or livestream.get('uuid') or '')
+                    title = livestream.get('session_title') or livestream.get('title') or None
+
+            ts = requested_ts
+            if observed is None and health.record_success(ts):
+                logging.info("%s respondendo de novo após %s falhas", channel, health.kind)
+                save_channel_health(channel, health, ts, spool)
             if is_live and ls_id:
                 # se não houver session atual ou livestream mudou, criar nova session
+                if confirm_session and (not current or str(current.get('livestream_id') or '') != ls_id):
+                    current = _get_open_session(channel)
+                    confirm_session = False
                 if not current or str(current.get('livestream_id') or '') != ls_id:
-                    sid = _create_session(channel, ls_id, title, ts)
-                    current = {'id': sid, 'livestream_id': ls_id}
+                    with trace.span('session'):
+                        if spool is not None:
+                            sid = spool_open_session(spool, next(session_ids), channel, ls_id, title, ts)
+                        else:
+                            sid = _create_session(channel, ls_id, title, ts)
+                    # sketch só para sessions vistas desde o início; as recuperadas
+                    # de um restart são reconstruídas a partir de samples no fechamento
+                    current = {'id': sid, 'livestream_id': ls_id, 'title': title, 'sketch': sketch.QuantileSketch()}
+                    stats.reset()
+                    capture_tier = None
+                elif title and title != current.get('title'):
+                    # título trocado no meio da live: entra no histórico/busca (session_titles)
+                    save_session_title(current['id'], channel, title, ts, spool)
+                    current['title'] = title
                 # salvar sample com session_id
-                save_sample(channel, viewers, is_live, raw, session_id=current['id'])
+                save_sample(channel, viewers, is_live, raw, session_id=current['id'], title=title, trace=trace, stats=stats,
+                            peaks=peaks, ts=ts, spool=spool)
+                if current.get('sketch') is not None:
+                    current['sketch'].add(viewers)
+                if capture.ENABLED:
+                    tier = capture.tier(viewers, capture_tier)
+                    if tier != capture_tier:
+                        # só nas mudanças de faixa (e no início da session), não a cada amostra
+                        save_capture_job(channel, current['id'], viewers, capture.cadence(tier), ts, spool)
+                        capture_tier = tier
             else:
                 # não está ao vivo
-                save_sample(channel, viewers, is_live, raw, session_id=None)
+                save_sample(channel, viewers, is_live, raw, session_id=None, trace=trace, stats=stats, peaks=peaks, ts=ts,
+                            spool=spool)
+                if not is_live:
+                    stats.reset()
                 if current:
                     # fechar session
-                    _close_session(current['id'], ts)
+                    with trace.span('session'):
+                        close_session(current['id'], ts, current.get('sketch'), spool)
                     current = None
+            last_sample = [ts, viewers, is_live]
+            if ring_buffer is not None:
+                ring_buffer.append(channel, ts, viewers, is_live)
             logging.info("%s -> viewers=%s is_live=%s session=%s", channel, viewers, is_live, current['id'] if current else None)
+        except _PollFailed:
+            pass
         except Exception:
             logging.exception("Erro não tratado no worker para %s", channel)
             # se ocorrer um erro grave, o loop continua e tentará novamente
+        if trace.total() > SLOW_POLL_SECONDS:
+            logging.warning("Poll lento para %s: total=%.3fs %s", channel, trace.total(), trace.summary())
+        interval = POLL_INTERVAL
+        if hub is not None and hub.is_covered(channel):
+            interval = realtime.RECONCILE_INTERVAL
+        fallback = None
+        if hub is not None:
+            # prazos contados do último poll REST: eventos frequentes não adiam a reconciliação
+            elapsed = time.monotonic() - last_poll
+            interval = max(0.0, interval - elapsed)
+            fallback = health.delay(time.time(), max(0.0, POLL_INTERVAL - elapsed))
+        interval = health.delay(time.time(), interval)
+        if snapshots is not None:
+            snapshots[channel] = _worker_snapshot(current, stats, peaks, last_sample, time.time() + interval, health)
+        if hub is not None:
+            # socket caiu durante a espera: volta ao POLL_INTERVAL
+            observed = hub.wait(channel, stop_event, interval, fallback)
+            continue
         # espera com interrupção responsiva
-        for _ in range(POLL_INTERVAL):
-            if stop_event.is_set():
-                break
-            time.sleep(1)
+        stop_event.wait(interval)
     # ao parar, fechar sessão aberta se houver
     if current:
-        _close_session(current['id'], int(time.time()))
+        close_session(current['id'], int(time.time()), current.get('sketch'), spool)
+    if snapshots is not None:
+        snapshots[channel] = _worker_snapshot(None, stats, peaks, last_sample, time.time(), health)
     logging.info("Worker parado para: %s", channel)
 
 
+def close_session(session_id, end_ts, viewers_sketch=None, spool=None):
+    if spool is not None:
+        spool_close_session(spool, session_id, end_ts, viewers_sketch)
+    else:
+        _close_session(session_id, end_ts, viewers_sketch=viewers_sketch)
+
+
+def _worker_snapshot(current, stats, peaks, last_sample, next_due, health=None):
+    """Estado do worker no formato do checkpoint (ver checkpoint.py); o sketch da session não entra,
+    sessions retomadas têm os quantis reconstruídos a partir de samples no fechamento."""
+    return {
+        'session': {'id': current['id'], 'livestream_id': current['livestream_id'], 'title': current.get('title')}
+                   if current else None,
+        'last_sample': last_sample,
+        'peaks': peaks.get('row'),
+        'stats': stats.snapshot(),
+        'next_due': next_due,
+        'health': health.snapshot() if health is not None else None,
+    }
+
+
 class Supervisor:
-    def __init__(self, channels):
+    def __init__(self, channels, hub=None, checkpoint_path=None, spool_dir=None, ring_path=None):
         self.channels = channels
         self.stop_event = threading.Event()
         self.threads = {}
         self._reconciler_thread = None
+        self._checkpoint_thread = None
+        self.hub = hub
+        # canal -> snapshot publicado pelo worker (ver checkpoint.py)
+        self.checkpoint_path = checkpoint_path
+        self.snapshots = {}
+        self.spool_dir = spool_dir
+        self.spool = None
+        self.session_ids = None
+        self._drain_thread = None
+        self.ring_path = ring_path
+        self.ring = None
+        # threads, channels e _stopping são alterados pelo loop do supervisor, pelo reconciler e pelo stop()
+        self._lock = threading.Lock()
+        # canal removido -> worker ainda terminando; o estado do canal é limpo quando ele sai (_worker_exited)
+        self._stopping = {}
 
     def start(self):
-        for ch in self.channels:
-            self._start_worker(ch)
+        restored = {}
+        if self.checkpoint_path:
+            restored = checkpoint.load(self.checkpoint_path, SCHEMA_VERSION, STALE_MINUTES * 60)
+            if restored:
+                logging.info("Reinício a quente: estado de %s canais carregado de %s", len(restored), self.checkpoint_path)
+        if self.spool_dir:
+            conn = get_conn()
+            self.spool = spool.Spool(self.spool_dir, min_segment=spool_position(conn)[0] + 1)
+            self.session_ids = itertools.count(next_session_id(conn, self.spool))
+            conn.close()
+            self._drain_thread = threading.Thread(target=self._drain_loop, daemon=True)
+            self._drain_thread.start()
+        if self.ring_path:
+            self.ring = ring.RingWriter(self.ring_path)
+        with self._lock:
+            for ch in self.channels:
+                self._start_worker(ch, restored.get(ch))
         # start reconciler
         self._reconciler_thread = threading.Thread(target=self._reconciler_loop, daemon=True)
         self._reconciler_thread.start()
+        if self.checkpoint_path:
+            self._checkpoint_thread = threading.Thread(target=self._checkpoint_loop, daemon=True)
+            self._checkpoint_thread.start()
         # loop supervisor
         try:
-            while not self.stop_event.is_set():
-                time.sleep(SUPERVISOR_INTERVAL)
+            while not self.stop_event.wait(SUPERVISOR_INTERVAL):
                 # check threads
-                for ch in list(self.channels):
-                    t = self.threads.get(ch)
-                    if t is None or not t.is_alive():
-                        logging.warning("Worker para %s morto. Reiniciando...", ch)
-                        self._start_worker(ch)
+                with self._lock:
+                    # stop() marca stop_event com o lock: workers que ele parou não são reiniciados aqui
+                    if self.stop_event.is_set():
+                        break
+                    for ch in self.channels:
+                        t = self.threads.get(ch)
+                        if t is None or not t.is_alive():
+                            logging.warning("Worker para %s morto. Reiniciando...", ch)
+                            self._start_worker(ch)
         except KeyboardInterrupt:
             logging.info("Supervisor recebendo KeyboardInterrupt, parando...")
             self.stop()
 
-    def _start_worker(self, ch):
-        # ensure previous thread stop
+    def _start_worker(self, ch, restored=None):
+        """Cria e inicia o worker de `ch`; chamar com self._lock."""
         stop_ev = threading.Event()
-        t = threading.Thread(target=worker_main_loop, args=(ch, stop_ev), daemon=True)
+        t = threading.Thread(target=self._run_worker, args=(ch, stop_ev, restored), daemon=True)
         t._stop_event = stop_ev
-        t.start()
+        t._exited = False
         self.threads[ch] = t
+        t.start()
+
+    def _run_worker(self, ch, stop_ev, restored):
+        try:
+            worker_main_loop(ch, stop_ev, self.hub, restored, self.snapshots, self.spool, self.session_ids, self.ring)
+        finally:
+            self._worker_exited(ch, threading.current_thread())
+
+    def _worker_exited(self, ch, t):
+        """Fim de um worker: se o canal foi removido, limpa o estado dele (na própria thread do worker)."""
+        with self._lock:
+            t._exited = True
+            if self._stopping.get(ch) is not t:
+                # morte inesperada (o loop do supervisor reinicia) ou stop do monitor
+                return
+        # o canal só sai de _stopping depois do 'forget': readicionado antes disso, o worker novo anexaria
+        # registros ao spool que o 'forget' apagaria ao ser drenado
+        self._forget_channel(ch)
+        with self._lock:
+            del self._stopping[ch]
+
+    def _forget_channel(self, ch):
+        self.snapshots.pop(ch, None)
+        if self.ring is not None:
+            self.ring.drop(ch)
+        if self.hub is not None:
+            self.hub.unregister(ch)
+        try:
+            delete_channel_state(ch, spool=self.spool)
+        except Exception:
+            logging.exception("Erro ao remover channel_state de %s", ch)
+
+    def _stop_workers(self, channels):
+        """Sinaliza o stop dos workers de canais removidos sem esperar por eles.
+
+        Todos param em paralelo; cada worker fecha a própria session e limpa o
+        estado do canal ao sair (_worker_exited), sem prender o reconciler.
+        """
+        forget = []
+        with self._lock:
+            for ch in channels:
+                logging.info("Reconciler: channel removed %s, stopping worker", ch)
+                try:
+                    self.channels.remove(ch)
+                except ValueError:
+                    pass
+                t = self.threads.pop(ch, None)
+                if t is None or t._exited:
+                    forget.append(ch)
+                    continue
+                self._stopping[ch] = t
+                t._stop_event.set()
+        for ch in forget:
+            self._forget_channel(ch)
 
-    def stop(self):
-        self.stop_event.set()
-        # signal workers to stop
-        for ch, t in self.threads.items():
-            ev = getattr(t, "_stop_event", None)
-            if ev:
-                ev.set()
-        # join
-        for ch, t in self.threads.items():
-            t.join(timeout=5)
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Para o monitor: sinaliza todos os workers de uma vez, espera até `timeout` segundos (no total) por
+        eles e faz a gravação final (checkpoint e drenagem do spool).
+
+        Workers que estouram o prazo são abandonados (são daemon); nesse caso
+        spool e ring ficam abertos para o que eles ainda gravarem: o spool é
+        drenado no próximo start.
+        """
+        with self._lock:
+            self.stop_event.set()
+            workers = list(self.threads.items()) + list(self._stopping.items())
+        for ch, t in workers:
+            t._stop_event.set()
+        deadline = time.monotonic() + timeout
+        for ch, t in workers:
+            t.join(max(0.0, deadline - time.monotonic()))
+        stuck = sorted(ch for ch, t in workers if t.is_alive())
+        if stuck:
+            logging.warning("Stop: %s workers não terminaram em %.0fs (%s)", len(stuck), timeout, ', '.join(stuck[:10]))
         # stop reconciler
         if self._reconciler_thread:
             self._reconciler_thread.join(timeout=2)
+        if self._checkpoint_thread:
+            self._checkpoint_thread.join(timeout=2)
+            self.save_checkpoint()
+        if self.spool is not None:
+            if self._drain_thread:
+                self._drain_thread.join(timeout=SPOOL_LOCK_TIMEOUT + 1)
+            try:
+                drain_spool(self.spool)
+            except Exception:
+                logging.exception("Spool: drenagem final falhou; registros ficam para o próximo start")
+            if not stuck:
+                self.spool.close()
+        if self.ring is not None and not stuck:
+            self.ring.close()
+        if self.hub is not None:
+            self.hub.stop()
+
+    def save_checkpoint(self):
+        try:
+            size = checkpoint.save(self.checkpoint_path, SCHEMA_VERSION, dict(self.snapshots))
+            logging.debug("Checkpoint gravado: %s canais, %s bytes", len(self.snapshots), size)
+        except Exception:
+            logging.exception("Falha ao gravar checkpoint em %s", self.checkpoint_path)
+
+    def _checkpoint_loop(self):
+        while not self.stop_event.wait(checkpoint.CHECKPOINT_INTERVAL):
+            self.save_checkpoint()
+
+    def _drain_loop(self):
+        wait = SPOOL_DRAIN_INTERVAL
+        while not self.stop_event.wait(wait):
+            try:
+                drain_spool(self.spool)
+                wait = SPOOL_DRAIN_INTERVAL
+            except sqlite3.OperationalError as e:
+                wait = min(30.0, wait * 2)
+                logging.warning("Spool: banco indisponível (%s); nova drenagem em %.0fs", e, wait)
+            except Exception:
+                logging.exception("Erro ao drenar o spool")
+
+    def _last_seen(self):
+        """session_id -> ts da última amostra gravada pelo worker, para o reconcile não consultar samples."""
+        last_seen = {}
+        for snap in list(self.snapshots.values()):
+            if snap.get('session') and snap.get('last_sample'):
+                last_seen[snap['session']['id']] = snap['last_sample'][0]
+        return last_seen
 
     def _reconciler_loop(self):
         logging.info("Reconciler started: closing stale sessions older than %s minutes", STALE_MINUTES)
         while not self.stop_event.is_set():
             try:
                 # close stale sessions as before
-                reconcile_sessions()
+                reconcile_sessions(last_seen=self._last_seen())
+                if partitions.ENABLED:
+                    # meses que o monitor não grava mais saem do WAL (leitores abrem com mode=ro e mmap)
+                    for month in partitions.seal_old(DB_PATH, partitions.month_of(int(time.time()))):
+                        logging.info("Partição de samples %s selada", month)
+                if HEDGER.hedge:
+                    logging.info("Fetch: %(requests)s requests, %(hedges)s hedges (%(hedge_wins)s venceram), "
+                                 "%(deadline_exceeded)s prazos estourados, hedge após %(hedge_delay_ms)s ms", HEDGER.stats())
                 # reload channels from DB and reconcile workers
                 try:
-                    db_channels = list(read_channels())
-                    db_set = set(db_channels)
-                    current_set = set(self.channels)
-                    # start workers for newly added channels
-                    for ch in sorted(db_set - current_set):
-                        logging.info("Reconciler: new channel detected %s, starting worker", ch)
-                        self.channels.append(ch)
-                        self._start_worker(ch)
-                    # stop workers for removed channels
-                    for ch in sorted(current_set - db_set):
-                        logging.info("Reconciler: channel removed %s, stopping worker", ch)
-                        t = self.threads.get(ch)
-                        if t:
-                            ev = getattr(t, "_stop_event", None)
-                            if ev:
-                                ev.set()
-                            try:
-                                t.join(timeout=5)
-                            except Exception:
-                                logging.exception("Erro ao juntar thread de %s", ch)
-                            # clean up
-                            try:
-                                del self.threads[ch]
-                            except KeyError:
-                                pass
-                        try:
-                            self.channels.remove(ch)
-                        except ValueError:
-                            pass
+                    db_set = set(read_channels())
+                    with self._lock:
+                        if self.stop_event.is_set():
+                            break
+                        current_set = set(self.channels)
+                        # start workers for newly added channels
+                        for ch in sorted(db_set - current_set):
+                            if ch in self._stopping:
+                                # removido e readicionado: o worker antigo ainda está saindo; entra no próximo ciclo
+                                continue
+                            logging.info("Reconciler: new channel detected %s, starting worker", ch)
+                            self.channels.append(ch)
+                            self._start_worker(ch)
+                    # stop workers for removed channels (sem esperar: ver _stop_workers)
+                    self._stop_workers(sorted(current_set - db_set))
                 except Exception:
                     logging.exception("Erro ao reconciliar lista de canais")
             except Exception:
@@ -522,20 +1484,30 @@ def one_shot(channels):
     init_db()
     for ch in channels:
         viewers, is_live, raw = fetch_channel(ch)
+        if breaker.classify(raw):
+            print(f"{ch}: erro {raw['error']}")
+            continue
         save_sample(ch, viewers, is_live, raw)
         print(f"{ch}: viewers={viewers} is_live={is_live}")
 
 
-def reconcile_sessions(path=DB_PATH):
-    """Fechar sessions que estão abertas mas não receberam samples nos últimos STALE_MINUTES."""
+def reconcile_sessions(path=DB_PATH, last_seen=None):
+    """Fechar sessions que estão abertas mas não receberam samples nos últimos STALE_MINUTES.
+
+    `last_seen` (session_id -> ts da última amostra, mantido pelos workers) evita
+    consultar samples para as sessions que algum worker está acompanhando.
+    """
+    last_seen = last_seen or {}
     cutoff = int(time.time()) - STALE_MINUTES * 60
-    conn = get_conn(path)
+    conn = get_samples_conn(path)
     cur = conn.cursor()
     # encontrar sessions abertas
     cur.execute("SELECT id, channel, start_ts FROM sessions WHERE end_ts IS NULL")
     open_sessions = cur.fetchall()
     for sid, channel, start_ts in open_sessions:
         # verificar último sample para esta session
+        if last_seen.get(sid, 0) >= cutoff:
+            continue
         cur.execute("SELECT MAX(ts) FROM samples WHERE session_id = ?", (sid,))
         r = cur.fetchone()
         last_ts = r[0] if r else None
@@ -555,6 +1527,8 @@ def main(argv):
     once = False
     if len(argv) > 1 and argv[1] in ("--once", "-1"):
         once = True
+    # ingestão por eventos (websocket da Kick) com polling como reconciliação/fallback
+    use_realtime = "--realtime" in argv[1:] or os.environ.get('MONITOR_REALTIME') == '1'
 
     channels = read_channels()
     if not channels:
@@ -567,7 +1541,11 @@ def main(argv):
         one_shot(channels)
         return
 
-    sup = Supervisor(channels)
+    # kill -USR1 <pid> grava um profile de PROFILE_SECONDS segundos em PROFILE_DIR
+    profiler.install_signal_handler()
+
+    sup = Supervisor(channels, hub=realtime.RealtimeHub() if use_realtime else None, checkpoint_path=CHECKPOINT_PATH,
+                     spool_dir=SPOOL_DIR if USE_SPOOL else None, ring_path=RING_PATH if ring.ENABLED else None)
     sup.start()
 
 
@@ -0,0 +1,205 @@
+"""
+Amostras particionadas por mês: um arquivo SQLite por mês ao lado do banco principal.
+
+Com MONITOR_PARTITIONS=1 o monitor grava cada amostra em
+`<banco>.samples-AAAA-MM.sqlite3` (mês UTC do ts), criando o arquivo do mês na
+primeira amostra dele. O banco principal continua com sessions, peaks,
+channel_state etc.; amostras antigas ficam na `samples` dele até
+`scripts/partition_samples.py --migrate` movê-las para as partições.
+
+- `attach` anexa à conexão as partições de uma lista de meses (schemas
+  `samples_AAAA_MM`) e cria a view temporária `samples` = `main.samples` UNION
+  ALL as partições. TEMP vem antes de main na resolução de nomes, então as
+  queries existentes (`FROM samples WHERE ...`) passam a ver as partições sem
+  mudança; o SQLite empurra o WHERE para cada parte e usa os índices de cada arquivo.
+- Uma conexão anexa no máximo MAX_ATTACHED bancos: intervalos que cobrem mais
+  meses devem ser lidos mês a mês (`TooManyPartitions`).
+- Descartar um mês é apagar o arquivo; os índices de cada mês ficam pequenos.
+- Meses anteriores ao anterior são "selados" (`seal`: checkpoint do WAL e
+  journal_mode=DELETE); leitores os anexam com mode=ro e mmap.
+- Cada mês tem sua faixa de ids: a sequência da partição começa em
+  `id_base(mês)` (índice do mês << ID_BITS), então amostras atrasadas gravadas
+  no mês anterior depois da virada não colidem com as do mês novo e `id`
+  continua único entre arquivos. Os ids do banco principal ficam abaixo de
+  todas as faixas. Partições criadas antes das faixas começaram a sequência
+  no maior id existente e podem repetir ids entre si.
+"""
+import calendar
+import glob
+import os
+import re
+import sqlite3
+import threading
+import urllib.parse
+from datetime import datetime, timezone
+
+ENABLED = os.environ.get('MONITOR_PARTITIONS') == '1'
+# mmap das partições seladas abertas só para leitura (bytes)
+MMAP_SIZE = int(os.environ.get('PARTITION_MMAP_SIZE', str(256 * 1024 * 1024)))
+MAX_ATTACHED = 10  # SQLITE_MAX_ATTACHED padrão
+# ids por mês: 2^40 amostras por partição, com espaço no INTEGER de 64 bits até muito depois do ano 9999
+ID_BITS = 40
+COLUMNS = 'id, channel, ts, viewers, is_live, raw_json, session_id'
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS samples (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        viewers INTEGER,
+        is_live INTEGER,
+        raw_json TEXT,
+        session_id INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_samples_channel_ts ON samples(channel, ts);
+    CREATE INDEX IF NOT EXISTS idx_samples_session ON samples(session_id);
+"""
+_FILE = re.compile(r'\.samples-(\d{4}-\d{2})\.sqlite3$')
+_create_lock = threading.Lock()
+
+
+class TooManyPartitions(ValueError):
+    pass
+
+
+def month_of(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m')
+
+
+def add_months(month, n):
+    y, m = map(int, month.split('-'))
+    y, m = divmod(y * 12 + m - 1 + n, 12)
+    return f'{y:04d}-{m + 1:02d}'
+
+
+def id_base(month):
+    """Primeiro id da faixa reservada para as amostras do mês."""
+    y, m = map(int, month.split('-'))
+    return (y * 12 + m - 1) << ID_BITS
+
+
+def month_range(month):
+    """[início, fim) do mês em epoch UTC."""
+    y, m = map(int, month.split('-'))
+    ny, nm = map(int, add_months(month, 1).split('-'))
+    return calendar.timegm((y, m, 1, 0, 0, 0)), calendar.timegm((ny, nm, 1, 0, 0, 0))
+
+
+def schema(month):
+    return 'samples_' + month.replace('-', '_')
+
+
+def table(ts):
+    """Tabela da partição de `ts` numa conexão onde ela foi anexada."""
+    return schema(month_of(ts)) + '.samples'
+
+
+def path_for(db_path, month):
+    return f'{os.path.splitext(db_path)[0]}.samples-{month}.sqlite3'
+
+
+def months(db_path):
+    """Meses com partição em disco, em ordem."""
+    pattern = f'{glob.escape(os.path.splitext(db_path)[0])}.samples-*.sqlite3'
+    return sorted(m.group(1) for m in map(_FILE.search, glob.glob(pattern)) if m)
+
+
+def overlapping(db_path, since=None, until=None):
+    """Meses com partição que se sobrepõem a [since, until)."""
+    result = []
+    for month in months(db_path):
+        start, end = month_range(month)
+        if (since is None or end > since) and (until is None or start < until):
+            result.append(month)
+    return result
+
+
+def is_sealed(path):
+    """True se a partição não está em WAL (bytes 18-19 do cabeçalho: 1 = rollback, 2 = WAL)."""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(20)
+    except FileNotFoundError:
+        return False
+    return len(header) == 20 and header[18] == 1
+
+
+def create(db_path, month):
+    """Cria a partição do mês se ainda não existe; devolve o caminho."""
+    path = path_for(db_path, month)
+    if os.path.exists(path):
+        return path
+    with _create_lock:
+        if os.path.exists(path):
+            return path
+        tmp = f'{path}.{os.getpid()}.tmp'
+        conn = sqlite3.connect(tmp)
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('samples', ?)", (id_base(month),))
+        conn.commit()
+        conn.close()
+        try:
+            # link falha se outro processo criou o mês antes: nunca sobrescreve uma partição com dados
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.close()
+    return path
+
+
+def attach(conn, db_path, wanted, readonly=False):
+    """Deixa anexadas à conexão exatamente as partições dos meses `wanted` e recria a view temporária `samples`.
+
+    Meses sem arquivo são ignorados (crie-os antes com `create` para escrever).
+    Com `readonly` as partições abrem com mode=ro (a conexão precisa ter sido
+    aberta com uri=True) e as seladas ganham mmap. Chame fora de transação.
+    """
+    wanted = {schema(m): m for m in wanted if os.path.exists(path_for(db_path, m))}
+    if len(wanted) > MAX_ATTACHED:
+        raise TooManyPartitions(f'{len(wanted)} partições no intervalo (máx. {MAX_ATTACHED} por consulta)')
+    attached = {r[1] for r in conn.execute('PRAGMA database_list')}
+    for name in attached:
+        if name.startswith('samples_') and name not in wanted:
+            conn.execute(f'DETACH DATABASE {name}')
+    for name, month in wanted.items():
+        if name in attached:
+            continue
+        path = path_for(db_path, month)
+        if readonly:
+            conn.execute(f'ATTACH DATABASE ? AS {name}', (f'file:{urllib.parse.quote(path)}?mode=ro',))
+            if is_sealed(path):
+                conn.execute(f'PRAGMA {name}.mmap_size = {MMAP_SIZE}')
+        else:
+            conn.execute(f'ATTACH DATABASE ? AS {name}', (path,))
+    conn.execute('DROP VIEW IF EXISTS temp.samples')
+    if wanted:
+        parts = [f'SELECT {COLUMNS} FROM main.samples'] + [f'SELECT {COLUMNS} FROM {n}.samples' for n in sorted(wanted)]
+        conn.execute('CREATE TEMP VIEW samples AS ' + ' UNION ALL '.join(parts))
+    return sorted(wanted.values())
+
+
+def seal(db_path, month):
+    """Tira a partição do WAL (checkpoint + journal_mode=DELETE); False se alguém ainda a tem aberta."""
+    conn = sqlite3.connect(path_for(db_path, month), timeout=5)
+    try:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return conn.execute('PRAGMA journal_mode=DELETE').fetchone()[0] == 'delete'
+    finally:
+        conn.close()
+
+
+def seal_old(db_path, now_month):
+    """Sela as partições anteriores ao mês anterior a `now_month`; devolve os meses selados."""
+    sealed = []
+    for month in months(db_path):
+        if month >= add_months(now_month, -1) or is_sealed(path_for(db_path, month)):
+            continue
+        try:
+            if seal(db_path, month):
+                sealed.append(month)
+        except sqlite3.OperationalError:
+            pass  # em uso; tenta de novo na próxima rodada
+    return sealed
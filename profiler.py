@@ -0,0 +1,145 @@
+"""
+Perfilamento sob demanda do monitor, sem precisar reiniciar o processo.
+
+- `StackSampler`: amostrador de pilhas por relógio de parede. A cada
+  `interval` segundos lê `sys._current_frames()` de todas as threads e conta
+  as pilhas como tuplas de code objects (nada de string com o GIL na mão a
+  cada amostra); ao final grava um arquivo no formato "folded" (uma pilha por
+  linha seguida da contagem), aceito por flamegraph.pl, speedscope e inferno.
+- `install_signal_handler()`: `kill -USR1 <pid do monitor.py>` inicia uma
+  amostragem de PROFILE_SECONDS segundos.
+- `PollTrace`: cronometra as etapas de uma iteração do worker (fetch, parse,
+  session, insert, peaks) para o log de polls lentos.
+"""
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+PROFILE_SECONDS = float(os.environ.get('PROFILE_SECONDS', '30'))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', '0.05'))  # 20 Hz: com milhares de threads cada amostra custa
+
+_active_lock = threading.Lock()
+_active = None
+
+
+def _code_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    def __init__(self, seconds=PROFILE_SECONDS, interval=PROFILE_INTERVAL, out_dir=PROFILE_DIR):
+        self.seconds = seconds
+        self.interval = interval
+        self.out_dir = out_dir
+        self.counts = Counter()
+        self.samples = 0
+        self.path = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def _run(self):
+        own = threading.get_ident()
+        # tid -> [frame da folha, f_lasti, pilha, amostras ainda não somadas]: thread parada no mesmo ponto
+        # (o caso comum, workers em wait) custa só uma comparação, sem percorrer a pilha nem fazer hash dela
+        pending = {}
+        deadline = time.monotonic() + self.seconds
+        while time.monotonic() < deadline:
+            frames = sys._current_frames()
+            for tid, frame in frames.items():
+                if tid == own:
+                    continue
+                entry = pending.get(tid)
+                if entry is not None:
+                    if entry[0] is frame and entry[1] == frame.f_lasti:
+                        entry[3] += 1
+                        continue
+                    self.counts[entry[2]] += entry[3]
+                leaf, codes = frame, []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                pending[tid] = [leaf, leaf.f_lasti, tuple(codes), 1]  # da folha para a raiz; formatada só em write()
+            for tid in pending.keys() - frames.keys():
+                entry = pending.pop(tid)
+                self.counts[entry[2]] += entry[3]
+            del frames
+            self.samples += 1
+            time.sleep(self.interval)
+        for entry in pending.values():
+            self.counts[entry[2]] += entry[3]
+        self.path = self.write()
+
+    def write(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"monitor-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.folded")
+        labels = {}
+        folded = Counter()
+        for stack, n in self.counts.items():
+            names = []
+            for code in reversed(stack):
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _code_label(code)
+                names.append(label)
+            # code objects diferentes podem ter o mesmo rótulo (ex.: lambdas na mesma linha)
+            folded[';'.join(names)] += n
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, n in folded.most_common():
+                f.write(f'{stack} {n}\n')
+        logging.info("Profile gravado em %s (%s amostras, %s pilhas distintas)", path, self.samples, len(folded))
+        return path
+
+
+def start_profile(seconds=PROFILE_SECONDS):
+    """Inicia uma amostragem se nenhuma estiver em andamento; devolve o sampler ou None."""
+    global _active
+    with _active_lock:
+        if _active is not None and _active._thread.is_alive():
+            logging.warning("Profile já em andamento; ignorando novo pedido")
+            return None
+        _active = StackSampler(seconds)
+        _active.start()
+    logging.info("Profile iniciado por %ss (intervalo %.3fs)", seconds, PROFILE_INTERVAL)
+    return _active
+
+
+def install_signal_handler():
+    """SIGUSR1 -> start_profile(). Precisa ser chamado da thread principal; no-op sem SIGUSR1 (Windows)."""
+    if not hasattr(signal, 'SIGUSR1'):
+        return False
+    signal.signal(signal.SIGUSR1, lambda signum, frame: start_profile())
+    return True
+
+
+class PollTrace:
+    """Tempo acumulado por etapa de uma iteração de poll."""
+
+    __slots__ = ('spans', 'started')
+
+    def __init__(self):
+        self.spans = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def span(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name] = self.spans.get(name, 0.0) + time.perf_counter() - t0
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        return ' '.join(f'{k}={v:.3f}s' for k, v in self.spans.items())
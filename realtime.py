@@ -0,0 +1,411 @@
+"""
+Ingestão por eventos via websocket em tempo real da Kick (protocolo Pusher).
+
+Modo opcional do monitor (`MONITOR_REALTIME=1` ou `python monitor.py --realtime`):
+
+- `RealtimeHub` mantém poucas conexões websocket, cada uma com até
+  REALTIME_CHANNELS_PER_SOCKET canais inscritos (`channel.<id da Kick>`), e
+  reconecta com backoff reinscrevendo tudo.
+- O id numérico do canal vem do primeiro poll REST (`observe_poll`), então todo
+  canal começa sendo coberto por polling.
+- Eventos de início/fim de live e qualquer evento com contagem de viewers viram
+  observações `(viewers, is_live, raw)` na fila do worker do canal, que as
+  processa exatamente como um poll. Canais cobertos só fazem poll a cada
+  REALTIME_RECONCILE_INTERVAL segundos (reconciliação); os demais seguem no POLL_INTERVAL.
+
+Cliente websocket mínimo (RFC 6455) só com a biblioteca padrão, como o resto do monitor.
+Para testes locais use bench/fake_pusher.py (KICK_PUSHER_URL=ws://127.0.0.1:<porta>/app/local).
+"""
+import base64
+import hashlib
+import json
+import logging
+import os
+import queue
+import socket
+import ssl
+import struct
+import threading
+import time
+import urllib.parse
+
+KICK_PUSHER_URL = os.environ.get('KICK_PUSHER_URL') or (
+    'wss://ws-us2.pusher.com/app/32cbd69e4b950bf97679?protocol=7&client=js&version=8.4.0&flash=false')
+CHANNELS_PER_SOCKET = int(os.environ.get('REALTIME_CHANNELS_PER_SOCKET', '100'))
+# intervalo de poll REST (reconciliação) para canais com cobertura em tempo real
+RECONCILE_INTERVAL = int(os.environ.get('REALTIME_RECONCILE_INTERVAL', '300'))
+# atualizações só de viewers mais próximas que isso são descartadas (início/fim de live nunca)
+MIN_SAMPLE_SECONDS = float(os.environ.get('REALTIME_MIN_SAMPLE_SECONDS', '5'))
+RECONNECT_MAX_SECONDS = 60
+
+LIVE_EVENTS = ('App\\Events\\StreamerIsLive',)
+STOP_EVENTS = ('App\\Events\\StopStreamBroadcast',)
+
+_WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OP_CONT, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+class ConnectionClosed(Exception):
+    pass
+
+
+def encode_frame(payload, opcode=OP_TEXT, mask=True):
+    """Frame final (FIN=1); clientes mascaram, servidores não."""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    n = len(payload)
+    header = bytes([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    if n < 126:
+        header += bytes([mask_bit | n])
+    elif n < 65536:
+        header += bytes([mask_bit | 126]) + struct.pack('>H', n)
+    else:
+        header += bytes([mask_bit | 127]) + struct.pack('>Q', n)
+    if not mask:
+        return header + payload
+    key = os.urandom(4)
+    return header + key + _apply_mask(payload, key)
+
+
+def _apply_mask(data, key):
+    # XOR em blocos de 4 bytes via int.from_bytes: bem mais rápido que byte a byte
+    n = len(data)
+    full = key * (n // 4 + 1)
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(full[:n], 'big')).to_bytes(n, 'big') if n else b''
+
+
+def read_frame(recv_exact):
+    """Lê um frame com `recv_exact(n)`; devolve (fin, opcode, payload)."""
+    b0, b1 = recv_exact(2)
+    n = b1 & 0x7F
+    if n == 126:
+        n = struct.unpack('>H', recv_exact(2))[0]
+    elif n == 127:
+        n = struct.unpack('>Q', recv_exact(8))[0]
+    key = recv_exact(4) if b1 & 0x80 else None
+    payload = recv_exact(n) if n else b''
+    if key:
+        payload = _apply_mask(payload, key)
+    return bool(b0 & 0x80), b0 & 0x0F, payload
+
+
+def accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+
+
+class WebSocket:
+    """Cliente websocket bloqueante: só mensagens de texto, responde ping, sem extensões."""
+
+    def __init__(self, url, timeout=30):
+        u = urllib.parse.urlsplit(url)
+        secure = u.scheme == 'wss'
+        port = u.port or (443 if secure else 80)
+        sock = socket.create_connection((u.hostname, port), timeout=timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=u.hostname)
+        self.sock = sock
+        self._buf = b''
+        self._send_lock = threading.Lock()
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = (u.path or '/') + ('?' + u.query if u.query else '')
+        sock.sendall((
+            f'GET {path} HTTP/1.1\r\nHost: {u.hostname}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+            f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\nUser-Agent: kick-monitor/1.0\r\n\r\n'
+        ).encode())
+        head = self._read_until(b'\r\n\r\n').decode('latin-1').split('\r\n')
+        if ' 101 ' not in head[0] + ' ':
+            raise ConnectionError(f'handshake websocket recusado: {head[0]}')
+        headers = {k.strip().lower(): v.strip() for k, _, v in (h.partition(':') for h in head[1:] if h)}
+        if headers.get('sec-websocket-accept') != accept_key(key):
+            raise ConnectionError('Sec-WebSocket-Accept inválido')
+
+    def _read_until(self, marker):
+        while marker not in self._buf:
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionClosed('conexão fechada durante o handshake')
+            self._buf += chunk
+        head, _, self._buf = self._buf.partition(marker)
+        return head
+
+    def _read_frame(self):
+        # só consome o buffer com o frame inteiro lido: um timeout no meio do
+        # frame não perde bytes e a próxima chamada recomeça do mesmo ponto
+        pos = 0
+
+        def take(n):
+            nonlocal pos
+            while len(self._buf) < pos + n:
+                chunk = self.sock.recv(max(4096, pos + n - len(self._buf)))
+                if not chunk:
+                    raise ConnectionClosed('conexão fechada pelo servidor')
+                self._buf += chunk
+            data = self._buf[pos:pos + n]
+            pos += n
+            return data
+
+        frame = read_frame(take)
+        self._buf = self._buf[pos:]
+        return frame
+
+    def settimeout(self, seconds):
+        self.sock.settimeout(seconds)
+
+    def send(self, text, opcode=OP_TEXT):
+        with self._send_lock:
+            self.sock.sendall(encode_frame(text, opcode))
+
+    def recv(self):
+        """Próxima mensagem de texto; socket.timeout se nada chegar no timeout do socket."""
+        parts = []
+        while True:
+            fin, opcode, payload = self._read_frame()
+            if opcode == OP_PING:
+                self.send(payload, OP_PONG)
+            elif opcode == OP_PONG:
+                continue
+            elif opcode == OP_CLOSE:
+                raise ConnectionClosed('close recebido')
+            else:
+                parts.append(payload)
+                if fin:
+                    return b''.join(parts).decode('utf-8')
+
+    def close(self):
+        try:
+            self.send(b'', OP_CLOSE)
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def observation(event, data, livestream):
+    """Converte um evento Pusher em (viewers, is_live, raw) no formato de fetch_channel, ou None.
+
+    `livestream` é o último dict de livestream conhecido do canal (poll ou evento anterior).
+    """
+    if event in STOP_EVENTS:
+        return -1, 0, {'livestream': None, 'realtime_event': event}
+    ls = data.get('livestream') if isinstance(data.get('livestream'), dict) else None
+    if event in LIVE_EVENTS:
+        ls = {**(livestream or {}), **(ls or {}), 'is_live': True}
+        viewers = ls.get('viewer_count') or ls.get('viewers') or 0
+        return int(viewers), 1, {'livestream': ls, 'realtime_event': event}
+    # qualquer outro evento do canal que traga contagem de viewers
+    src = ls or data
+    viewers = src.get('viewer_count', src.get('viewers'))
+    if viewers is None or not livestream:
+        return None
+    ls = dict(livestream, viewer_count=int(viewers))
+    return int(viewers), 1, {'livestream': ls, 'realtime_event': event}
+
+
+class _Socket:
+    """Uma conexão Pusher com seu conjunto de inscrições; roda numa thread própria."""
+
+    def __init__(self, hub, index):
+        self.hub = hub
+        self.index = index
+        self.channels = {}  # nome Pusher -> slug
+        self.confirmed = set()
+        self.ws = None
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name=f'realtime-{index}', daemon=True)
+
+    def subscribe(self, name, slug):
+        with self.lock:
+            self.channels[name] = slug
+            ws = self.ws
+        if ws is not None:
+            self._send_subscribe(ws, name)
+
+    def unsubscribe(self, name):
+        with self.lock:
+            self.channels.pop(name, None)
+            self.confirmed.discard(name)
+            ws = self.ws
+        if ws is not None:
+            try:
+                ws.send(json.dumps({'event': 'pusher:unsubscribe', 'data': {'channel': name}}))
+            except OSError:
+                pass
+
+    def _send_subscribe(self, ws, name):
+        try:
+            ws.send(json.dumps({'event': 'pusher:subscribe', 'data': {'auth': '', 'channel': name}}))
+        except OSError:
+            logging.warning("Realtime: falha ao inscrever %s (reconexão vai reinscrever)", name)
+
+    def _run(self):
+        backoff = 1
+        while not self.hub.stop_event.is_set():
+            try:
+                self._session()
+                backoff = 1
+            except (OSError, ConnectionClosed, ValueError) as e:
+                if self.hub.stop_event.is_set():
+                    break
+                logging.warning("Realtime socket %s caiu (%s); reconectando em %ss", self.index, e, backoff)
+            with self.lock:
+                self.ws = None
+                self.confirmed.clear()
+            if self.hub.stop_event.wait(backoff):
+                break
+            backoff = min(RECONNECT_MAX_SECONDS, backoff * 2)
+
+    def _session(self):
+        ws = WebSocket(self.hub.url)
+        try:
+            msg = json.loads(ws.recv())
+            if msg.get('event') != 'pusher:connection_established':
+                raise ConnectionError(f'esperava connection_established, veio {msg.get("event")}')
+            info = json.loads(msg.get('data') or '{}')
+            activity_timeout = float(info.get('activity_timeout') or 120)
+            with self.lock:
+                self.ws = ws
+                names = list(self.channels)
+            for name in names:
+                self._send_subscribe(ws, name)
+            ws.settimeout(activity_timeout)
+            awaiting_pong = False
+            while not self.hub.stop_event.is_set():
+                try:
+                    raw = ws.recv()
+                except socket.timeout:
+                    if awaiting_pong:
+                        raise ConnectionError('sem pong do servidor')
+                    ws.send(json.dumps({'event': 'pusher:ping', 'data': {}}))
+                    awaiting_pong = True
+                    ws.settimeout(30)
+                    continue
+                if awaiting_pong:
+                    awaiting_pong = False
+                    ws.settimeout(activity_timeout)
+                self._handle(ws, json.loads(raw))
+        finally:
+            ws.close()
+
+    def _handle(self, ws, msg):
+        event = msg.get('event')
+        name = msg.get('channel')
+        if event == 'pusher:ping':
+            ws.send(json.dumps({'event': 'pusher:pong', 'data': {}}))
+        elif event == 'pusher_internal:subscription_succeeded':
+            with self.lock:
+                if name in self.channels:
+                    self.confirmed.add(name)
+        elif event == 'pusher:error':
+            logging.warning("Realtime: erro do servidor: %s", msg.get('data'))
+        elif name:
+            with self.lock:
+                slug = self.channels.get(name)
+            if slug is not None:
+                data = msg.get('data')
+                if isinstance(data, str):
+                    data = json.loads(data or '{}')
+                self.hub.dispatch(slug, event, data if isinstance(data, dict) else {})
+
+    def covers(self, name):
+        with self.lock:
+            return self.ws is not None and name in self.confirmed
+
+
+class RealtimeHub:
+    def __init__(self, url=KICK_PUSHER_URL, per_socket=CHANNELS_PER_SOCKET):
+        self.url = url
+        self.per_socket = per_socket
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.sockets = []
+        self.subscriptions = {}  # slug -> (nome Pusher, _Socket)
+        self.queues = {}
+        self.livestreams = {}
+        self.last_dispatch = {}
+        self.events_received = 0
+
+    def queue_for(self, slug):
+        with self.lock:
+            return self.queues.setdefault(slug, queue.Queue())
+
+    def observe_poll(self, slug, raw):
+        """Chamado pelo worker a cada poll REST: guarda a livestream e inscreve o canal pelo id."""
+        if not isinstance(raw, dict):
+            return
+        ls = raw.get('livestream') or raw.get('live_stream')
+        with self.lock:
+            self.livestreams[slug] = ls if isinstance(ls, dict) else None
+            if slug in self.subscriptions or raw.get('id') is None:
+                return
+            name = f"channel.{raw['id']}"
+            sock = next((s for s in self.sockets if len(s.channels) < self.per_socket), None)
+            if sock is None:
+                sock = _Socket(self, len(self.sockets))
+                self.sockets.append(sock)
+                if not self.stop_event.is_set():
+                    sock.thread.start()
+            self.subscriptions[slug] = (name, sock)
+        sock.subscribe(name, slug)
+
+    def unregister(self, slug):
+        with self.lock:
+            sub = self.subscriptions.pop(slug, None)
+            self.queues.pop(slug, None)
+            self.livestreams.pop(slug, None)
+            self.last_dispatch.pop(slug, None)
+        if sub:
+            sub[1].unsubscribe(sub[0])
+
+    def is_covered(self, slug):
+        with self.lock:
+            sub = self.subscriptions.get(slug)
+        return sub is not None and sub[1].covers(sub[0])
+
+    def dispatch(self, slug, event, data):
+        with self.lock:
+            self.events_received += 1
+            obs = observation(event, data, self.livestreams.get(slug))
+            if obs is None:
+                return
+            now = time.monotonic()
+            state_change = event in LIVE_EVENTS or event in STOP_EVENTS
+            if not state_change and now - self.last_dispatch.get(slug, -1e9) < MIN_SAMPLE_SECONDS:
+                return
+            self.last_dispatch[slug] = now
+            self.livestreams[slug] = obs[2]['livestream']
+            q = self.queues.get(slug)
+        if q is not None:
+            q.put(obs)
+
+    def wait(self, slug, stop_event, timeout, fallback=None):
+        """Espera até `timeout` segundos por uma observação do canal; devolve-a ou None.
+
+        Com `fallback`, se o canal perde a cobertura durante a espera (socket
+        caiu), ela termina `fallback` segundos depois do início: o canal volta
+        ao polling normal sem esperar o intervalo de reconciliação inteiro.
+        """
+        q = self.queue_for(slug)
+        start = time.monotonic()
+        deadline = start + timeout
+        while not stop_event.is_set():
+            if fallback is not None and start + fallback < deadline and not self.is_covered(slug):
+                deadline = start + fallback
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                return q.get(timeout=min(1.0, remaining))
+            except queue.Empty:
+                continue
+        return None
+
+    def stop(self):
+        self.stop_event.set()
+        for sock in self.sockets:
+            with sock.lock:
+                ws = sock.ws
+            if ws is not None:
+                ws.close()
@@ -0,0 +1,244 @@
+"""
+Ring buffer das amostras recentes por canal num arquivo mapeado em memória.
+
+Com MONITOR_RING=1 o monitor mantém em `<banco>.ring` (MONITOR_RING_PATH) as
+últimas RING_CAPACITY amostras `(ts, viewers, is_live)` de cada canal, num
+bloco de tamanho fixo por canal. O dashboard abre o mesmo arquivo com mmap e
+responde "últimas N amostras do canal" sem SQL; pedidos maiores que o que o
+anel guarda (ou canal sem bloco) continuam indo ao banco.
+
+Layout (little-endian):
+
+- cabeçalho de HEADER_SIZE bytes: magic, versão, número de blocos,
+  capacidade, `dir_version` (incrementado quando um bloco muda de dono) e
+  `retired` (1 quando o monitor trocou o arquivo por outro; leitores reabrem);
+- RING_SLOTS blocos com `seq`, `head` (total de amostras já gravadas), o nome
+  do canal e `capacity` registros de 16 bytes.
+
+Cada bloco tem um único escritor (o worker do canal) e é protegido por um
+seqlock: o escritor torna `seq` ímpar, grava, e o torna par de novo; o leitor
+copia o que precisa e só aceita a cópia se `seq` era par e não mudou. Leitores
+nunca bloqueiam o escritor. O CPython não expõe barreiras de memória: a
+ordem das escritas no mmap vale em x86 (TSO); em CPUs com ordenação fraca uma
+leitura rara pode precisar de nova tentativa, nunca devolver dado misturado
+sem que `seq` denuncie.
+
+Cada start do monitor cria um arquivo novo (o anel só vale enquanto o
+escritor está vivo: amostras gravadas com o ring desligado não passariam por
+ele) e marca o antigo como `retired`; o stop também o marca. Enquanto os
+blocos não juntam `limit` amostras o dashboard usa o banco.
+"""
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+ENABLED = os.environ.get('MONITOR_RING') == '1'
+SLOTS = int(os.environ.get('RING_SLOTS', '4096'))  # canais
+CAPACITY = int(os.environ.get('RING_CAPACITY', '512'))  # amostras por canal (~4h a cada 30s)
+MAGIC = b'KRNG'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIQI')  # magic, versão, blocos, capacidade, dir_version, retired
+HEADER_SIZE = 64
+BLOCK_HEADER = struct.Struct('<QQ48s')  # seq, head, nome do canal
+RECORD = struct.Struct('<qii')  # ts, viewers, is_live
+NULL_VIEWERS = -2 ** 31  # viewers None (-1 é valor real: canal fora do ar)
+MAX_NAME = 48
+READ_RETRIES = 100
+_DIR_VERSION_OFFSET = 16
+_RETIRED_OFFSET = 24
+
+
+def path_for(db_path):
+    return os.environ.get('MONITOR_RING_PATH') or db_path + '.ring'
+
+
+def _stride(capacity):
+    return BLOCK_HEADER.size + capacity * RECORD.size
+
+
+def _file_size(slots, capacity):
+    return HEADER_SIZE + slots * _stride(capacity)
+
+
+class RingWriter:
+    """Lado do monitor: um bloco por canal, escrito só pelo worker dele."""
+
+    def __init__(self, path, slots=SLOTS, capacity=CAPACITY):
+        self.path = path
+        self.slots = slots
+        self.capacity = capacity
+        self.stride = _stride(capacity)
+        self._lock = threading.Lock()  # só atribuição de blocos; append é por canal
+        self._full_logged = False
+        size = _file_size(slots, capacity)
+        self._create(size)
+        self._file = open(path, 'r+b')
+        self.mm = mmap.mmap(self._file.fileno(), size)
+        self.index = {}
+        self._free = list(reversed(range(slots)))
+
+    def _create(self, size):
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.truncate(size)  # esparso: só os blocos usados ocupam memória/disco
+            f.write(HEADER.pack(MAGIC, VERSION, self.slots, self.capacity, 0, 0))
+        if os.path.exists(self.path):
+            # leitores com o arquivo antigo mapeado veem `retired` e reabrem
+            try:
+                with open(self.path, 'r+b') as f:
+                    f.seek(_RETIRED_OFFSET)
+                    f.write(struct.pack('<I', 1))
+            except OSError:
+                pass
+        os.replace(tmp, self.path)
+
+    def _offset(self, slot):
+        return HEADER_SIZE + slot * self.stride
+
+    def _bump_dir_version(self):
+        version = struct.unpack_from('<Q', self.mm, _DIR_VERSION_OFFSET)[0]
+        struct.pack_into('<Q', self.mm, _DIR_VERSION_OFFSET, version + 1)
+
+    def _slot_for(self, channel):
+        slot = self.index.get(channel)
+        if slot is not None:
+            return slot
+        name = channel.encode('utf-8')
+        if len(name) > MAX_NAME:
+            return None
+        with self._lock:
+            slot = self.index.get(channel)
+            if slot is not None:
+                return slot
+            if not self._free:
+                if not self._full_logged:
+                    logging.warning("Ring de amostras cheio (%s canais); aumente RING_SLOTS", self.slots)
+                    self._full_logged = True
+                return None
+            slot = self._free.pop()
+            offset = self._offset(slot)
+            seq = BLOCK_HEADER.unpack_from(self.mm, offset)[0]
+            BLOCK_HEADER.pack_into(self.mm, offset, seq + 1, 0, name)
+            struct.pack_into('<Q', self.mm, offset, seq + 2)
+            self.index[channel] = slot
+            self._bump_dir_version()
+            return slot
+
+    def append(self, channel, ts, viewers, is_live):
+        slot = self._slot_for(channel)
+        if slot is None:
+            return
+        offset = self._offset(slot)
+        seq, head, _ = BLOCK_HEADER.unpack_from(self.mm, offset)
+        struct.pack_into('<Q', self.mm, offset, seq + 1)  # ímpar: escrita em andamento
+        RECORD.pack_into(self.mm, offset + BLOCK_HEADER.size + (head % self.capacity) * RECORD.size,
+                         ts, NULL_VIEWERS if viewers is None else viewers, is_live or 0)
+        struct.pack_into('<QQ', self.mm, offset, seq + 1, head + 1)
+        struct.pack_into('<Q', self.mm, offset, seq + 2)
+
+    def drop(self, channel):
+        """Libera o bloco do canal (canal removido do monitor)."""
+        with self._lock:
+            slot = self.index.pop(channel, None)
+            if slot is None:
+                return
+            offset = self._offset(slot)
+            seq = BLOCK_HEADER.unpack_from(self.mm, offset)[0]
+            struct.pack_into('<Q', self.mm, offset, seq + 1)
+            BLOCK_HEADER.pack_into(self.mm, offset, seq + 1, 0, b'')
+            struct.pack_into('<Q', self.mm, offset, seq + 2)
+            self._free.append(slot)
+            self._bump_dir_version()
+
+    def close(self):
+        """Marca o arquivo como `retired` (o dashboard volta ao banco) e o desmapeia."""
+        struct.pack_into('<I', self.mm, _RETIRED_OFFSET, 1)
+        self.mm.close()
+        self._file.close()
+
+
+class RingReader:
+    """Lado do dashboard: leituras sem lock; devolve None quando o anel não basta e o chamador vai ao banco."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mm = None
+        self._dir_version = None
+        self.index = {}
+
+    def _ensure_open(self):
+        if self.mm is not None and not struct.unpack_from('<I', self.mm, _RETIRED_OFFSET)[0]:
+            return True
+        self.close()
+        try:
+            with open(self.path, 'rb') as f:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        if len(self.mm) < HEADER_SIZE:
+            self.close()
+            return False
+        magic, version, self.slots, self.capacity, _, retired = HEADER.unpack_from(self.mm, 0)
+        if (magic != MAGIC or version != VERSION or retired
+                or len(self.mm) != _file_size(self.slots, self.capacity)):
+            # monitor parado (ou arquivo de outra versão): o anel não é confiável
+            self.close()
+            return False
+        self.stride = _stride(self.capacity)
+        self._dir_version = None
+        return True
+
+    def _refresh_index(self):
+        version = struct.unpack_from('<Q', self.mm, _DIR_VERSION_OFFSET)[0]
+        if version == self._dir_version:
+            return
+        index = {}
+        for slot in range(self.slots):
+            raw = BLOCK_HEADER.unpack_from(self.mm, HEADER_SIZE + slot * self.stride)[2]
+            if raw[:1] != b'\0':
+                index[raw.rstrip(b'\0').decode('utf-8', 'replace')] = slot
+        self.index, self._dir_version = index, version
+
+    def latest(self, channel, limit):
+        """Últimas `limit` amostras (ts, viewers) do canal, mais recentes primeiro, ou None se o anel não as tem todas."""
+        if not self._ensure_open() or limit > self.capacity:
+            return None
+        self._refresh_index()
+        slot = self.index.get(channel)
+        if slot is None:
+            return None
+        offset = HEADER_SIZE + slot * self.stride
+        name = channel.encode('utf-8')
+        for _ in range(READ_RETRIES):
+            seq, head, raw_name = BLOCK_HEADER.unpack_from(self.mm, offset)
+            if seq & 1:
+                time.sleep(0)  # cede o GIL ao escritor se ele está na mesma máquina/processo
+                continue
+            if raw_name.rstrip(b'\0') != name or head < limit:
+                # bloco trocou de dono, ou o canal ainda não tem `limit` amostras no anel
+                return None
+            start = head - limit
+            first, last = start % self.capacity, head % self.capacity
+            base = offset + BLOCK_HEADER.size
+            if limit == 0:
+                data = b''
+            elif first < last:
+                data = self.mm[base + first * RECORD.size:base + last * RECORD.size]
+            else:
+                data = (self.mm[base + first * RECORD.size:base + self.capacity * RECORD.size]
+                        + self.mm[base:base + last * RECORD.size])
+            if struct.unpack_from('<Q', self.mm, offset)[0] != seq:
+                time.sleep(0)
+                continue  # escritor passou por aqui durante a cópia
+            rows = [(ts, None if viewers == NULL_VIEWERS else viewers) for ts, viewers, _ in RECORD.iter_unpack(data)]
+            rows.reverse()
+            return rows
+        return None
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
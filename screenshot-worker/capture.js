@@ -1,5 +1,6 @@
 #!/usr/bin/env node
 const fs = require('fs');
+const os = require('os');
 const path = require('path');
 const puppeteer = require('puppeteer');
 const Database = require('better-sqlite3');
@@ -9,11 +10,22 @@ const { hideBin } = require('yargs/helpers');
 const argv = yargs(hideBin(process.argv)).option('channels', {
   alias: 'c',
   type: 'string',
-  description: 'Comma-separated list of URLs or channel slugs to capture',
+  description: 'Comma-separated list of URLs or channel slugs to capture once (default: consume the monitor capture queue)',
+}).option('pages', {
+  alias: 'p',
+  type: 'number',
+  description: 'Browser pages capturing in parallel',
 }).argv;
 
 const SCREENSHOT_DIR = process.env.SCREENSHOT_DIR || '/data/screenshots';
 const DB_PATH = path.join(SCREENSHOT_DIR, 'screenshots.db');
+// fila publicada pelo monitor (tabela capture_jobs, ver capture.py); precisa de MONITOR_CAPTURE=1 no monitor
+const MONITOR_DB_PATH = process.env.MONITOR_DB_PATH || '/data/kick_monitor.sqlite3';
+const PAGES = Math.max(1, argv.pages || parseInt(process.env.CAPTURE_PAGES || '3', 10));
+const IDLE_MS = parseInt(process.env.CAPTURE_IDLE_MS || '5000', 10); // pausa quando a fila está vazia
+const LEASE_SECONDS = parseInt(process.env.CAPTURE_LEASE_SECONDS || '120', 10); // reservas mais velhas voltam para a fila
+const NAV_TIMEOUT_MS = 30000;
+const WORKER_ID = `${os.hostname()}:${process.pid}`;
 
 if (!fs.existsSync(SCREENSHOT_DIR)) fs.mkdirSync(SCREENSHOT_DIR, { recursive: true });
 
@@ -22,6 +34,8 @@ const channels = (argv.channels || process.env.CHANNELS || '')
   .map(s => s.trim())
   .filter(Boolean);
 
+let stopping = false;
+
 function initDb() {
   const db = new Database(DB_PATH);
   db.exec(`
@@ -38,47 +52,135 @@ function initDb() {
   return db;
 }
 
-async function takeOne(browser, url, outPath) {
+async function newPage(browser) {
   const page = await browser.newPage();
+  await page.setViewport({ width: 1280, height: 720 });
+  return page;
+}
+
+async function takeOne(page, url, outPath) {
   try {
-    await page.setViewport({ width: 1280, height: 720 });
-    const resp = await page.goto(url, { waitUntil: 'networkidle2', timeout: 30000 });
-    await page.waitForTimeout(1000); // allow animations
+    // o player carrega streams sem parar: networkidle2 quase sempre espera o timeout inteiro
+    const resp = await page.goto(url, { waitUntil: 'domcontentloaded', timeout: NAV_TIMEOUT_MS });
+    await page.waitForSelector('video', { timeout: 10000 }).catch(() => {});
+    await new Promise(r => setTimeout(r, 1000)); // allow animations
     await page.screenshot({ path: outPath, type: 'jpeg', quality: 75, fullPage: false });
-    const vp = await page.viewport();
+    const vp = page.viewport();
     return { status: resp ? resp.status() : null, width: vp.width, height: vp.height };
   } catch (err) {
-    console.error('capture error', err.message);
+    console.error('capture error', url, err.message);
     return { status: null };
-  } finally {
-    try { await page.close(); } catch (e) {}
   }
 }
 
-async function runOnce(db, browser) {
-  const insert = db.prepare('INSERT INTO screenshots (channel, path, ts, width, height, status) VALUES (?, ?, ?, ?, ?, ?)');
+function outputPath(channel, ts) {
+  const safe = channel.replace(/[^a-z0-9_-]/gi, '_');
+  const fname = `${safe}_${new Date(ts).toISOString().replace(/[:.]/g, '-')}.jpg`;
+  return path.join(SCREENSHOT_DIR, fname);
+}
+
+async function capture(db, page, channel) {
   const ts = Date.now();
-  for (const c of channels) {
-    const safe = c.replace(/[^a-z0-9_-]/gi, '_');
-    const fname = `${safe}_${new Date(ts).toISOString().replace(/[:.]/g,'-')}.jpg`;
-    const out = path.join(SCREENSHOT_DIR, fname);
-    const url = c.startsWith('http') ? c : `https://kick.com/${c}`;
-    console.log('capturing', url);
-    const res = await takeOne(browser, url, out);
-    insert.run(c, out, ts, res.width || null, res.height || null, res.status || null);
-    console.log('saved', out);
+  const out = outputPath(channel, ts);
+  const url = channel.startsWith('http') ? channel : `https://kick.com/${channel}`;
+  console.log('capturing', url);
+  const res = await takeOne(page, url, out);
+  db.prepare('INSERT INTO screenshots (channel, path, ts, width, height, status) VALUES (?, ?, ?, ?, ?, ?)')
+    .run(channel, out, ts, res.width || null, res.height || null, res.status || null);
+  console.log('saved', out);
+  return res;
+}
+
+async function runOnce(db, browser) {
+  // modo manual (--channels/CHANNELS): uma passada pela lista, PAGES páginas em paralelo
+  const queue = channels.slice();
+  await Promise.all(Array.from({ length: Math.min(PAGES, queue.length) }, async () => {
+    const page = await newPage(browser);
+    try {
+      while (queue.length) await capture(db, page, queue.shift());
+    } finally {
+      try { await page.close(); } catch (e) {}
+    }
+  }));
+}
+
+function openQueue() {
+  const mdb = new Database(MONITOR_DB_PATH, { fileMustExist: true, timeout: 5000 });
+  const now = () => Math.floor(Date.now() / 1000);
+  // primeiro quem acabou de entrar ao vivo (sem captura na session), depois o job mais atrasado
+  const select = mdb.prepare(`
+    SELECT channel, session_id FROM capture_jobs
+    WHERE (claimed_ts IS NULL OR claimed_ts < @now - @lease)
+      AND (last_capture_ts IS NULL OR last_capture_ts + cadence_seconds <= @now)
+    ORDER BY last_capture_ts IS NOT NULL, COALESCE(last_capture_ts + cadence_seconds, enqueued_ts)
+    LIMIT 1
+  `);
+  const claim = mdb.prepare(
+    'UPDATE capture_jobs SET claimed_ts = ?, claimed_by = ? WHERE channel = ? AND session_id = ?');
+  // a session pode ter fechado (linha apagada) ou trocado durante a captura: nesse caso não grava nada
+  const done = mdb.prepare(`UPDATE capture_jobs SET last_capture_ts = ?, claimed_ts = NULL, claimed_by = NULL
+    WHERE channel = ? AND session_id = ? AND claimed_by = ?`);
+  const next = mdb.transaction(() => {
+    const job = select.get({ now: now(), lease: LEASE_SECONDS });
+    if (job) claim.run(now(), WORKER_ID, job.channel, job.session_id);
+    return job;
+  });
+  return {
+    next: () => next.immediate(),
+    done: job => done.run(now(), job.channel, job.session_id, WORKER_ID),
+    close: () => mdb.close(),
+  };
+}
+
+async function runQueue(db, browser) {
+  // cada página do pool pega um job por vez: no máximo PAGES capturas simultâneas,
+  // e o ritmo acompanha quantos canais estão ao vivo, não o tamanho da lista
+  const queue = openQueue();
+  console.log(`consuming capture queue from ${MONITOR_DB_PATH} with ${PAGES} pages`);
+  try {
+    await Promise.all(Array.from({ length: PAGES }, async () => {
+      let page = await newPage(browser);
+      try {
+        while (!stopping) {
+          let job;
+          try {
+            job = queue.next();
+          } catch (err) {
+            // banco do monitor travado além do timeout: tenta de novo depois
+            console.error('queue error', err.message);
+          }
+          if (!job) {
+            await new Promise(r => setTimeout(r, IDLE_MS));
+            continue;
+          }
+          const res = await capture(db, page, job.channel);
+          try {
+            queue.done(job);
+          } catch (err) {
+            console.error('queue error', err.message);
+          }
+          if (res.status === null && page.isClosed()) page = await newPage(browser);
+        }
+      } finally {
+        try { await page.close(); } catch (e) {}
+      }
+    }));
+  } finally {
+    queue.close();
   }
 }
 
 async function main() {
-  if (channels.length === 0) {
-    console.error('No channels configured. Use --channels or CHANNELS env var.');
+  if (channels.length === 0 && !fs.existsSync(MONITOR_DB_PATH)) {
+    console.error(`No channels configured and no monitor database at ${MONITOR_DB_PATH}. Use --channels, CHANNELS or MONITOR_DB_PATH.`);
     process.exit(2);
   }
   const db = initDb();
   const browser = await puppeteer.launch({ args: ['--no-sandbox', '--disable-setuid-sandbox'] });
+  for (const sig of ['SIGINT', 'SIGTERM']) process.on(sig, () => { stopping = true; });
   try {
-    await runOnce(db, browser);
+    if (channels.length) await runOnce(db, browser);
+    else await runQueue(db, browser);
   } catch (err) {
     console.error('run error', err);
   } finally {
@@ -1,9 +1,15 @@
 #!/bin/sh
 set -e
 
+mkdir -p "$SCREENSHOT_DIR"
+
 if [ -z "$CHANNELS" ] && [ $# -eq 0 ]; then
-  echo "Provide channels via CHANNELS env or as args (comma separated)"
-  exit 2
+  # sem lista fixa: consome a fila capture_jobs do monitor (MONITOR_CAPTURE=1 no monitor)
+  while true; do
+    echo "[screenshot-worker] consuming capture queue: $(date -u)"
+    node /app/capture.js || true
+    sleep 5
+  done
 fi
 
 if [ -n "$1" ]; then
@@ -12,8 +18,6 @@ else
   ARGS="--channels=$CHANNELS"
 fi
 
-mkdir -p "$SCREENSHOT_DIR"
-
 while true; do
   echo "[screenshot-worker] running capture: $(date -u)"
   node /app/capture.js $ARGS || true
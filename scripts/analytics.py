@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Consultas analíticas em SQL sobre os Parquet de `scripts/export_parquet.py`, com DuckDB.
+
+Nada aqui abre o banco do monitor: as views `samples` e `sessions` leem os
+arquivos exportados (só dias encerrados). `samples` ganha as colunas `date` e
+`channel` das pastas de partição, e filtros nelas (`WHERE date >= '2024-05-01'`,
+`channel IN (...)`) pulam os arquivos de fora sem abri-los. `ts`, `start_ts` e
+`end_ts` continuam em epoch; use `to_timestamp(ts)` para datas.
+
+Exemplos:
+    python scripts/analytics.py "SELECT date_trunc('hour', to_timestamp(ts)) AS hora, avg(viewers)
+                                 FROM samples WHERE is_live = 1 GROUP BY 1 ORDER BY 1"
+    python scripts/analytics.py --csv -f relatorio.sql > relatorio.csv
+    python scripts/analytics.py --views    # mostra as views e as colunas
+"""
+import argparse
+import csv
+import glob
+import os
+import sys
+
+import duckdb
+
+from export_parquet import DEFAULT_DEST
+
+# date como DATE e channel sempre texto (slugs só com dígitos não viram inteiro)
+SAMPLES_VIEW = ("CREATE VIEW samples AS SELECT * FROM read_parquet(?, hive_partitioning = true, "
+                "hive_types = {'date': DATE, 'channel': VARCHAR})")
+SESSIONS_VIEW = ("CREATE VIEW sessions AS SELECT * FROM read_parquet(?, hive_partitioning = true, "
+                 "hive_types = {'date': DATE})")
+
+
+def connect(dest=DEFAULT_DEST, threads=None):
+    """Conexão DuckDB em memória com as views `samples` e `sessions` sobre `dest`."""
+    conn = duckdb.connect(':memory:')
+    if threads:
+        conn.execute(f'SET threads = {int(threads)}')
+    for view, sql, pattern in (('samples', SAMPLES_VIEW, 'samples/date=*/channel=*/*.parquet'),
+                               ('sessions', SESSIONS_VIEW, 'sessions/date=*/*.parquet')):
+        files = os.path.join(dest, pattern)
+        if not glob.glob(files):
+            raise FileNotFoundError(f'nenhum Parquet de {view} em {dest} (rode scripts/export_parquet.py)')
+        # DDL não aceita parâmetros: o caminho entra como literal SQL
+        conn.execute(sql.replace('?', "'" + files.replace("'", "''") + "'"))
+    return conn
+
+
+def _write_csv(rel):
+    writer = csv.writer(sys.stdout)
+    writer.writerow(rel.columns)
+    while True:
+        rows = rel.fetchmany(10000)
+        if not rows:
+            break
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sql', nargs='?', help='consulta SQL (ou use -f)')
+    parser.add_argument('-f', '--file', help='lê a consulta de um arquivo (- para stdin)')
+    parser.add_argument('--dest', default=DEFAULT_DEST, help='diretório dos Parquet (padrão: MONITOR_PARQUET_DIR ou parquet/ ao lado do banco)')
+    parser.add_argument('--csv', action='store_true', help='resultado em CSV na saída padrão')
+    parser.add_argument('--max-rows', type=int, default=100, help='linhas mostradas na tabela (sem --csv)')
+    parser.add_argument('--threads', type=int, default=None, help='threads do DuckDB (padrão: todos os núcleos)')
+    parser.add_argument('--views', action='store_true', help='descreve as views disponíveis')
+    args = parser.parse_args()
+    if args.file:
+        with (sys.stdin if args.file == '-' else open(args.file)) as f:
+            args.sql = f.read()
+    if not args.sql and not args.views:
+        parser.error('informe a consulta SQL, -f ou --views')
+    try:
+        conn = connect(args.dest, args.threads)
+    except FileNotFoundError as e:
+        sys.exit(str(e))
+    if args.views:
+        for view in ('samples', 'sessions'):
+            print(view)
+            for name, type_, *_ in conn.execute(f'DESCRIBE {view}').fetchall():
+                print(f'  {name:<15} {type_}')
+        return
+    rel = conn.sql(args.sql)
+    if rel is None:
+        return
+    if args.csv:
+        _write_csv(rel)
+    else:
+        rel.show(max_rows=args.max_rows)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Backup online do banco do monitor pela API de backup do SQLite.
+
+Copiar `kick_monitor.sqlite3` com o monitor rodando não é seguro (as escritas
+recentes ficam no -wal e a cópia pode pegar páginas de transações diferentes).
+Aqui a cópia é feita por sqlite3 backup em passos de `--pages` páginas:
+
+- antes do primeiro passo a conexão de origem abre uma transação de leitura;
+  em WAL isso fixa um snapshot, então o backup não recomeça quando o monitor
+  escreve e os writers nunca esperam por ele;
+- entre passos o script dorme `--sleep` segundos para não competir por disco;
+- a cópia vai para um temporário no destino, vira journal_mode=DELETE (um
+  arquivo só, sem -wal), opcionalmente passa por `PRAGMA quick_check` e gzip,
+  e só então é renomeada para `<nome>-<AAAAMMDDTHHMMSSZ>.sqlite3[.gz]`;
+- depois de cada snapshot ficam só os `--keep` mais recentes do destino;
+- partições mensais de samples (partitions.py) têm snapshots próprios
+  (`<nome>.samples-AAAA-MM-<data>.sqlite3`); as já seladas não mudam mais e só
+  são copiadas de novo se o arquivo for mais novo que o último snapshot.
+
+Uso:
+    python scripts/backup_db.py --dest /data/backups --keep 7 --compress
+    python scripts/backup_db.py --every 21600 --keep 8 --compress   # a cada 6h
+Restauração: pare o monitor, descompacte (gunzip) e troque o arquivo do banco
+(e os das partições, se houver).
+"""
+import argparse
+import glob
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import monitor  # noqa: E402
+import partitions  # noqa: E402
+
+PAGES_PER_STEP = 256
+STEP_SLEEP = 0.01  # segundos entre passos
+DEFAULT_DEST = os.environ.get('MONITOR_BACKUP_DIR') or os.path.join(os.path.dirname(monitor.DB_PATH), 'backups')
+
+
+def _prefix(db_path):
+    return os.path.splitext(os.path.basename(db_path))[0]
+
+
+def backup(db_path, dest_dir, pages=PAGES_PER_STEP, sleep=STEP_SLEEP, compress=False, verify=False):
+    """Grava um snapshot consistente de `db_path` em `dest_dir`; devolve o caminho final."""
+    os.makedirs(dest_dir, exist_ok=True)
+    stamp = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    final = os.path.join(dest_dir, f'{_prefix(db_path)}-{stamp}.sqlite3')
+    tmp = f'{final}.tmp'
+    t0 = time.time()
+    steps = [0]
+
+    def progress(status, remaining, total):
+        steps[0] += 1
+        if remaining and sleep:
+            time.sleep(sleep)
+
+    src = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    dst = sqlite3.connect(tmp, isolation_level=None)
+    try:
+        # snapshot de leitura fixo durante toda a cópia (ver docstring)
+        src.execute('BEGIN')
+        src.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        src.backup(dst, pages=pages, progress=progress)
+        src.execute('COMMIT')
+        dst.execute('PRAGMA journal_mode=DELETE')
+        if verify:
+            result = dst.execute('PRAGMA quick_check').fetchone()[0]
+            if result != 'ok':
+                raise sqlite3.DatabaseError(f'quick_check do backup falhou: {result}')
+    except BaseException:
+        dst.close()
+        src.close()
+        for p in (tmp, f'{tmp}-journal'):
+            if os.path.exists(p):
+                os.remove(p)
+        raise
+    dst.close()
+    src.close()
+    if compress:
+        with open(tmp, 'rb') as fin, gzip.open(f'{tmp}.gz', 'wb', compresslevel=6) as fout:
+            shutil.copyfileobj(fin, fout, 1024 * 1024)
+        os.remove(tmp)
+        tmp, final = f'{tmp}.gz', f'{final}.gz'
+    os.replace(tmp, final)
+    logging.info("Backup de %s em %s: %s passos, %.1f MB, %.1fs",
+                 db_path, final, steps[0], os.path.getsize(final) / 1e6, time.time() - t0)
+    return final
+
+
+def snapshots(db_path, dest_dir):
+    """Snapshots de `db_path` em `dest_dir`, do mais antigo ao mais recente."""
+    pattern = os.path.join(glob.escape(dest_dir), f'{glob.escape(_prefix(db_path))}-*.sqlite3')
+    return sorted(glob.glob(pattern) + glob.glob(pattern + '.gz'), key=os.path.basename)
+
+
+def prune(db_path, dest_dir, keep):
+    """Apaga os snapshots mais antigos de `db_path` em `dest_dir`, mantendo `keep`."""
+    existing = snapshots(db_path, dest_dir)
+    removed = existing[:-keep] if keep > 0 else []
+    for p in removed:
+        os.remove(p)
+        logging.info("Backup antigo removido: %s", p)
+    return removed
+
+
+def run(args):
+    backup(args.db, args.dest, args.pages, args.sleep, args.compress, args.verify)
+    prune(args.db, args.dest, args.keep)
+    for month in partitions.months(args.db):
+        part = partitions.path_for(args.db, month)
+        last = snapshots(part, args.dest)[-1:]
+        if last and partitions.is_sealed(part) and os.path.getmtime(last[0]) >= os.path.getmtime(part):
+            continue
+        backup(part, args.dest, args.pages, args.sleep, args.compress, args.verify)
+        prune(part, args.dest, args.keep)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=monitor.DB_PATH)
+    parser.add_argument('--dest', default=DEFAULT_DEST, help='diretório dos snapshots (padrão: MONITOR_BACKUP_DIR ou backups/ ao lado do banco)')
+    parser.add_argument('--keep', type=int, default=7, help='snapshots mantidos no destino (0 = todos)')
+    parser.add_argument('--compress', action='store_true', help='grava .sqlite3.gz')
+    parser.add_argument('--verify', action='store_true', help='roda PRAGMA quick_check na cópia antes de publicá-la')
+    parser.add_argument('--pages', type=int, default=PAGES_PER_STEP, help='páginas copiadas por passo')
+    parser.add_argument('--sleep', type=float, default=STEP_SLEEP, help='segundos de pausa entre passos')
+    parser.add_argument('--every', type=float, default=0, help='repete a cada N segundos (padrão: um snapshot e sai)')
+    args = parser.parse_args()
+    if not args.every:
+        run(args)
+        return
+    while True:
+        t0 = time.time()
+        try:
+            run(args)
+        except Exception:
+            logging.exception("Backup de %s falhou; nova tentativa no próximo ciclo", args.db)
+        time.sleep(max(0.0, args.every - (time.time() - t0)))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Exporta dias encerrados de `samples` e `sessions` para Parquet, fora do banco do monitor.
+
+Agregações pesadas (médias por hora de todos os canais, comparações entre
+grupos) rodadas direto no `kick_monitor.sqlite3` disputam disco e lock com o
+monitor. Este script copia cada dia UTC já encerrado para arquivos Parquet
+particionados no estilo Hive, que `scripts/analytics.py` consulta com DuckDB:
+
+    <dest>/samples/date=AAAA-MM-DD/channel=<slug>/part-0.parquet
+    <dest>/sessions/date=AAAA-MM-DD/part-0.parquet     (pela data de início)
+
+- um dia de samples é exportado quando já passou `--lag` segundos da meia-noite
+  seguinte (o spool pode ainda estar drenando as últimas amostras); o de
+  sessions, além disso, só quando todas as sessions iniciadas nele já fecharam;
+- cada dia é escrito num diretório temporário e publicado com rename, então um
+  dia exportado está sempre completo e nunca é reexportado (a não ser com
+  `--force`, por exemplo depois de `rebuild_sessions.py`, que renumera as sessions);
+- a leitura é feita por canal e dia pelo índice (channel, ts), em conexões
+  só de leitura: em WAL o monitor não espera pelo exportador;
+- cada ciclo começa depois do último dia publicado (mais os dias com sessions
+  adiadas) e lista os canais por `channels`/`channel_state` e pelas sessions
+  do período, sem varrer `samples`; amostras de um canal removido que não
+  teve session no período pendente não são exportadas;
+- com partições mensais (partitions.py) a partição do mês do dia é anexada
+  junto com as amostras que ainda estão no banco principal.
+
+Uso:
+    python scripts/export_parquet.py                       # exporta os dias pendentes e sai
+    python scripts/export_parquet.py --every 3600          # a cada hora
+    python scripts/export_parquet.py --since 2024-05-01 --force
+"""
+import argparse
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import time
+import urllib.parse
+from datetime import date, datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import monitor  # noqa: E402
+import partitions  # noqa: E402
+
+DAY = 86400
+EXPORT_LAG = 3600  # segundos depois da meia-noite UTC até o dia anterior ser considerado encerrado
+DEFAULT_DEST = os.environ.get('MONITOR_PARQUET_DIR') or os.path.join(os.path.dirname(monitor.DB_PATH), 'parquet')
+SAMPLES_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('ts', pa.int64()),
+    ('viewers', pa.int64()),
+    ('is_live', pa.int8()),
+    ('session_id', pa.int64()),
+])
+SESSIONS_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('channel', pa.string()),
+    ('livestream_id', pa.string()),
+    ('title', pa.string()),
+    ('start_ts', pa.int64()),
+    ('end_ts', pa.int64()),
+    ('avg_viewers', pa.float64()),
+    ('max_viewers', pa.int64()),
+    ('sample_count', pa.int64()),
+])
+SAMPLES_SQL = ('SELECT id, ts, viewers, is_live, session_id FROM samples '
+               'WHERE channel = ? AND ts >= ? AND ts < ? ORDER BY ts')
+SESSIONS_SQL = ('SELECT id, channel, livestream_id, title, start_ts, end_ts, avg_viewers, max_viewers, sample_count '
+                'FROM main.sessions WHERE start_ts >= ? AND start_ts < ? ORDER BY id')
+
+
+def day_range(day):
+    start = int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())
+    return start, start + DAY
+
+
+def day_dir(dest, dataset, day):
+    return os.path.join(dest, dataset, f'date={day.isoformat()}')
+
+
+def _connect(path):
+    conn = sqlite3.connect(f'file:{urllib.parse.quote(path)}?mode=ro', uri=True, timeout=30)
+    conn.isolation_level = None  # cada SELECT é uma leitura curta; nada segura snapshot entre canais
+    return conn
+
+
+def _channels(conn, since):
+    """Canais monitorados (channels/channel_state) mais os com session iniciada desde `since` (epoch).
+
+    Não varre `samples`: um DISTINCT nela percorre o índice inteiro do banco e
+    de cada partição. As sessions cobrem canais removidos depois do fim do dia.
+    """
+    names = {r[0] for r in conn.execute('SELECT name FROM main.channels')}
+    names.update(r[0] for r in conn.execute('SELECT channel FROM main.channel_state'))
+    names.update(r[0] for r in conn.execute('SELECT DISTINCT channel FROM main.sessions WHERE start_ts >= ?', (since,)))
+    return sorted(names)
+
+
+def _exported_days(dest, dataset):
+    """Dias com diretório date= publicado em `dataset`."""
+    try:
+        entries = os.listdir(os.path.join(dest, dataset))
+    except FileNotFoundError:
+        return set()
+    days = set()
+    for name in entries:
+        if name.startswith('date='):
+            try:
+                days.add(date.fromisoformat(name[5:]))
+            except ValueError:
+                pass
+    return days
+
+
+def _pending_start(dest):
+    """Primeiro dia a exportar a partir do que já foi publicado, ou None se nada foi exportado ainda.
+
+    Começa no dia seguinte ao último `samples/date=` publicado, voltando aos
+    dias cujas sessions foram adiadas (sessions ainda abertas naquele ciclo).
+    """
+    samples = _exported_days(dest, 'samples')
+    if not samples:
+        return None
+    return min([max(samples) + timedelta(days=1)] + list(samples - _exported_days(dest, 'sessions')))
+
+
+def _first_day(conn, path, channels):
+    """Dia UTC da amostra mais antiga (MIN por canal, pelo índice), ou None se não há amostras.
+
+    Só na primeira exportação (nenhum dia publicado ainda).
+    """
+    first = None
+    tables = ['main.samples']
+    months = partitions.months(path)
+    if months:
+        # a partição mais antiga basta: as mais novas não têm nada anterior a ela
+        partitions.attach(conn, path, months[:1], readonly=True)
+        tables.append(f'{partitions.schema(months[0])}.samples')
+    for table in tables:
+        for channel in channels:
+            ts = conn.execute(f'SELECT MIN(ts) FROM {table} WHERE channel = ?', (channel,)).fetchone()[0]
+            if ts is not None and (first is None or ts < first):
+                first = ts
+    partitions.attach(conn, path, ())
+    return None if first is None else datetime.fromtimestamp(first, tz=timezone.utc).date()
+
+
+def _publish(tmp, final):
+    if os.path.exists(final):
+        shutil.rmtree(final)
+    os.rename(tmp, final)
+
+
+def _tmp_dir(dest, dataset, day):
+    # fora do padrão date=*: consultas com glob nunca enxergam um dia pela metade
+    tmp = os.path.join(dest, dataset, f'_tmp-{day.isoformat()}-{os.getpid()}')
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    return tmp
+
+
+def export_samples_day(conn, path, dest, day, channels):
+    """Grava as amostras de `day`, um arquivo por canal; devolve quantas linhas exportou."""
+    start, end = day_range(day)
+    partitions.attach(conn, path, [partitions.month_of(start)], readonly=True)
+    tmp = _tmp_dir(dest, 'samples', day)
+    total = 0
+    try:
+        for channel in channels:
+            rows = conn.execute(SAMPLES_SQL, (channel, start, end)).fetchall()
+            if not rows:
+                continue
+            columns = list(zip(*rows))
+            table = pa.Table.from_arrays([pa.array(col, type=f.type) for col, f in zip(columns, SAMPLES_SCHEMA)],
+                                         schema=SAMPLES_SCHEMA)
+            channel_dir = os.path.join(tmp, f'channel={channel}')
+            os.makedirs(channel_dir)
+            pq.write_table(table, os.path.join(channel_dir, 'part-0.parquet'), compression='zstd')
+            total += len(rows)
+        _publish(tmp, day_dir(dest, 'samples', day))
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return total
+
+
+def export_sessions_day(conn, dest, day):
+    """Grava as sessions iniciadas em `day`; None se alguma ainda está aberta (tenta no próximo ciclo)."""
+    start, end = day_range(day)
+    open_sessions = conn.execute('SELECT COUNT(*) FROM main.sessions WHERE start_ts >= ? AND start_ts < ? AND end_ts IS NULL',
+                                 (start, end)).fetchone()[0]
+    if open_sessions:
+        return None
+    rows = conn.execute(SESSIONS_SQL, (start, end)).fetchall()
+    tmp = _tmp_dir(dest, 'sessions', day)
+    try:
+        columns = list(zip(*rows)) if rows else [()] * len(SESSIONS_SCHEMA)
+        table = pa.Table.from_arrays([pa.array(col, type=f.type) for col, f in zip(columns, SESSIONS_SCHEMA)],
+                                     schema=SESSIONS_SCHEMA)
+        pq.write_table(table, os.path.join(tmp, 'part-0.parquet'), compression='zstd')
+        _publish(tmp, day_dir(dest, 'sessions', day))
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return len(rows)
+
+
+def export(path, dest, since=None, force=False, lag=EXPORT_LAG, now=None):
+    """Exporta os dias encerrados ainda não exportados; devolve (dias, amostras, sessions) exportados."""
+    now = time.time() if now is None else now
+    last = datetime.fromtimestamp(now - lag, tz=timezone.utc).date() - timedelta(days=1)
+    conn = _connect(path)
+    days = samples_total = sessions_total = 0
+    try:
+        first = since or _pending_start(dest)
+        if first is not None and first > last:
+            return 0, 0, 0
+        channels = _channels(conn, 0 if first is None else day_range(first)[0])
+        first = first or _first_day(conn, path, channels)
+        if first is None:
+            return 0, 0, 0
+        day = first
+        while day <= last:
+            t0 = time.time()
+            exported = False
+            if force or not os.path.exists(day_dir(dest, 'samples', day)):
+                samples_total += export_samples_day(conn, path, dest, day, channels)
+                exported = True
+            if force or not os.path.exists(day_dir(dest, 'sessions', day)):
+                n = export_sessions_day(conn, dest, day)
+                if n is None:
+                    logging.info("Sessions de %s ainda abertas; exportação do dia adiada", day)
+                else:
+                    sessions_total += n
+                    exported = True
+            if exported:
+                days += 1
+                logging.info("Dia %s exportado para %s em %.1fs", day, dest, time.time() - t0)
+            day += timedelta(days=1)
+    finally:
+        partitions.attach(conn, path, ())
+        conn.close()
+    return days, samples_total, sessions_total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=monitor.DB_PATH)
+    parser.add_argument('--dest', default=DEFAULT_DEST, help='diretório dos Parquet (padrão: MONITOR_PARQUET_DIR ou parquet/ ao lado do banco)')
+    parser.add_argument('--since', type=date.fromisoformat, help='primeiro dia (AAAA-MM-DD; padrão: o da amostra mais antiga)')
+    parser.add_argument('--force', action='store_true', help='reexporta os dias já exportados a partir de --since')
+    parser.add_argument('--lag', type=int, default=EXPORT_LAG, help='segundos depois da meia-noite UTC até exportar o dia anterior')
+    parser.add_argument('--every', type=float, default=0, help='repete a cada N segundos (padrão: exporta e sai)')
+    args = parser.parse_args()
+    if args.force and not args.since:
+        parser.error('--force exige --since')
+    while True:
+        t0 = time.time()
+        try:
+            days, n_samples, n_sessions = export(args.db, args.dest, args.since, args.force, args.lag)
+            logging.info("%d dias exportados (%d amostras, %d sessions) em %.1fs",
+                         days, n_samples, n_sessions, time.time() - t0)
+        except Exception:
+            if not args.every:
+                raise
+            logging.exception("Exportação de %s falhou; nova tentativa no próximo ciclo", args.db)
+        if not args.every:
+            return
+        # --force vale só para a primeira passada
+        args.force = False
+        time.sleep(max(0.0, args.every - (time.time() - t0)))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Manutenção das partições mensais de samples (ver partitions.py).
+
+- `--migrate` move as amostras da `samples` do banco principal para as
+  partições do mês de cada uma, em lotes de `--batch` linhas por rowid (com os
+  mesmos ids; cada lote é copiado e depois apagado em transações curtas, então
+  pode rodar com o monitor ativo e ser interrompido e retomado). `--vacuum`
+  devolve ao disco o espaço liberado no banco principal (VACUUM trava o banco:
+  pare o monitor).
+- `--drop-before AAAA-MM` apaga os arquivos das partições anteriores ao mês.
+  Amostras ainda não migradas desses meses continuam no banco principal.
+- `--seal` tira do WAL as partições de meses que o monitor não grava mais
+  (o reconciler do monitor já faz isso sozinho com MONITOR_PARTITIONS=1).
+- Sem opções lista as partições com tamanho e estado.
+
+Uso:
+    MONITOR_PARTITIONS=1 python monitor.py          # grava em partições
+    python scripts/partition_samples.py --migrate
+    python scripts/partition_samples.py --drop-before 2024-01
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import monitor  # noqa: E402
+import partitions  # noqa: E402
+
+BATCH_ROWS = 20000
+COLUMNS = partitions.COLUMNS
+
+
+@contextmanager
+def _transaction(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+def migrate(path, batch=BATCH_ROWS, sleep=0.05):
+    """Move main.samples para as partições em lotes por rowid; devolve quantas linhas moveu."""
+    monitor.init_db(path)
+    conn = monitor.get_conn(path)
+    conn.isolation_level = None  # ATTACH fora de transação, BEGIN IMMEDIATE por lote
+    moved = 0
+    t0 = time.time()
+    try:
+        last_id = 0
+        while True:
+            rows = conn.execute(f'SELECT {COLUMNS} FROM main.samples WHERE id > ? ORDER BY id LIMIT ?',
+                                (last_id, batch)).fetchall()
+            if not rows:
+                break
+            by_month = {}
+            for r in rows:
+                month = partitions.month_of(r[2])
+                if month not in by_month and len(by_month) == partitions.MAX_ATTACHED:
+                    break  # lote cobre meses demais para uma conexão: o resto vai no próximo
+                by_month.setdefault(month, []).append(r)
+            for month in by_month:
+                partitions.create(path, month)
+            partitions.attach(conn, path, by_month)
+            ids = [r[0] for rs in by_month.values() for r in rs]
+            # duas transações: em WAL um commit em vários arquivos não é atômico, e apagar antes
+            # de gravar perderia linhas num crash; o OR IGNORE torna o lote seguro de repetir
+            with _transaction(conn):
+                for month, month_rows in by_month.items():
+                    conn.executemany(
+                        f'INSERT OR IGNORE INTO {partitions.schema(month)}.samples ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        month_rows,
+                    )
+            with _transaction(conn):
+                conn.executemany('DELETE FROM main.samples WHERE id = ?', ((i,) for i in ids))
+            moved += len(ids)
+            last_id = max(ids)
+            print(f'  {moved} linhas movidas ({time.time() - t0:.1f}s), meses {", ".join(sorted(by_month))}')
+            if sleep:
+                time.sleep(sleep)  # deixa o monitor pegar o lock entre lotes
+    finally:
+        partitions.attach(conn, path, ())
+        conn.close()
+    return moved
+
+
+def drop_before(path, month):
+    """Apaga as partições anteriores a `month` (AAAA-MM); devolve os meses apagados."""
+    dropped = []
+    for m in partitions.months(path):
+        if m >= month:
+            continue
+        base = partitions.path_for(path, m)
+        for p in (base, f'{base}-wal', f'{base}-shm'):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+        dropped.append(m)
+    return dropped
+
+
+def show(path):
+    months = partitions.months(path)
+    if not months:
+        print('nenhuma partição')
+    for m in months:
+        p = partitions.path_for(path, m)
+        state = 'selada' if partitions.is_sealed(p) else 'WAL'
+        print(f'{m}  {os.path.getsize(p) / 1e6:10.1f} MB  {state}')
+    legacy = sqlite3.connect(path).execute('SELECT COUNT(*) FROM samples').fetchone()[0]
+    print(f'amostras ainda no banco principal: {legacy}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=monitor.DB_PATH)
+    parser.add_argument('--migrate', action='store_true', help='move samples do banco principal para as partições')
+    parser.add_argument('--batch', type=int, default=BATCH_ROWS, help='linhas por lote do --migrate')
+    parser.add_argument('--vacuum', action='store_true', help='VACUUM do banco principal depois do --migrate')
+    parser.add_argument('--drop-before', metavar='AAAA-MM', help='apaga as partições anteriores ao mês')
+    parser.add_argument('--seal', action='store_true', help='tira do WAL as partições de meses encerrados')
+    args = parser.parse_args()
+    if args.migrate:
+        print(f'{migrate(args.db, args.batch)} amostras movidas para partições')
+        if args.vacuum:
+            conn = sqlite3.connect(args.db, timeout=30)
+            conn.execute('VACUUM')
+            conn.close()
+    if args.drop_before:
+        dropped = drop_before(args.db, args.drop_before)
+        print(f'partições apagadas: {", ".join(dropped) or "nenhuma"}')
+    if args.seal:
+        sealed = partitions.seal_old(args.db, partitions.month_of(int(time.time())))
+        print(f'partições seladas: {", ".join(sealed) or "nenhuma"}')
+    if not (args.migrate or args.drop_before or args.seal):
+        show(args.db)
+
+
+if __name__ == '__main__':
+    main()
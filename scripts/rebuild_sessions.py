@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Reconstrói `sessions`, `peaks` e `channel_sketches` a partir de `samples`.
+
+Para usar depois de mudanças na lógica de sessões, quedas do monitor ou bugs.
+Cada canal é lido num processo do pool, em janelas de um mês (UTC) em ordem
+de ts, e processado com NumPy; a session aberta no fim de uma janela e os
+máximos de `peaks` passam para a seguinte, então a memória por canal não
+cresce com o histórico:
+
+- `livestream_id` vem de `raw_json` (json_extract no próprio SQLite; sem
+  raw_json usa o livestream_id da session atual da amostra);
+- uma session começa numa amostra ao vivo quando a anterior não estava ao
+  vivo, o livestream_id mudou ou o intervalo passou de STALE_MINUTES (mesma
+  regra do worker + reconcile_sessions); termina na primeira amostra fora
+  dela (ou na última amostra, se depois veio um buraco maior que STALE_MINUTES);
+- avg/max/contagem (só das amostras da session, como no monitor), p50/p90/p99
+  e o sketch de cada session, os sketches mesclados por dia/semana/mês, os
+  picos atuais e o histórico de títulos de cada session (`session_titles`,
+  indexado para a busca do dashboard) saem na mesma passada.
+
+Os resultados vão para tabelas temporárias e são trocados numa única
+transação (inclusive `samples.session_id`, `events.session_id`,
+`channel_state.session_id`, a fila `capture_jobs` e `session_titles`): leitores veem o estado antigo ou o novo, nunca
+um meio-termo. Pare o monitor antes (as sessions abertas dos workers mudam de id).
+
+Com partições mensais de samples (partitions.py) as amostras são lidas de
+cada arquivo, um mês anexado por vez, e o `session_id` das partições é
+regravado depois da troca, numa transação por mês.
+
+Uso:
+    python scripts/rebuild_sessions.py --dry-run
+    python scripts/rebuild_sessions.py --workers 8
+    python scripts/rebuild_sessions.py --channels xqc,outro
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import checkpoint  # noqa: E402
+import monitor  # noqa: E402
+import partitions  # noqa: E402
+import sketch  # noqa: E402
+
+SAMPLES_SQL = """
+    SELECT s.ts, COALESCE(s.viewers, -1), COALESCE(s.is_live, 0),
+           COALESCE(
+               CAST(CASE WHEN json_valid(s.raw_json) THEN COALESCE(
+                   json_extract(s.raw_json, '$.livestream.id'), json_extract(s.raw_json, '$.livestream.uuid'),
+                   json_extract(s.raw_json, '$.live_stream.id'), json_extract(s.raw_json, '$.live_stream.uuid'))
+               END AS TEXT),
+               old.livestream_id),
+           COALESCE(
+               CASE WHEN json_valid(s.raw_json) THEN COALESCE(
+                   json_extract(s.raw_json, '$.livestream.session_title'), json_extract(s.raw_json, '$.livestream.title'),
+                   json_extract(s.raw_json, '$.live_stream.session_title'), json_extract(s.raw_json, '$.live_stream.title'))
+               END,
+               old.title)
+    FROM {table} s LEFT JOIN main.sessions old ON old.id = s.session_id
+    WHERE s.channel = ? AND s.ts >= ? AND s.ts < ?
+    ORDER BY s.ts, s.id
+"""
+
+
+def sample_tables(conn, path, readonly=False):
+    """Nomes das tabelas de amostras (banco principal e cada partição, em ordem), anexando uma partição por vez."""
+    yield 'main.samples'
+    for month in partitions.months(path):
+        partitions.attach(conn, path, [month], readonly=readonly)
+        yield f'{partitions.schema(month)}.samples'
+    partitions.attach(conn, path, ())
+
+
+def channel_windows(path, channel):
+    """Amostras do canal um mês (UTC) por vez, em ordem de ts: (ts, viewers, is_live, ls_id, title) como arrays.
+
+    Só uma janela fica em memória; o mês da partição (se houver) é anexado junto.
+    """
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        part_months = partitions.months(path)
+        lo, hi = conn.execute('SELECT MIN(ts), MAX(ts) FROM main.samples WHERE channel = ?', (channel,)).fetchone()
+        bounds = [partitions.month_of(t) for t in (lo, hi) if t is not None] + part_months
+        if not bounds:
+            return
+        month, last = min(bounds), max(bounds)
+        while month <= last:
+            start, end = partitions.month_range(month)
+            tables = ['main.samples']
+            if month in part_months:
+                partitions.attach(conn, path, [month], readonly=True)
+                tables.append(f'{partitions.schema(month)}.samples')
+            rows = []
+            for table in tables:
+                rows += conn.execute(SAMPLES_SQL.format(table=table), (channel, start, end)).fetchall()
+            if rows:
+                # amostras ainda não migradas do banco principal podem ser de meses já particionados
+                rows.sort(key=lambda r: r[0])
+                ts, viewers, is_live, ls_ids, titles = zip(*rows)
+                yield (np.fromiter(ts, np.int64, len(rows)), np.fromiter(viewers, np.int64, len(rows)),
+                       np.fromiter(is_live, np.int64, len(rows)), np.array(ls_ids, dtype=object), titles)
+            month = partitions.add_months(month, 1)
+        partitions.attach(conn, path, ())
+    finally:
+        conn.close()
+
+
+def session_marks(ts, is_live, ls_ids, stale_seconds, prev=None):
+    """Máscaras (live, start, end) da janela, vetorizado; `prev` = (live, ls_id, ts) da amostra anterior à janela.
+
+    `end` da última amostra fica falso: se a session termina ali só a próxima janela diz.
+    """
+    has_ls = np.array([bool(x) for x in ls_ids], dtype=bool)
+    live = (is_live > 0) & has_ls
+    ls = np.where(has_ls, ls_ids, '')
+    prev_live, prev_ls, prev_ts = prev if prev else (False, '', ts[0])
+    prev_live = np.concatenate(([prev_live], live[:-1]))
+    changed = np.concatenate(([ls[0] != (prev_ls or '')], ls[1:] != ls[:-1]))
+    gap = np.diff(ts, prepend=prev_ts) > stale_seconds
+    start = live & (~prev_live | changed | gap)
+    next_start = np.concatenate((start[1:], [False]))
+    next_live = np.concatenate((live[1:], [True]))
+    end = live & (~next_live | next_start)
+    return live, start, end
+
+
+def segment_max(values, starts, ends):
+    """Máximo de values[a:b + 1] para cada (a, b): reduceat em índices intercalados (a, b + 1), um resultado sim, outro não."""
+    if not starts.size:
+        return np.empty(0, values.dtype)
+    idx = np.empty(starts.size * 2, np.int64)
+    idx[0::2] = starts
+    idx[1::2] = ends + 1
+    padded = np.append(values, values[-1:])  # b + 1 pode ser o fim do array
+    return np.maximum.reduceat(padded, idx)[0::2]
+
+
+def title_changes(titles, a, b, last=None):
+    """(índice, título) de cada troca de título dentro da session [a, b]; amostras sem título não contam."""
+    changes = []
+    for i in range(a, b + 1):
+        if titles[i] and titles[i] != last:
+            changes.append((i, titles[i]))
+            last = titles[i]
+    return changes
+
+
+def _week_start(day_start):
+    return day_start - ((day_start // 86400 + 3) % 7) * 86400  # 1970-01-01 foi quinta
+
+
+def _month_start(ts):
+    return ts.astype('datetime64[s]').astype('datetime64[M]').astype('datetime64[s]').astype(np.int64)
+
+
+class ChannelRebuild:
+    """Estado de um canal entre janelas: a session aberta (ou que pode continuar na próxima janela), a amostra
+    anterior e os máximos correntes de `peaks`. Equivale a processar o histórico inteiro de uma vez."""
+
+    def __init__(self, channel, stale_seconds):
+        self.channel = channel
+        self.stale_seconds = stale_seconds
+        self.prev = None
+        self.open = None
+        self.sessions = []
+        self.titles = []
+        self.periods = {}
+        self.peak = None  # (viewers, ts), primeira ocorrência como o '>' de update_peaks
+        self.period_max = {}  # 'day'/'week'/'month' -> (início do período, máximo)
+        self.last_ts = None
+
+    def feed(self, ts, viewers, is_live, ls_ids, titles):
+        n = ts.size
+        live, start, end = session_marks(ts, is_live, ls_ids, self.stale_seconds, self.prev)
+        if self.open is not None and not (live[0] and not start[0]):
+            self._close(self.open, int(ts[0]))
+            self.open = None
+        seg = start.copy()
+        seg[0] |= self.open is not None  # a session aberta continua no começo da janela
+        starts, ends = np.flatnonzero(seg), np.flatnonzero(end)
+        if ends.size < starts.size:
+            ends = np.append(ends, n - 1)  # última session segue aberta para a próxima janela
+        assert starts.size == ends.size and (starts <= ends).all()
+
+        csum = np.concatenate(([0], np.cumsum(viewers)))
+        sums = (csum[ends + 1] - csum[starts]).tolist()
+        maxes = segment_max(viewers, starts, ends).tolist()
+        for i, (a, b) in enumerate(zip(starts.tolist(), ends.tolist())):
+            sess = self.open if (i == 0 and self.open is not None) else None
+            if sess is None:
+                sess = {'ls_id': ls_ids[a], 'title': titles[a], 'start_ts': int(ts[a]), 'sum': 0, 'count': 0,
+                        'max': None, 'sketch': sketch.QuantileSketch(), 'last_title': None}
+            sess['sum'] += sums[i]
+            sess['count'] += b - a + 1
+            sess['max'] = maxes[i] if sess['max'] is None else max(sess['max'], maxes[i])
+            sess['sketch'].merge(sketch.from_values(viewers[a:b + 1]))
+            sess['last_ts'] = int(ts[b])
+            for j, title in title_changes(titles, a, b, sess['last_title']):
+                self.titles.append((self.channel, sess['start_ts'], int(ts[j]), title))
+                sess['last_title'] = title
+            if b < n - 1:
+                self._close(sess, int(ts[b + 1]))
+                self.open = None
+            else:
+                self.open = sess
+
+        self._feed_peaks(ts, viewers)
+        self.prev = (bool(live[-1]), ls_ids[-1], int(ts[-1]))
+
+    def _feed_peaks(self, ts, viewers):
+        i = int(viewers.argmax())
+        if self.peak is None or viewers[i] > self.peak[0]:
+            self.peak = (int(viewers[i]), int(ts[i]))
+        day = ts // 86400 * 86400
+        for period, keys in (('day', day), ('week', _week_start(day)), ('month', _month_start(ts))):
+            key = int(keys[-1])
+            # chaves crescentes: o período da última amostra é um sufixo da janela
+            value = int(viewers[np.searchsorted(keys, key):].max())
+            carried = self.period_max.get(period)
+            if carried and carried[0] == key:
+                value = max(value, carried[1])
+            self.period_max[period] = (key, value)
+        self.last_ts = int(ts[-1])
+
+    def _close(self, sess, next_ts):
+        """Fecha a session: o worker fecha na primeira amostra fora dela, ou na última se depois veio um buraco."""
+        end_ts = next_ts if next_ts - sess['last_ts'] <= self.stale_seconds else sess['last_ts']
+        self._emit(sess, end_ts)
+
+    def _emit(self, sess, end_ts):
+        sk = sess['sketch']
+        p50, p90, p99 = sk.quantiles((0.5, 0.9, 0.99))
+        self.sessions.append((self.channel, sess['ls_id'], sess['title'], sess['start_ts'], end_ts, sess['last_ts'],
+                              float(sess['sum']) / sess['count'], int(sess['max']), sess['count'], p50, p90, p99,
+                              sk.to_bytes()))
+        if end_ts is not None:
+            # como em _close_session: sessions abertas só entram nos períodos ao fechar
+            for period, period_start_fn in monitor.SKETCH_PERIODS:
+                key = (period, period_start_fn(sess['start_ts']))
+                if key in self.periods:
+                    self.periods[key].merge(sk)
+                else:
+                    self.periods[key] = sketch.QuantileSketch.from_bytes(sk.to_bytes())
+
+    def finish(self, now):
+        """Sessions, sketches por período, linha de `peaks` e histórico de títulos do canal."""
+        if self.open is not None:
+            last = self.open['last_ts']
+            self._emit(self.open, None if now - last <= self.stale_seconds else last)  # None: ainda ao vivo
+            self.open = None
+        if self.last_ts is None:
+            return [], [], None, []
+        sketches = [(self.channel, p, s, sk.to_bytes(), sk.count) for (p, s), sk in self.periods.items()]
+        last = self.last_ts
+        peaks = (self.peak[0], self.peak[1], self.period_max['day'][1], monitor.iso_date(last),
+                 self.period_max['week'][1], monitor.week_start_iso(last), self.period_max['month'][1],
+                 monitor.iso_month(last))
+        return self.sessions, sketches, peaks, self.titles
+
+
+def rebuild_channel(args):
+    """Processa um canal, janela por janela; roda num processo do pool."""
+    path, channel, stale_seconds, now = args
+    state = ChannelRebuild(channel, stale_seconds)
+    for window in channel_windows(path, channel):
+        state.feed(*window)
+    return (channel, *state.finish(now))
+
+
+def create_staging(conn):
+    conn.executescript("""
+        CREATE TEMP TABLE rebuild_channels (channel TEXT PRIMARY KEY);
+        CREATE TEMP TABLE rebuild_sessions (
+            channel TEXT, livestream_id TEXT, title TEXT, start_ts INTEGER, end_ts INTEGER, last_ts INTEGER,
+            avg_viewers REAL, max_viewers INTEGER, sample_count INTEGER,
+            p50_viewers REAL, p90_viewers REAL, p99_viewers REAL, viewers_sketch BLOB
+        );
+        CREATE TEMP TABLE rebuild_titles (channel TEXT, start_ts INTEGER, ts INTEGER, title TEXT);
+        CREATE TEMP TABLE rebuild_sketches (channel TEXT, period TEXT, period_start TEXT, sketch BLOB, sample_count INTEGER);
+        CREATE TEMP TABLE rebuild_peaks (
+            channel TEXT, peak_overall INTEGER, peak_overall_ts INTEGER, peak_daily INTEGER, peak_daily_date TEXT,
+            peak_weekly INTEGER, peak_week_start TEXT, peak_monthly INTEGER, peak_month TEXT
+        );
+    """)
+
+
+def swap(conn, path):
+    """Troca os dados dos canais reconstruídos numa única transação."""
+    cur = conn.cursor()
+    cur.execute('BEGIN IMMEDIATE')
+    try:
+        scope = 'channel IN (SELECT channel FROM temp.rebuild_channels)'
+        for table in ('sessions', 'peaks', 'channel_sketches', 'session_titles'):
+            cur.execute(f'DELETE FROM {table} WHERE {scope}')
+        cur.execute("""
+            INSERT INTO sessions (channel, livestream_id, title, start_ts, end_ts, avg_viewers, max_viewers,
+                                  sample_count, p50_viewers, p90_viewers, p99_viewers, viewers_sketch)
+            SELECT channel, livestream_id, title, start_ts, end_ts, avg_viewers, max_viewers,
+                   sample_count, p50_viewers, p90_viewers, p99_viewers, viewers_sketch
+            FROM temp.rebuild_sessions ORDER BY start_ts, channel
+        """)
+        cur.execute('INSERT INTO channel_sketches SELECT * FROM temp.rebuild_sketches')
+        # os triggers de session_titles mantêm o índice de busca (session_titles_fts)
+        cur.execute("""
+            INSERT INTO session_titles (session_id, channel, ts, title)
+            SELECT s.id, r.channel, r.ts, r.title
+            FROM temp.rebuild_titles r JOIN sessions s ON s.channel = r.channel AND s.start_ts = r.start_ts
+            ORDER BY s.id, r.ts
+        """)
+        cur.execute("""
+            INSERT INTO peaks (channel, peak_overall, peak_overall_ts, peak_daily, peak_daily_date,
+                               peak_weekly, peak_week_start, peak_monthly, peak_month)
+            SELECT * FROM temp.rebuild_peaks
+        """)
+        ranges = cur.execute("""
+            SELECT s.id, r.channel, r.start_ts, r.last_ts, r.end_ts
+            FROM temp.rebuild_sessions r JOIN sessions s ON s.channel = r.channel AND s.start_ts = r.start_ts
+        """).fetchall()
+        for table in ('samples', 'events', 'channel_state'):
+            cur.execute(f'UPDATE {table} SET session_id = NULL WHERE session_id IS NOT NULL AND {scope}')
+        cur.executemany('UPDATE samples SET session_id = ? WHERE channel = ? AND ts BETWEEN ? AND ?',
+                        [r[:4] for r in ranges])
+        cur.executemany('UPDATE events SET session_id = ? WHERE channel = ? AND ts BETWEEN ? AND ?',
+                        [r[:4] for r in ranges])
+        cur.executemany('UPDATE channel_state SET session_id = ? WHERE channel = ? AND is_live = 1',
+                        [(r[0], r[1]) for r in ranges if r[4] is None])
+        # fila de capturas (capture.py) aponta para as sessions abertas novas; sem session aberta, sai da fila
+        cur.executemany('UPDATE capture_jobs SET session_id = ? WHERE channel = ?',
+                        [(r[0], r[1]) for r in ranges if r[4] is None])
+        cur.execute(f'DELETE FROM capture_jobs WHERE {scope} AND session_id NOT IN (SELECT id FROM sessions WHERE end_ts IS NULL)')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    relink_partitions(conn, path, ranges)
+    return len(ranges)
+
+
+def relink_partitions(conn, path, ranges):
+    """samples.session_id nas partições mensais, uma transação por mês (ATTACH não roda dentro de transação)."""
+    scope = 'channel IN (SELECT channel FROM temp.rebuild_channels)'
+    for table in sample_tables(conn, path):
+        if table == 'main.samples':
+            continue
+        cur = conn.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            cur.execute(f'UPDATE {table} SET session_id = NULL WHERE session_id IS NOT NULL AND {scope}')
+            cur.executemany(f'UPDATE {table} SET session_id = ? WHERE channel = ? AND ts BETWEEN ? AND ?',
+                            [r[:4] for r in ranges])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def run(path, channels=None, workers=None, dry_run=False, force=False):
+    monitor.init_db(path)
+    stale_seconds = monitor.STALE_MINUTES * 60
+    now = int(time.time())
+    conn = monitor.get_conn(path)
+    conn.isolation_level = None  # transações explícitas (BEGIN IMMEDIATE no swap)
+    last_poll = conn.execute('SELECT MAX(last_ts) FROM channel_state').fetchone()[0]
+    if not dry_run and not force and last_poll and now - last_poll < stale_seconds:
+        raise SystemExit('o monitor parece estar rodando (channel_state atualizado há pouco); pare-o ou use --force')
+    if not channels:
+        channels = sorted({r[0] for table in sample_tables(conn, path)
+                           for r in conn.execute(f'SELECT DISTINCT channel FROM {table}')})
+    create_staging(conn)
+    conn.executemany('INSERT OR IGNORE INTO temp.rebuild_channels VALUES (?)', [(c,) for c in channels])
+
+    t0 = time.time()
+    n_sessions = 0
+    conn.execute('BEGIN')
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = ((path, c, stale_seconds, now) for c in channels)
+        for i, (channel, sessions, sketches, peaks, titles) in enumerate(pool.map(rebuild_channel, jobs, chunksize=4), 1):
+            conn.executemany('INSERT INTO temp.rebuild_sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', sessions)
+            conn.executemany('INSERT INTO temp.rebuild_titles VALUES (?, ?, ?, ?)', titles)
+            conn.executemany('INSERT INTO temp.rebuild_sketches VALUES (?, ?, ?, ?, ?)', sketches)
+            if peaks:
+                conn.execute('INSERT INTO temp.rebuild_peaks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', (channel, *peaks))
+            n_sessions += len(sessions)
+            if i % max(1, len(channels) // 20) == 0:
+                print(f'  {i}/{len(channels)} canais, {n_sessions} sessions ({time.time() - t0:.1f}s)')
+    conn.commit()
+    print(f'{len(channels)} canais, {n_sessions} sessions calculadas em {time.time() - t0:.1f}s')
+
+    if dry_run:
+        old = conn.execute('SELECT COUNT(*) FROM sessions WHERE channel IN (SELECT channel FROM temp.rebuild_channels)').fetchone()[0]
+        print(f'dry-run: {old} sessions atuais seriam substituídas por {n_sessions}')
+    else:
+        t1 = time.time()
+        swapped = swap(conn, path)
+        # ids de session e picos mudaram: o checkpoint do monitor não vale mais
+        checkpoint.discard(monitor.CHECKPOINT_PATH if path == monitor.DB_PATH else checkpoint.path_for(path))
+        print(f'troca concluída em {time.time() - t1:.1f}s ({swapped} sessions)')
+    conn.close()
+    return n_sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=monitor.DB_PATH)
+    parser.add_argument('--channels', default=None, help='lista separada por vírgula (padrão: todos os canais com amostras)')
+    parser.add_argument('--workers', type=int, default=None, help='processos do pool (padrão: nº de CPUs)')
+    parser.add_argument('--dry-run', action='store_true', help='calcula e mostra os totais sem trocar nada')
+    parser.add_argument('--force', action='store_true', help='roda mesmo com o monitor aparentemente ativo')
+    args = parser.parse_args()
+    channels = [c.strip() for c in args.channels.split(',') if c.strip()] if args.channels else None
+    run(args.db, channels, args.workers, args.dry_run, args.force)
+
+
+if __name__ == '__main__':
+    main()
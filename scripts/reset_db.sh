@@ -5,13 +5,17 @@ set -e
 CONTAINER=${1:-fds_monitor}
 BACKUP_DIR=${2:-./backups}
 mkdir -p "$BACKUP_DIR"
-TIMESTAMP=$(date +%Y%m%d%H%M%S)
 echo "Backing up /data/kick_monitor.sqlite3 and /data/fds_bot.db from $CONTAINER to $BACKUP_DIR"
-docker cp "$CONTAINER":/data/kick_monitor.sqlite3 "$BACKUP_DIR/kick_monitor.sqlite3.$TIMESTAMP" || true
-docker cp "$CONTAINER":/data/fds_bot.db "$BACKUP_DIR/fds_bot.db.$TIMESTAMP" || true
+# online backup (scripts/backup_db.py) instead of copying the live WAL files
+for DB in kick_monitor.sqlite3 fds_bot.db; do
+  docker exec "$CONTAINER" sh -c "test -f /data/$DB && python /app/scripts/backup_db.py --db /data/$DB --dest /data/reset-backup --keep 0 --verify" || true
+done
+docker cp "$CONTAINER":/data/reset-backup/. "$BACKUP_DIR/" || true
+docker exec "$CONTAINER" rm -rf /data/reset-backup
 
 echo "Removing DB files from container $CONTAINER:/data"
-docker exec -it "$CONTAINER" sh -c "rm -f /data/kick_monitor.sqlite3 /data/fds_bot.db"
+# spool, partições mensais e ring buffer também: o spool sobrevivente seria reaplicado (com ids de session antigos) no banco novo
+docker exec -it "$CONTAINER" sh -c "rm -rf /data/kick_monitor.sqlite3 /data/kick_monitor.sqlite3-wal /data/kick_monitor.sqlite3-shm /data/kick_monitor.sqlite3.checkpoint /data/kick_monitor.sqlite3.spool /data/kick_monitor.sqlite3.ring /data/kick_monitor.sqlite3.ring.*.tmp /data/kick_monitor.samples-*.sqlite3 /data/kick_monitor.samples-*.sqlite3-wal /data/kick_monitor.samples-*.sqlite3-shm /data/fds_bot.db"
 
 echo "Done. Restarting container $CONTAINER"
 docker restart "$CONTAINER"
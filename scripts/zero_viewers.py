@@ -1,21 +1,50 @@
 #!/usr/bin/env python3
 """
-Zero viewer-like columns in local SQLite DB files in the repo root.
+Limpeza de privacidade dos bancos do monitor: zera colunas de viewers e apaga
+colunas com nome de canal/usuário.
 
-Usage (PowerShell):
-    cd C:/Users/Sam/Documents/programa/fds_bot
-    py ./scripts/zero_viewers.py
+Em cada tabela com colunas `viewers`, `peak_viewers` ou `max_viewers`
+(valores > 0 viram 0) e/ou `channel`, `username`, `user`, `streamer`, `slug`,
+`display_name` (viram NULL, ou '' quando a coluna é NOT NULL), todas as
+colunas são reescritas numa única passada por rowid, em lotes de `--batch`
+linhas, cada lote numa transação curta (BEGIN IMMEDIATE) com uma pausa entre
+eles: pode rodar com o monitor ativo, que só espera um lote.
 
-This script will look for common monitor DB filenames in the current working
-directory (for example `kick_monitor.sqlite3` and `fds_bot.db`) and set any
-columns named `viewers`, `peak_viewers`, `max_viewers` (if present) to 0.
+- o progresso de cada tabela fica na tabela `scrub_state` do próprio arquivo,
+  gravado na transação do lote: interrompido, o script retoma de onde parou
+  (a tabela some quando o arquivo termina; `--restart` recomeça do zero);
+- o banco principal, as partições mensais de samples (partitions.py) e os
+  outros arquivos são processados em paralelo, um processo por arquivo;
+- `--dry-run` estima linhas alteradas (amostrando trechos da tabela) e tempo
+  (um lote de cada tabela é executado e desfeito com ROLLBACK);
+- colunas NOT NULL com índice único (ex.: `channels.name`) não podem virar
+  NULL nem '' e são puladas, com aviso;
+- `--raw-json` também apaga `raw_json` (o JSON da API tem nome, bio e ids do
+  canal; sem ele `rebuild_sessions.py` perde o livestream_id das amostras);
+- `--derived` apaga as cópias derivadas com os mesmos dados: o ring buffer do
+  dashboard (ring.py; o dashboard volta ao banco até o próximo start do
+  monitor) e o export Parquet (scripts/export_parquet.py). Backups
+  (scripts/backup_db.py) não são tocados.
 
-It prints a brief before/after count for columns it updates. It does not create
-backups (as requested). Use with caution.
+Com o monitor rodando, amostras gravadas depois da passada por uma tabela
+chegam com os valores reais.
+
+Uso:
+    python scripts/zero_viewers.py --dry-run
+    python scripts/zero_viewers.py kick_monitor.sqlite3 fds_bot.db --derived
 """
+import argparse
+import os
+import shutil
 import sqlite3
-from pathlib import Path
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import partitions  # noqa: E402
+import ring  # noqa: E402
 
 DB_CANDIDATES = [
     'kick_monitor.sqlite3',
@@ -27,100 +56,239 @@ DB_CANDIDATES = [
 COLS_TO_ZERO = ['viewers', 'peak_viewers', 'max_viewers']
 # columns that contain usernames/channel identifiers; these will be set to NULL
 USER_COLS = ['channel', 'username', 'user', 'streamer', 'slug', 'display_name']
+RAW_COLS = ['raw_json']
+BATCH_ROWS = 5000
+SAMPLE_WINDOWS = 20  # trechos lidos por tabela na estimativa do --dry-run
+STATE_TABLE = 'scrub_state'
+LOCK_TIMEOUT = 30  # segundos esperando o lock de escrita (o monitor grava entre os lotes)
 
 
-def process_db(path: Path):
-    if not path.exists():
-        print(f"[skip] {path} not found")
-        return
+def _q(name):
+    return '"' + name.replace('"', '""') + '"'
 
-    print(f"Processing {path}")
-    conn = sqlite3.connect(str(path))
-    cur = conn.cursor()
 
-    # get tables
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = [r[0] for r in cur.fetchall()]
-    if not tables:
-        print("  no tables found")
+def _unique_columns(conn, table):
+    """Colunas que sozinhas ou com outras formam um índice único (PRIMARY KEY/UNIQUE)."""
+    cols = set()
+    for r in conn.execute(f'PRAGMA index_list({_q(table)})'):
+        if r[2]:
+            cols.update(c[2] for c in conn.execute(f'PRAGMA index_info({_q(r[1])})'))
+    return cols
 
-    for t in tables:
-        # get columns for the table
-        cur.execute(f"PRAGMA table_info('{t}')")
-        cols = [r[1] for r in cur.fetchall()]
 
-        for col in COLS_TO_ZERO:
-            if col in cols:
-                try:
-                    # count how many rows would be affected
-                    cur.execute(f"SELECT COUNT(*) FROM \"{t}\" WHERE \"{col}\">0")
-                    before = cur.fetchone()[0]
-                    if before == 0:
-                        print(f"  table '{t}': column '{col}' already zero in all rows")
-                        continue
-
-                    cur.execute(f"UPDATE \"{t}\" SET \"{col}\" = 0 WHERE \"{col}\">0")
-                    conn.commit()
-                    cur.execute(f"SELECT COUNT(*) FROM \"{t}\" WHERE \"{col}\">0")
-                    after = cur.fetchone()[0]
-                    print(f"  table '{t}': column '{col}' before={before} after={after}")
-                except Exception as e:
-                    print(f"  failed to update {t}.{col}: {e}")
-
-        # nullify username-like columns
-        for ucol in USER_COLS:
-            if ucol in cols:
+def plan_table(conn, table, clear_cols):
+    """(SET, WHERE, avisos) da passada única pela tabela, ou None se ela não tem colunas a limpar."""
+    info = conn.execute(f'PRAGMA table_info({_q(table)})').fetchall()
+    notnull = {r[1] for r in info if r[3]}
+    unique = _unique_columns(conn, table)
+    sets, preds, warnings = [], [], []
+    for name in (r[1] for r in info):
+        col = _q(name)
+        if name in COLS_TO_ZERO:
+            sets.append(f'{col} = CASE WHEN {col} > 0 THEN 0 ELSE {col} END')
+            preds.append(f'{col} > 0')
+        elif name in clear_cols:
+            if name in notnull and name in unique:
+                warnings.append(f"coluna '{name}' é NOT NULL e única: não dá para apagar sem colidir")
+                continue
+            pred = f"{col} IS NOT NULL AND TRIM({col}) <> ''"
+            blank = "''" if name in notnull else 'NULL'
+            sets.append(f'{col} = CASE WHEN {pred} THEN {blank} ELSE {col} END')
+            preds.append(f'({pred})')
+    if not sets:
+        return None, warnings
+    return (', '.join(sets), ' OR '.join(preds)), warnings
+
+
+def tables(conn):
+    """Tabelas comuns com rowid (virtuais, WITHOUT ROWID e internas ficam de fora)."""
+    result = []
+    for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' ORDER BY name"):
+        if name.startswith('sqlite_') or name == STATE_TABLE or (sql or '').upper().startswith('CREATE VIRTUAL'):
+            continue
+        try:
+            conn.execute(f'SELECT rowid FROM {_q(name)} LIMIT 0')
+        except sqlite3.OperationalError:
+            continue
+        result.append(name)
+    return result
+
+
+def _batch_end(conn, table, last, batch):
+    """rowid da `batch`-ésima linha depois de `last` (ou o último rowid), None se não há mais linhas."""
+    r = conn.execute(f'SELECT rowid FROM {_q(table)} WHERE rowid > ? ORDER BY rowid LIMIT 1 OFFSET ?',
+                     (last, batch - 1)).fetchone()
+    if r:
+        return r[0]
+    return conn.execute(f'SELECT MAX(rowid) FROM {_q(table)} WHERE rowid > ?', (last,)).fetchone()[0]
+
+
+def _load_state(conn, restart, dry_run):
+    if dry_run:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (STATE_TABLE,)).fetchone()
+        if restart or not exists:
+            return {}
+        return {tbl: (spec, last) for tbl, spec, last in conn.execute(f'SELECT tbl, spec, last_rowid FROM {STATE_TABLE}')}
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {STATE_TABLE} (tbl TEXT PRIMARY KEY, spec TEXT NOT NULL, last_rowid INTEGER NOT NULL)')
+    if restart:
+        conn.execute(f'DELETE FROM {STATE_TABLE}')
+    return {tbl: (spec, last) for tbl, spec, last in conn.execute(f'SELECT tbl, spec, last_rowid FROM {STATE_TABLE}')}
+
+
+def estimate_table(conn, table, set_sql, where_sql, start, batch):
+    """(linhas a percorrer, linhas que mudariam (estimativa), segundos por lote) a partir de `start`."""
+    total = conn.execute(f'SELECT COUNT(*) FROM {_q(table)} WHERE rowid > ?', (start,)).fetchone()[0]
+    if not total:
+        return 0, 0, 0.0
+    lo, hi = conn.execute(f'SELECT MIN(rowid), MAX(rowid) FROM {_q(table)} WHERE rowid > ?', (start,)).fetchone()
+    window = max(1, min(batch, total // SAMPLE_WINDOWS))
+    seen = matched = 0
+    for i in range(SAMPLE_WINDOWS):
+        at = lo + (hi - lo) * i // SAMPLE_WINDOWS
+        n, m = conn.execute(
+            f'SELECT COUNT(*), COALESCE(SUM({where_sql}), 0) FROM '
+            f'(SELECT * FROM {_q(table)} WHERE rowid >= ? ORDER BY rowid LIMIT ?)', (at, window)).fetchone()
+        seen += n
+        matched += m
+    # custo real de um lote: executado e desfeito
+    end = _batch_end(conn, table, start, batch)
+    conn.execute('BEGIN IMMEDIATE')
+    t0 = time.perf_counter()
+    try:
+        conn.execute(f'UPDATE {_q(table)} SET {set_sql} WHERE rowid > ? AND rowid <= ? AND ({where_sql})', (start, end))
+        elapsed = time.perf_counter() - t0
+    finally:
+        conn.execute('ROLLBACK')
+    return total, round(total * matched / seen) if seen else 0, elapsed
+
+
+def scrub_file(job):
+    """Passada por todas as tabelas de um arquivo; devolve (arquivo, {tabela: (linhas alteradas, avisos)})."""
+    path, batch, sleep, dry_run, clear_cols, restart = job
+    label = os.path.basename(path)
+    conn = sqlite3.connect(path, timeout=LOCK_TIMEOUT, isolation_level=None)
+    summary = {}
+    try:
+        state = _load_state(conn, restart, dry_run)
+        for table in tables(conn):
+            spec, warnings = plan_table(conn, table, clear_cols)
+            for w in warnings:
+                print(f'  [{label}] {table}: {w}', flush=True)
+            if spec is None:
+                continue
+            set_sql, where_sql = spec
+            key = f'{set_sql} WHERE {where_sql}'
+            saved = state.get(table)
+            # mesmas colunas da execução interrompida: retoma; senão a tabela recomeça
+            last = saved[1] if saved and saved[0] == key else 0
+            if dry_run:
+                total, changed, per_batch = estimate_table(conn, table, set_sql, where_sql, last, batch)
+                batches = -(-total // batch)
+                print(f'  [{label}] {table}: {total} linhas em {batches} lotes, ~{changed} alteradas, '
+                      f'~{batches * (per_batch + sleep):.0f}s', flush=True)
+                summary[table] = (changed, warnings)
+                continue
+            if last:
+                print(f'  [{label}] {table}: retomando depois do rowid {last}', flush=True)
+            changed = 0
+            t0 = time.time()
+            while True:
+                end = _batch_end(conn, table, last, batch)
+                if end is None:
+                    break
+                conn.execute('BEGIN IMMEDIATE')
                 try:
-                    cur.execute(f"SELECT COUNT(*) FROM \"{t}\" WHERE \"{ucol}\" IS NOT NULL AND TRIM(\"{ucol}\")<>''")
-                    beforeu = cur.fetchone()[0]
-                    if beforeu == 0:
-                        print(f"  table '{t}': column '{ucol}' already empty/null in all rows")
-                        continue
-
-                    # try to set to NULL first
-                    try:
-                        cur.execute(f"UPDATE \"{t}\" SET \"{ucol}\" = NULL WHERE \"{ucol}\" IS NOT NULL AND TRIM(\"{ucol}\")<>''")
-                        conn.commit()
-                    except Exception as e:
-                        # if NOT NULL constraint prevents NULL, fall back to empty string
-                        msg = str(e)
-                        if 'NOT NULL constraint' in msg or 'NOT NULL' in msg:
-                            try:
-                                cur.execute(f"UPDATE \"{t}\" SET \"{ucol}\" = '' WHERE \"{ucol}\" IS NOT NULL AND TRIM(\"{ucol}\")<>''")
-                                conn.commit()
-                                print(f"  table '{t}': column '{ucol}' could not be NULLed due to NOT NULL constraint; set to empty string instead")
-                            except Exception as e2:
-                                print(f"  failed to clear {t}.{ucol} (empty-string fallback): {e2}")
-                        else:
-                            print(f"  failed to nullify {t}.{ucol}: {e}")
-
-                    cur.execute(f"SELECT COUNT(*) FROM \"{t}\" WHERE \"{ucol}\" IS NOT NULL AND TRIM(\"{ucol}\")<>''")
-                    afteru = cur.fetchone()[0]
-                    print(f"  table '{t}': column '{ucol}' before={beforeu} after={afteru}")
-                except Exception as e:
-                    print(f"  failed to nullify {t}.{ucol}: {e}")
-
-    conn.close()
+                    cur = conn.execute(
+                        f'UPDATE {_q(table)} SET {set_sql} WHERE rowid > ? AND rowid <= ? AND ({where_sql})', (last, end))
+                    conn.execute(f'INSERT OR REPLACE INTO {STATE_TABLE} (tbl, spec, last_rowid) VALUES (?, ?, ?)',
+                                 (table, key, end))
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                conn.execute('COMMIT')
+                changed += cur.rowcount
+                last = end
+                if sleep:
+                    time.sleep(sleep)  # deixa o monitor pegar o lock entre lotes
+            print(f'  [{label}] {table}: {changed} linhas alteradas ({time.time() - t0:.1f}s)', flush=True)
+            summary[table] = (changed, warnings)
+        if not dry_run:
+            conn.execute(f'DROP TABLE {STATE_TABLE}')
+    finally:
+        conn.close()
+    return path, summary
+
+
+def files_for(paths):
+    """Cada banco seguido das partições mensais de samples dele."""
+    files = []
+    for p in paths:
+        files.append(p)
+        files += [partitions.path_for(p, m) for m in partitions.months(p)]
+    return files
+
+
+def derived_paths(paths, parquet_dir):
+    """Cópias derivadas dos dados que existem em disco: ring buffers e o export Parquet."""
+    found = [ring.path_for(p) for p in paths if os.path.exists(ring.path_for(p))]
+    if parquet_dir and os.path.isdir(parquet_dir):
+        found.append(parquet_dir)
+    return found
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dbs', nargs='*', help=f'bancos a limpar (padrão: {", ".join(DB_CANDIDATES)} no diretório atual)')
+    parser.add_argument('--batch', type=int, default=BATCH_ROWS, help='linhas por lote/transação')
+    parser.add_argument('--sleep', type=float, default=0.05, help='pausa entre lotes em segundos')
+    parser.add_argument('--workers', type=int, default=None, help='arquivos em paralelo (padrão: nº de CPUs)')
+    parser.add_argument('--dry-run', action='store_true', help='só estima linhas alteradas e tempo')
+    parser.add_argument('--restart', action='store_true', help='ignora o progresso de uma execução interrompida')
+    parser.add_argument('--raw-json', action='store_true', help='apaga também raw_json')
+    parser.add_argument('--derived', action='store_true', help='apaga o ring buffer e o export Parquet')
+    parser.add_argument('--parquet-dir', default=None,
+                        help='export Parquet (padrão: MONITOR_PARQUET_DIR ou parquet/ ao lado do primeiro banco)')
+    args = parser.parse_args()
+
     cwd = Path.cwd()
-    print(f"Running in: {cwd}")
+    paths = args.dbs or [str(cwd / name) for name in DB_CANDIDATES if (cwd / name).exists()]
+    missing = [p for p in paths if not os.path.exists(p)]
+    for p in missing:
+        print(f'[skip] {p} não existe')
+    paths = [os.path.abspath(p) for p in paths if p not in missing]
+    if not paths:
+        print(f'nenhum banco encontrado em {cwd}')
+        return
 
-    any_found = False
-    for name in DB_CANDIDATES:
-        p = cwd / name
-        if p.exists():
-            any_found = True
-        process_db(p)
+    files = files_for(paths)
+    clear_cols = USER_COLS + (RAW_COLS if args.raw_json else [])
+    workers = min(len(files), args.workers or os.cpu_count() or 1)
+    print(f'{"estimando" if args.dry_run else "limpando"} {len(files)} arquivo(s) com {workers} processo(s)', flush=True)
+    t0 = time.time()
+    jobs = [(f, args.batch, args.sleep, args.dry_run, clear_cols, args.restart) for f in files]
+    total = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path, summary in pool.map(scrub_file, jobs):
+            total += sum(changed for changed, _ in summary.values())
+    verb = '~{} linhas seriam alteradas' if args.dry_run else '{} linhas alteradas'
+    print(f'{verb.format(total)} em {time.time() - t0:.1f}s')
 
-    if not any_found:
-        print("No candidate DB files found in the current directory. Exiting.")
+    parquet_dir = args.parquet_dir or os.environ.get('MONITOR_PARQUET_DIR') or os.path.join(os.path.dirname(paths[0]), 'parquet')
+    derived = derived_paths(paths, parquet_dir)
+    if derived and args.derived and not args.dry_run:
+        for p in derived:
+            if os.path.isdir(p):
+                shutil.rmtree(p)
+            else:
+                os.remove(p)
+            print(f'apagado: {p}')
+    elif derived:
+        print('cópias derivadas ainda com os dados originais (use --derived para apagá-las): ' + ', '.join(derived))
 
 
 if __name__ == '__main__':
     try:
         main()
     except KeyboardInterrupt:
-        print('\nInterrupted')
+        print('\nInterrompido; rode de novo para retomar')
         sys.exit(1)
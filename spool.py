@@ -0,0 +1,149 @@
+"""
+Spool local e durável de registros, para a ingestão não depender de locks do SQLite.
+
+Os workers anexam registros (dicts JSON) a segmentos append-only num
+diretório; um drainer os carrega no banco quando consegue o lock. Formato de
+cada registro: cabeçalho '<II' (tamanho do payload, crc32) seguido do payload
+JSON em UTF-8. Segmentos se chamam `<número>.spool` e viram o próximo ao passar
+de SPOOL_SEGMENT_BYTES.
+
+- `append` só faz um write(2) sob lock (não espera disco nem banco); uma thread
+  faz fsync no máximo a cada SPOOL_FSYNC_MS, em lote. Um crash do processo não
+  perde nada já anexado; uma queda de energia perde no máximo essa janela.
+- Posições são (segmento, offset). `read` devolve registros a partir de uma
+  posição e a posição seguinte; quem consome grava essa posição (no caso do
+  monitor, na mesma transação dos dados) e chama `truncate` para apagar os
+  segmentos já consumidos.
+- Cada abertura escreve num segmento novo, então um registro incompleto no
+  fim de um segmento antigo (crash no meio do write) é só ignorado.
+"""
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+
+SEGMENT_BYTES = int(os.environ.get('SPOOL_SEGMENT_BYTES', str(8 * 1024 * 1024)))
+FSYNC_INTERVAL = float(os.environ.get('SPOOL_FSYNC_MS', '200')) / 1000.0
+_HEADER = struct.Struct('<II')
+_SUFFIX = '.spool'
+
+
+class Spool:
+    def __init__(self, directory, min_segment=0, segment_bytes=SEGMENT_BYTES, fsync_interval=FSYNC_INTERVAL):
+        """`min_segment`: número mínimo do segmento de escrita (a posição já consumida,
+        para um diretório recriado não voltar para trás do que o consumidor gravou)."""
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        existing = self.segments()
+        self.segment = max([min_segment] + [s + 1 for s in existing])
+        self.fd = None
+        self.size = 0
+        self.dirty = False
+        self.appended = 0
+        self._open_segment()
+        self._syncer = threading.Thread(target=self._sync_loop, name='spool-fsync', daemon=True)
+        self._syncer.start()
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f'{segment:012d}{_SUFFIX}')
+
+    def _open_segment(self):
+        self.fd = os.open(self._path(self.segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.size = 0
+
+    def segments(self):
+        return sorted(int(name[:-len(_SUFFIX)]) for name in os.listdir(self.directory) if name.endswith(_SUFFIX))
+
+    def append(self, record):
+        payload = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        frame = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self.lock:
+            if self.fd is None:
+                raise ValueError('spool fechado')
+            os.write(self.fd, frame)
+            self.size += len(frame)
+            self.dirty = True
+            self.appended += 1
+            if self.size >= self.segment_bytes:
+                os.fsync(self.fd)
+                os.close(self.fd)
+                self.dirty = False
+                self.segment += 1
+                self._open_segment()
+
+    def sync(self):
+        with self.lock:
+            if self.fd is not None and self.dirty:
+                os.fsync(self.fd)
+                self.dirty = False
+
+    def _sync_loop(self):
+        while not self.closed.wait(self.fsync_interval):
+            try:
+                self.sync()
+            except OSError:
+                logging.exception("Spool: fsync falhou em %s", self.directory)
+
+    def read(self, position, max_records=1000):
+        """Até `max_records` registros a partir de `position`; devolve (registros, próxima posição)."""
+        segment, offset = position
+        with self.lock:
+            active = self.segment
+        records = []
+        for seg in self.segments():
+            if seg < segment:
+                continue
+            if seg > segment:
+                segment, offset = seg, 0
+            torn = False
+            try:
+                with open(self._path(seg), 'rb') as f:
+                    f.seek(offset)
+                    while len(records) < max_records:
+                        header = f.read(_HEADER.size)
+                        if len(header) < _HEADER.size:
+                            torn = bool(header)
+                            break
+                        length, crc = _HEADER.unpack(header)
+                        payload = f.read(length)
+                        if len(payload) < length:
+                            torn = True
+                            break
+                        offset += _HEADER.size + length
+                        if zlib.crc32(payload) != crc:
+                            logging.warning("Spool: registro corrompido no segmento %s; descartado", seg)
+                            continue
+                        records.append(json.loads(payload))
+            except FileNotFoundError:
+                continue
+            if len(records) >= max_records or seg >= active:
+                break
+            if torn:
+                logging.warning("Spool: registro incompleto no fim do segmento %s ignorado", seg)
+        return records, (segment, offset)
+
+    def truncate(self, segment):
+        """Apaga os segmentos anteriores a `segment` (já consumidos)."""
+        with self.lock:
+            active = self.segment
+        for seg in self.segments():
+            if seg < min(segment, active):
+                try:
+                    os.remove(self._path(seg))
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        self.closed.set()
+        self._syncer.join(timeout=2)
+        with self.lock:
+            if self.fd is not None:
+                os.fsync(self.fd)
+                os.close(self.fd)
+                self.fd = None
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+
+# monitor.py lê o caminho do banco no import (defaults de get_conn & cia.): um banco descartável por sessão de testes
+os.environ.setdefault('MONITOR_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='kick-monitor-tests-'), 'test.sqlite3'))
@@ -0,0 +1,69 @@
+"""Prazo e hedge do fetch (hedge.py)."""
+import threading
+import time
+
+import pytest
+
+import hedge
+
+
+def test_without_hedge_runs_inline():
+    h = hedge.Hedger(deadline=1, hedge=False)
+    callers = []
+    assert h.call(lambda deadline: callers.append(threading.current_thread()) or 'ok') == 'ok'
+    assert callers == [threading.current_thread()]
+    assert h._executor is None
+
+
+def test_without_hedge_late_failure_is_deadline():
+    h = hedge.Hedger(deadline=0.05, hedge=False)
+
+    def slow(deadline):
+        time.sleep(0.1)
+        raise TimeoutError('timed out')
+
+    with pytest.raises(hedge.DeadlineExceeded):
+        h.call(slow)
+    assert h.stats()['deadline_exceeded'] == 1
+    with pytest.raises(ValueError):
+        h.call(lambda deadline: int('x'))
+
+
+def test_hedge_wins_and_pool_is_bounded(monkeypatch):
+    h = hedge.Hedger(deadline=2, hedge=True, min_delay=0.01, threads=2)
+    monkeypatch.setattr(h, 'hedge_delay', lambda: 0.05)
+    calls = []
+
+    def fetch(deadline):
+        calls.append(time.monotonic())
+        if len(calls) % 2:
+            time.sleep(0.5)  # primeira tentativa lenta: o hedge responde antes
+            return 'slow'
+        return 'fast'
+
+    t0 = time.monotonic()
+    assert h.call(fetch) == 'fast'
+    assert time.monotonic() - t0 < 0.4
+    assert h.stats()['hedge_wins'] == 1
+    assert h._executor._max_workers == 2
+
+
+def test_queued_attempt_past_deadline_is_not_started():
+    h = hedge.Hedger(deadline=0.1, hedge=True, threads=1)
+    release = threading.Event()
+    started = []
+
+    def fetch(deadline):
+        started.append(deadline)
+        release.wait(1)
+        return 'ok'
+
+    # a única thread do pool fica ocupada além do prazo das duas chamadas
+    blocker = threading.Thread(target=lambda: pytest.raises(hedge.DeadlineExceeded, h.call, fetch))
+    blocker.start()
+    with pytest.raises(hedge.DeadlineExceeded):
+        h.call(fetch)
+    release.set()
+    blocker.join(2)
+    time.sleep(0.05)
+    assert len(started) == 1
@@ -0,0 +1,31 @@
+"""Ids das partições mensais de samples (partitions.py)."""
+import sqlite3
+
+import partitions
+
+
+def insert(db_path, ts, n=1):
+    conn = sqlite3.connect(partitions.path_for(db_path, partitions.month_of(ts)))
+    try:
+        ids = [conn.execute("INSERT INTO samples (channel, ts, viewers, is_live) VALUES ('xqc', ?, 1, 1)", (ts,)).lastrowid
+               for _ in range(n)]
+        conn.commit()
+        return ids
+    finally:
+        conn.close()
+
+
+def test_late_samples_do_not_collide_with_next_month(tmp_path):
+    db_path = str(tmp_path / 'monitor.sqlite3')
+    sqlite3.connect(db_path).executescript(partitions.SCHEMA)
+    june, july = partitions.month_range('2024-06')
+    partitions.create(db_path, '2024-06')
+    before = insert(db_path, june, 3)
+    # virada do mês: julho é criado e amostras atrasadas de junho continuam chegando
+    partitions.create(db_path, '2024-07')
+    new = insert(db_path, july, 3)
+    late = insert(db_path, july - 1, 3)
+    ids = before + new + late
+    assert len(set(ids)) == len(ids)
+    assert all(partitions.id_base('2024-06') < i < partitions.id_base('2024-07') for i in before + late)
+    assert all(partitions.id_base('2024-07') < i < partitions.id_base('2024-08') for i in new)
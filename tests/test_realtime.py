@@ -0,0 +1,217 @@
+"""RealtimeHub/_Socket e o worker em modo realtime contra o stand-in local do Pusher (bench/fake_pusher.py)."""
+import socket
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import fake_pusher
+import monitor
+import realtime
+
+LIVE = realtime.LIVE_EVENTS[0]
+STOP = realtime.STOP_EVENTS[0]
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def subscribers(pusher, name):
+    with pusher.lock:
+        return set(pusher.subscribers.get(name, ()))
+
+
+def drop_connections(pusher):
+    """Derruba as conexões abertas do lado do servidor (o cliente vê EOF)."""
+    with pusher.lock:
+        handlers = {h for subs in pusher.subscribers.values() for h in subs}
+    for h in handlers:
+        try:
+            h.request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def pusher():
+    fake = fake_pusher.FakePusher()
+    server, url = fake_pusher.start_server(fake)
+    yield fake, server, url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def hub(pusher):
+    h = realtime.RealtimeHub(pusher[2])
+    yield h
+    h.stop()
+
+
+@pytest.fixture(scope='module')
+def db():
+    monitor.init_db()
+    return monitor.DB_PATH
+
+
+def covered_hub(hub, slug='xqc', channel_id=42):
+    hub.observe_poll(slug, {'id': channel_id, 'livestream': None})
+    assert wait_until(lambda: hub.is_covered(slug))
+    return f'channel.{channel_id}'
+
+
+def test_subscribe_after_first_poll(pusher, hub):
+    fake, _, _ = pusher
+    assert not hub.is_covered('xqc')
+    hub.observe_poll('xqc', {'livestream': None})  # sem id numérico: continua só no polling
+    assert hub.subscriptions == {}
+    name = covered_hub(hub)
+    assert len(subscribers(fake, name)) == 1
+    hub.unregister('xqc')
+    assert not hub.is_covered('xqc')
+    assert wait_until(lambda: not subscribers(fake, name))
+
+
+def test_live_and_stop_events(pusher, hub):
+    fake, _, _ = pusher
+    name = covered_hub(hub)
+    never = threading.Event()
+    fake.publish(name, LIVE, {'livestream': {'id': 7, 'session_title': 'GTA RP', 'viewer_count': 120}})
+    viewers, is_live, raw = hub.wait('xqc', never, 5)
+    assert (viewers, is_live) == (120, 1)
+    assert raw['livestream']['id'] == 7 and raw['realtime_event'] == LIVE
+    fake.publish(name, STOP, {})
+    assert hub.wait('xqc', never, 5)[:2] == (-1, 0)
+    assert hub.wait('xqc', never, 0.2) is None
+    assert hub.events_received == 2
+
+
+def test_viewer_updates_are_throttled(pusher, hub, monkeypatch):
+    fake, _, _ = pusher
+    name = covered_hub(hub)
+    never = threading.Event()
+    fake.publish(name, LIVE, {'livestream': {'id': 7, 'viewer_count': 10}})
+    assert hub.wait('xqc', never, 5)[0] == 10
+    fake.publish(name, 'App\\Events\\LivestreamUpdated', {'viewers': 11})
+    assert wait_until(lambda: hub.events_received == 2)
+    assert hub.wait('xqc', never, 0.2) is None  # dentro de MIN_SAMPLE_SECONDS do evento anterior
+    monkeypatch.setattr(realtime, 'MIN_SAMPLE_SECONDS', 0)
+    fake.publish(name, 'App\\Events\\LivestreamUpdated', {'viewers': 12})
+    viewers, is_live, raw = hub.wait('xqc', never, 5)
+    assert (viewers, is_live, raw['livestream']['id']) == (12, 1, 7)
+
+
+def test_reconnect_resubscribes(pusher, hub):
+    fake, _, _ = pusher
+    name = covered_hub(hub)
+    first = subscribers(fake, name)
+    drop_connections(fake)
+    assert wait_until(lambda: not hub.is_covered('xqc'))
+    # backoff de 1s e reinscrição de tudo na conexão nova
+    assert wait_until(lambda: hub.is_covered('xqc') and subscribers(fake, name) - first)
+    fake.publish(name, LIVE, {'livestream': {'id': 8, 'viewer_count': 5}})
+    assert hub.wait('xqc', threading.Event(), 5)[:2] == (5, 1)
+
+
+def test_wait_ends_at_fallback_when_socket_drops(pusher, hub):
+    fake, server, _ = pusher
+    covered_hub(hub)
+    server.shutdown()
+    server.server_close()
+    drop_connections(fake)
+    t0 = time.monotonic()
+    assert hub.wait('xqc', threading.Event(), 30, fallback=0.5) is None
+    assert time.monotonic() - t0 < 3
+
+
+class FakeChannel:
+    """fetch_channel de um canal só, com o estado trocado pelo teste."""
+
+    def __init__(self, channel_id=42):
+        self.channel_id = channel_id
+        self.livestream = None
+        self.calls = []
+
+    def __call__(self, channel, trace=None):
+        self.calls.append(time.monotonic())
+        ls = dict(self.livestream) if self.livestream else None
+        return (ls['viewer_count'] if ls else -1), (1 if ls else 0), {'id': self.channel_id, 'livestream': ls}
+
+    def polls_since(self, t):
+        return sum(1 for c in self.calls if c >= t)
+
+
+@pytest.fixture
+def worker(db, hub, monkeypatch):
+    monkeypatch.setattr(monitor, 'POLL_INTERVAL', 0.3)
+    monkeypatch.setattr(realtime, 'RECONCILE_INTERVAL', 60)
+    fetch = FakeChannel()
+    monkeypatch.setattr(monitor, 'fetch_channel', fetch)
+    started = []
+
+    def start(channel, livestream=None):
+        fetch.livestream = livestream
+        stop = threading.Event()
+        t = threading.Thread(target=monitor.worker_main_loop, args=(channel, stop, hub), daemon=True)
+        t.start()
+        started.append((stop, t))
+        assert wait_until(lambda: hub.is_covered(channel))
+        return fetch
+
+    yield start
+    for stop, t in started:
+        stop.set()
+        t.join(5)
+
+
+def open_session(db, channel):
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute("SELECT livestream_id FROM sessions WHERE channel = ? AND end_ts IS NULL",
+                            (channel,)).fetchone()
+    finally:
+        conn.close()
+
+
+def test_worker_reconciles_despite_frequent_events(pusher, hub, worker, monkeypatch):
+    monkeypatch.setattr(realtime, 'RECONCILE_INTERVAL', 1.0)
+    monkeypatch.setattr(realtime, 'MIN_SAMPLE_SECONDS', 0)
+    fake = pusher[0]
+    fetch = worker('rt_frequent', {'id': 7, 'session_title': 'GTA', 'viewer_count': 100})
+    t0 = time.monotonic()
+    while time.monotonic() - t0 < 3.5:
+        fake.publish('channel.42', 'App\\Events\\LivestreamUpdated', {'viewers': 100})
+        time.sleep(0.1)
+    # um evento a cada 100ms não pode adiar o poll REST de reconciliação (a cada 1s)
+    assert fetch.polls_since(t0) >= 2
+
+
+def test_worker_polls_when_live_event_has_no_livestream_id(db, pusher, worker):
+    fetch = worker('rt_noid')
+    assert open_session(db, 'rt_noid') is None
+    fetch.livestream = {'id': 9, 'session_title': 'Just Chatting', 'viewer_count': 50}
+    t0 = time.monotonic()
+    pusher[0].publish('channel.42', LIVE, {'livestream': {'session_title': 'Just Chatting'}})
+    assert wait_until(lambda: open_session(db, 'rt_noid') is not None, timeout=3)
+    assert open_session(db, 'rt_noid') == ('9',)
+    assert fetch.polls_since(t0) == 1
+
+
+def test_worker_falls_back_to_polling(pusher, worker):
+    fake, server, _ = pusher
+    fetch = worker('rt_fallback')
+    time.sleep(0.5)
+    assert fetch.polls_since(time.monotonic() - 0.5) == 0  # coberto: só reconcilia a cada 60s
+    server.shutdown()
+    server.server_close()
+    drop_connections(fake)
+    t0 = time.monotonic()
+    time.sleep(1.5)
+    assert fetch.polls_since(t0) >= 2
@@ -0,0 +1,89 @@
+"""Remoção de canal com o spool ligado: nada do canal pode voltar ao banco quando o spool é drenado."""
+import itertools
+import sqlite3
+import time
+
+import pytest
+
+import monitor
+import spool
+
+
+@pytest.fixture(scope='module')
+def db():
+    monitor.init_db()
+    return monitor.DB_PATH
+
+
+@pytest.fixture
+def sample_spool(db, tmp_path):
+    # como Supervisor.start: o spool novo começa depois da posição já consumida no banco
+    conn = monitor.get_conn(db)
+    sp = spool.Spool(str(tmp_path / 'spool'), min_segment=monitor.spool_position(conn)[0] + 1)
+    conn.close()
+    yield sp
+    sp.close()
+
+
+def channel_rows(db, channel):
+    conn = sqlite3.connect(db)
+    try:
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table} WHERE channel = ?", (channel,)).fetchone()[0]
+                for table in ('channel_state', 'channel_health', 'capture_jobs')}
+    finally:
+        conn.close()
+
+
+def test_forget_is_applied_after_pending_records(db, sample_spool):
+    monitor.spool_sample(sample_spool, 'gone', 123, 50, 1, '{}')
+    monitor.delete_channel_state('gone', spool=sample_spool)
+    monitor.drain_spool(sample_spool)
+    assert channel_rows(db, 'gone') == {'channel_state': 0, 'channel_health': 0, 'capture_jobs': 0}
+
+
+def test_forget_keeps_records_appended_after_it(db, sample_spool):
+    monitor.delete_channel_state('back', spool=sample_spool)
+    monitor.spool_sample(sample_spool, 'back', 123, 50, 1, '{}')
+    monitor.drain_spool(sample_spool)
+    assert channel_rows(db, 'back')['channel_state'] == 1
+
+
+class LiveChannel:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, channel, trace=None):
+        self.calls += 1
+        ls = {'id': 77, 'session_title': 'GTA RP', 'viewer_count': 5000}
+        return 5000, 1, {'id': 1, 'livestream': ls}
+
+
+def test_removed_channel_leaves_no_rows_in_spool_mode(db, sample_spool, monkeypatch):
+    monkeypatch.setattr(monitor, 'POLL_INTERVAL', 0.05)
+    fetch = LiveChannel()
+    monkeypatch.setattr(monitor, 'fetch_channel', fetch)
+    conn = monitor.get_conn()
+    sup = monitor.Supervisor(['removed'])
+    sup.spool = sample_spool
+    sup.session_ids = itertools.count(monitor.next_session_id(conn, sample_spool))
+    conn.close()
+    with sup._lock:
+        sup._start_worker('removed')
+    t = sup.threads['removed']
+    deadline = time.monotonic() + 5
+    while fetch.calls < 3 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert fetch.calls >= 3
+    sup._stop_workers(['removed'])
+    t.join(5)
+    assert not t.is_alive()
+    # o worker sai com a session fechada e o 'forget' no spool; o canal sai de _stopping só depois
+    assert 'removed' not in sup._stopping
+    monitor.drain_spool(sample_spool)
+    assert channel_rows(db, 'removed') == {'channel_state': 0, 'channel_health': 0, 'capture_jobs': 0}
+    conn = sqlite3.connect(db)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM sessions WHERE channel = 'removed' AND end_ts IS NULL").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM samples WHERE channel = 'removed'").fetchone()[0] >= 3
+    finally:
+        conn.close()
@@ -55,6 +55,34 @@ monitorDb.serialize(() => {
   monitorDb.run(`CREATE TABLE IF NOT EXISTS peaks (channel TEXT PRIMARY KEY, peak_overall INTEGER, peak_overall_ts INTEGER, peak_daily INTEGER, peak_daily_date TEXT, peak_weekly INTEGER, peak_week_start TEXT, peak_monthly INTEGER, peak_month TEXT)`);
 });
 
+// monthly sample partitions written by the monitor (partitions.py): the current and previous month are
+// attached behind a temp view named `samples`, so the queries below see them; refreshed to pick up rollovers
+const PARTITION_REFRESH_MS = 10 * 60 * 1000;
+const PARTITION_BASE = path.join(path.dirname(MONITOR_DB_PATH), path.parse(MONITOR_DB_PATH).name);
+let attachedPartitions = [];
+function partitionSchema(month) { return 'samples_' + month.replace('-', '_'); }
+function refreshSamplePartitions() {
+  const now = new Date();
+  const prev = new Date(Date.UTC(now.getUTCFullYear(), now.getUTCMonth() - 1, 1));
+  const wanted = [prev, now].map(d => d.toISOString().slice(0, 7))
+    .filter(m => fs.existsSync(`${PARTITION_BASE}.samples-${m}.sqlite3`));
+  if (wanted.join() === attachedPartitions.join()) return;
+  const logErr = (err) => { if (err) console.error('[partitions]', err.message); };
+  monitorDb.serialize(() => {
+    for (const m of attachedPartitions) if (!wanted.includes(m)) monitorDb.run(`DETACH DATABASE ${partitionSchema(m)}`, logErr);
+    for (const m of wanted) if (!attachedPartitions.includes(m)) monitorDb.run(`ATTACH DATABASE ? AS ${partitionSchema(m)}`, [`${PARTITION_BASE}.samples-${m}.sqlite3`], logErr);
+    monitorDb.run('DROP VIEW IF EXISTS temp.samples', logErr);
+    if (wanted.length) {
+      const cols = 'id, channel, ts, viewers, is_live, raw_json, session_id';
+      const parts = [`SELECT ${cols} FROM main.samples`].concat(wanted.map(m => `SELECT ${cols} FROM ${partitionSchema(m)}.samples`));
+      monitorDb.run(`CREATE TEMP VIEW samples AS ${parts.join(' UNION ALL ')}`, logErr);
+    }
+  });
+  attachedPartitions = wanted;
+}
+refreshSamplePartitions();
+setInterval(refreshSamplePartitions, PARTITION_REFRESH_MS);
+
 app.get('/api/channels', async (req, res) => {
   try {
     const rows = await allAsync(db, 'SELECT id, name FROM channels ORDER BY name');
@@ -169,9 +197,18 @@ app.get('/api/peaks', async (req, res) => {
   } catch (err) { res.status(500).json({ error: err.message }); }
 });
 
-// live summary: latest sample per channel where is_live=1
+// live summary: channels currently live, from the channel_state table kept by the monitor
+const LIVE_STALE_SECONDS = 600;
 app.get('/api/live-summary', async (req, res) => {
   try {
+    const cutoff = Math.floor(Date.now()/1000) - LIVE_STALE_SECONDS;
+    try {
+      const rows = await allAsync(monitorDb, 'SELECT channel, viewers, last_ts AS ts, session_id, title FROM channel_state WHERE is_live = 1 AND last_ts >= ? ORDER BY viewers DESC', [cutoff]);
+      return res.json(rows);
+    } catch (err) {
+      if (DEBUG) console.log('[api/live-summary] channel_state unavailable, falling back to samples scan:', err.message);
+    }
+    // fallback for monitor DBs without channel_state: latest sample per channel where is_live=1
     const sql = `
       SELECT s.channel, s.viewers, s.ts
       FROM samples s
@@ -186,6 +223,25 @@ app.get('/api/live-summary', async (req, res) => {
   } catch (err) { res.status(500).json({ error: err.message }); }
 });
 
+// channel health from the monitor's circuit breaker (channel_health); channels without a row never failed
+app.get('/api/health', async (req, res) => {
+  const counts = { ok: 0, failing: 0, open: 0 };
+  try {
+    let total, rows, channels;
+    try {
+      total = await allAsync(monitorDb, 'SELECT COUNT(*) AS n FROM (SELECT channel FROM channel_state UNION SELECT channel FROM channel_health)', []);
+      rows = await allAsync(monitorDb, "SELECT state, COUNT(*) AS n FROM channel_health WHERE state != 'ok' GROUP BY state", []);
+      channels = await allAsync(monitorDb, "SELECT channel, state, kind, status, error, failures, opened_ts, backoff_seconds, next_probe_ts, last_failure_ts, last_success_ts, updated_ts FROM channel_health WHERE state != 'ok' ORDER BY state = 'open' DESC, failures DESC, channel LIMIT 100", []);
+    } catch (err) {
+      if (DEBUG) console.log('[api/health] channel_health unavailable:', err.message);
+      return res.json({ counts, channels: [] });
+    }
+    for (const r of rows) counts[r.state] = r.n;
+    counts.ok = Math.max(0, total[0].n - counts.failing - counts.open);
+    res.json({ counts, channels });
+  } catch (err) { res.status(500).json({ error: err.message }); }
+});
+
 // timeseries aggregated per channel into fixed resolution buckets
 app.get('/api/timeseries', async (req, res) => {
   try {